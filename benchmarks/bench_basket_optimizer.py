@@ -0,0 +1,52 @@
+"""
+Times the recipe-to-basket optimiser on generated recipes over a real dump.
+
+Usage:
+    python benchmarks/bench_basket_optimizer.py --recipes 300 --budget 40
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.basket_optimizer import optimise_basket
+from src.product_store import ProductStore
+from src.search_index import SearchIndex
+
+INGREDIENTS = [
+    "komkommer", "tomaten", "paprika", "spinazie", "broccoli", "bloemkool", "avocado", "citroen",
+    "zalm", "kipfilet", "gehakt", "eieren", "yoghurt", "kaas", "melk", "boter", "volkoren brood",
+    "pasta", "rijst", "aardappelen", "ui", "knoflook", "champignons", "wortel", "sla", "aardbeien",
+    "blauwe bessen", "appel", "banaan", "noten", "olijfolie", "tomatenpuree", "bonen", "tonijn",
+]
+
+
+def generate_recipes(count, seed=7):
+    rng = random.Random(seed)
+    return [{"name": f"recipe {i}", "ingredients": rng.sample(INGREDIENTS, rng.randint(3, 8))}
+            for i in range(count)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the basket optimiser")
+    parser.add_argument("path", nargs="?", default=os.path.join("data", "output", "bonus_items_0_1000.json"))
+    parser.add_argument("--recipes", type=int, default=300)
+    parser.add_argument("--budget", type=float, default=40.0)
+    parser.add_argument("--time-budget", type=float, default=0.2)
+    args = parser.parse_args()
+
+    store = ProductStore.from_json(args.path)
+    index = SearchIndex()
+    index.add(store.products)
+    recipes = generate_recipes(args.recipes)
+
+    for objective in ("savings", "health"):
+        start = time.perf_counter()
+        result = optimise_basket(recipes, store, args.budget, objective, index=index, time_budget=args.time_budget)
+        print(f"{objective:<8} {len(recipes)} recipes x {len(store)} products: {len(result['recipes'])} recipes, "
+              f"{len(result['products'])} products, cost {result['total_cost']:.2f}, "
+              f"saves {result['total_savings']:.2f}, health {result['total_health']} "
+              f"in {time.perf_counter() - start:.3f}s")
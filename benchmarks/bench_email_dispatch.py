@@ -0,0 +1,75 @@
+"""
+Compares one-at-a-time sending (a new token and connection per message, as
+send_html_email_sendpulse does) with the pooled, concurrent EmailDispatcher
+against the fake SendPulse server.
+
+Usage:
+    python benchmarks/bench_email_dispatch.py --messages 1000 --workers 16 --latency 0.05
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.fake_sendpulse_server import start_fake_sendpulse_server
+from src.email_dispatch import EmailDispatcher, SendPulseClient
+from src.json_to_html import write_product_email_html
+from src.stream_json import iter_json_items
+
+
+def send_unpooled(base_url, message):
+    token = requests.post(f"{base_url}/oauth/access_token",
+                          json={"grant_type": "client_credentials"}).json()["access_token"]
+    with open(message["html_file"], encoding="utf-8") as f:
+        payload = {"html": f.read(), "subject": message["subject"],
+                   "from": {"email": message["sender_email"]}, "to": [{"email": message["to"]}]}
+    requests.post(f"{base_url}/smtp/emails", data=json.dumps(payload),
+                  headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark bulk email dispatch")
+    parser.add_argument("path", nargs="?", default=os.path.join("data", "output", "bonus_items_0_1000.json"))
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05, help="Server time per email")
+    parser.add_argument("--max-per-second", type=int, default=None, help="Server throttling limit")
+    parser.add_argument("--baseline", type=int, default=50, help="Messages sent one at a time for comparison")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    server, url, counter = start_fake_sendpulse_server(latency=args.latency, max_per_second=args.max_per_second)
+    try:
+        html_path = os.path.join(directory, "digest.html")
+        products = list(iter_json_items(args.path))[:25]
+        write_product_email_html(products, html_path)
+        messages = [{"to": f"user{i}@example.com", "subject": "Bonus", "sender_email": "offers@example.com",
+                     "html_file": html_path} for i in range(args.messages)]
+
+        start = time.perf_counter()
+        for message in messages[:args.baseline]:
+            send_unpooled(url, message)
+        baseline = (time.perf_counter() - start) / max(args.baseline, 1)
+        print(f"one at a time: {baseline * 1000:.1f} ms per message "
+              f"(~{baseline * args.messages:.1f}s for {args.messages})")
+
+        client = SendPulseClient("id", "secret", base_url=url, pool_size=args.workers)
+        dispatcher = EmailDispatcher(client, max_workers=args.workers, backoff=0.1)
+        start = time.perf_counter()
+        results = dispatcher.send_many(messages)
+        elapsed = time.perf_counter() - start
+        sent = sum(r["status"] == "sent" for r in results)
+        retries = sum(r["attempts"] - 1 for r in results)
+        print(f"dispatcher: {sent}/{len(results)} sent in {elapsed:.2f}s "
+              f"({len(results) / elapsed:.0f} messages/s, {client.token_requests} token request(s), "
+              f"{retries} retries, {counter['throttled']} throttled)")
+    finally:
+        server.shutdown()
+        shutil.rmtree(directory)
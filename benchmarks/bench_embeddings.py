@@ -0,0 +1,51 @@
+"""
+Times building, searching and deduplicating the product embedding index.
+
+Usage:
+    python benchmarks/bench_embeddings.py data/output/bonus_items_0_1000.json
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.embedding_index import EmbeddingIndex
+from src.stream_json import iter_json_items
+
+QUERIES = ["komkommer", "zalm", "spinazie", "volkoren brood", "kipfilet", "tomaten"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the embedding index")
+    parser.add_argument("path", nargs="?", default=os.path.join("data", "output", "bonus_items_0_1000.json"))
+    args = parser.parse_args()
+    products = list(iter_json_items(args.path))
+    titles = {p["webshopId"]: p.get("title") for p in products}
+
+    start = time.perf_counter()
+    index = EmbeddingIndex()
+    index.add(products)
+    print(f"embedded {len(index)} products in {time.perf_counter() - start:.3f}s")
+
+    start = time.perf_counter()
+    for query in QUERIES:
+        top = index.search(query, k=3)
+        print(f"  {query:<15} -> {[titles[i] for i, _ in top]}")
+    print(f"{len(QUERIES)} searches in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    pairs = index.near_duplicates(threshold=0.8)
+    print(f"{len(pairs)} near-duplicate pairs in {time.perf_counter() - start:.3f}s")
+    for a, b, score in pairs[:5]:
+        print(f"  {score:.2f} {titles[a]} ~ {titles[b]}")
+
+    path = os.path.join(tempfile.mkdtemp(), "products")
+    start = time.perf_counter()
+    index.save(path)
+    loaded = EmbeddingIndex.load(path)
+    print(f"save + load in {(time.perf_counter() - start) * 1000:.1f} ms "
+          f"({os.path.getsize(path + '.f32') / 1e6:.2f} MB float32 matrix)")
+    assert loaded.search("zalm") == index.search("zalm")
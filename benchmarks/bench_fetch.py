@@ -0,0 +1,43 @@
+"""
+Compares sequential and concurrent catalogue fetching against the stub AH server.
+
+Usage:
+    python benchmarks/bench_fetch.py --latency 0.2 --workers 8
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.stub_ah_server import start_stub_server
+from src.new_test import get_all_bonus_items
+
+
+def run(latency, workers, fail_every):
+    server, base_url = start_stub_server(latency=latency, fail_every=fail_every)
+    try:
+        start = time.perf_counter()
+        sequential = get_all_bonus_items(concurrent=False, base_url=base_url)
+        sequential_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        concurrent = get_all_bonus_items(concurrent=True, max_workers=workers, base_url=base_url)
+        concurrent_time = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    assert [p["webshopId"] for p in sequential] == [p["webshopId"] for p in concurrent]
+    print(f"\nsequential: {len(sequential)} items in {sequential_time:.2f}s")
+    print(f"concurrent: {len(concurrent)} items in {concurrent_time:.2f}s ({workers} workers)")
+    print(f"speedup:    {sequential_time / concurrent_time:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark bonus catalogue fetching")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub latency per request (s)")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--fail-every", type=int, default=0, help="answer every n-th page with 503")
+    args = parser.parse_args()
+    run(args.latency, args.workers, args.fail_every)
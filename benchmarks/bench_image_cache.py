@@ -0,0 +1,80 @@
+"""
+Prefetches the email renditions of a synthetic catalogue from the stub image
+server into an ImageCache, then renders the email offline from the cache.
+
+Reports cold and warm prefetch throughput, eviction under a small size limit
+and checks that offline rendering makes no requests.
+
+Usage:
+    python benchmarks/bench_image_cache.py --products 2000 --latency 0.02 --workers 16
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import requests
+
+from benchmarks.stub_image_server import start_stub_image_server
+from benchmarks.synthetic_catalogue import generate_catalogue
+from src.image_cache import ImageCache
+from src.json_to_html import best_image_url, clear_render_caches, generate_product_email_html
+
+AH_IMAGE_HOST = "https://static.ah.nl"
+
+
+def catalogue(count, base_url):
+    for product in generate_catalogue(count):
+        for image in product["images"]:
+            image["url"] = image["url"].replace(AH_IMAGE_HOST, base_url)
+        yield product
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark image prefetching and offline rendering")
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds per image on the stub server")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--sequential", type=int, default=100, help="Images fetched one by one as a baseline")
+    args = parser.parse_args()
+
+    server, base_url, counter = start_stub_image_server(latency=args.latency, missing={"AHI_00000000000186a5"})
+    directory = tempfile.mkdtemp()
+    try:
+        products = list(catalogue(args.products, base_url))
+        clear_render_caches()
+
+        urls = [best_image_url(p) for p in products[:args.sequential]]
+        start = time.perf_counter()
+        for url in urls:
+            requests.get(url, timeout=10)
+        seconds = time.perf_counter() - start
+        print(f"sequential requests.get: {len(urls) / seconds:8.0f} images/s")
+
+        cache = ImageCache(directory, max_workers=args.workers)
+        for label in ("cold", "warm"):
+            summary = cache.prefetch_products(products)
+            print(f"prefetch {label}: {args.products / summary['seconds']:8.0f} images/s  "
+                  f"{summary['fetched']} fetched, {summary['cached']} cached, {len(summary['failed'])} failed, "
+                  f"{summary['bytes'] / 1e6:.1f} MB")
+
+        requests_before = counter["requests"]
+        start = time.perf_counter()
+        page = cache.localise_html(generate_product_email_html(products))
+        print(f"offline render: {time.perf_counter() - start:.2f}s, {counter['requests'] - requests_before} requests, "
+              f"{page.count('file://')} local images")
+
+        total = cache.total_bytes()
+        cache.max_bytes = total // 2
+        start = time.perf_counter()
+        evicted = cache.evict()
+        print(f"evicted {evicted} images in {time.perf_counter() - start:.2f}s: "
+              f"{total / 1e6:.1f} MB -> {cache.total_bytes() / 1e6:.1f} MB")
+        cache.close()
+    finally:
+        server.shutdown()
+        shutil.rmtree(directory)
@@ -0,0 +1,83 @@
+"""
+Extracts facts from the pack shots of a synthetic catalogue served by the stub
+image server, OCR'd by benchmarks/fake_tesseract.py (or a real tesseract).
+
+Reports OCR throughput for one image per invocation against batches, on one
+worker and on a process pool, then a warm run and a run after a tenth of the
+images got a new revLabel, which should only process those.
+
+Usage:
+    python benchmarks/bench_image_facts.py --products 400 --cpu-ms 40 --workers 4
+    python benchmarks/bench_image_facts.py --ocr-command tesseract
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.bench_image_cache import catalogue
+from benchmarks.stub_image_server import start_stub_image_server
+from src.image_cache import ImageCache
+from src.image_facts import ImageFactExtractor, ocr_image_url
+
+FAKE_TESSERACT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_tesseract.py")
+
+
+def run(label, cache, products, path, **options):
+    extractor = ImageFactExtractor(cache, path, **options)
+    facts, stats = extractor.extract(products)
+    extractor.close()
+    rate = f"{stats['images_per_second']:7.1f} images/s" if stats["images_per_second"] else "      - images/s"
+    print(f"{label:<28} {rate}  {stats['processed']} processed, {stats['cached']} cached, "
+          f"{stats['failed']} failed, {stats['seconds']:.2f}s")
+    return facts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark OCR fact extraction from product images")
+    parser.add_argument("--products", type=int, default=400)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--cpu-ms", type=float, default=40, help="CPU per image of the fake OCR")
+    parser.add_argument("--load-ms", type=float, default=150, help="Model load per invocation of the fake OCR")
+    parser.add_argument("--ocr-command", default=f"{sys.executable} {FAKE_TESSERACT}")
+    args = parser.parse_args()
+    os.environ["FAKE_OCR_CPU_MS"] = str(args.cpu_ms)
+    os.environ["FAKE_OCR_LOAD_MS"] = str(args.load_ms)
+
+    server, base_url, _ = start_stub_image_server()
+    directory = tempfile.mkdtemp()
+    try:
+        products = list(catalogue(args.products, base_url))
+        cache = ImageCache(os.path.join(directory, "images"))
+        cache.prefetch(ocr_image_url(p) for p in products)
+        options = {"ocr_command": args.ocr_command}
+
+        run("1 worker, 1 per call", cache, products, os.path.join(directory, "a.sqlite"),
+            max_workers=1, batch_size=1, **options)
+        run(f"1 worker, batches of {args.batch_size}", cache, products, os.path.join(directory, "b.sqlite"),
+            max_workers=1, batch_size=args.batch_size, **options)
+        path = os.path.join(directory, "c.sqlite")
+        pooled = dict(max_workers=args.workers, batch_size=args.batch_size, **options)
+        facts = run(f"{args.workers} workers, batches of {args.batch_size}", cache, products, path, **pooled)
+        run("warm", cache, products, path, **pooled)
+
+        # A tenth of the products get a new pack shot revision
+        for product in random.Random(0).sample(products, len(products) // 10):
+            for image in product["images"]:
+                image["url"] = image["url"].replace("revLabel=1", "revLabel=2")
+        run("after new revisions", cache, products, path, **pooled)
+
+        with_nutrition = sum(1 for f in facts.values() if f.get("nutrition"))
+        with_allergens = sum(1 for f in facts.values() if f.get("allergens") or f.get("may_contain"))
+        print(f"{len(facts)} products with facts, {with_nutrition} with nutrition, {with_allergens} with allergens")
+        webshop_id, example = next(iter(facts.items()))
+        print(f"  {webshop_id}: {example}")
+        cache.close()
+    finally:
+        server.shutdown()
+        shutil.rmtree(directory)
@@ -0,0 +1,70 @@
+"""
+Builds a large synthetic product/ingredient/recipe graph and times queries.
+
+Usage:
+    python benchmarks/bench_knowledge_graph.py --products 20000 --recipes 10000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.knowledge_graph import KnowledgeGraph
+
+CATEGORIES = ["Groente, aardappelen", "Vlees, vis", "Zuivel, eieren", "Bakkerij", "Frisdrank, sappen"]
+
+
+def build(products, ingredients, recipes, seed=42):
+    rng = random.Random(seed)
+    graph = KnowledgeGraph()
+    categories = [graph.add_node(f"category:{c}", "category", name=c) for c in CATEGORIES]
+    ingredient_ids = [graph.add_node(f"ingredient:{i}", "ingredient", name=f"ingredient {i}") for i in range(ingredients)]
+    for i in range(products):
+        category = rng.randrange(len(CATEGORIES))
+        node = graph.add_node(f"product:{i}", "product", name=f"product {i}", category=CATEGORIES[category])
+        graph.add_edge(node, categories[category], "in_category")
+        graph.add_edge(node, rng.choice(ingredient_ids), "is_ingredient")
+    for i in range(recipes):
+        node = graph.add_node(f"recipe:{i}", "recipe", name=f"recipe {i}")
+        for ingredient in rng.sample(ingredient_ids, 5):
+            graph.add_edge(ingredient, node, "used_in")
+    return graph
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the knowledge graph store")
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--ingredients", type=int, default=2000)
+    parser.add_argument("--recipes", type=int, default=10000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    graph = build(args.products, args.ingredients, args.recipes)
+    print(f"built {len(graph)} nodes, {graph.edge_count()} edges in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    category = graph.ids[f"category:{CATEGORIES[0]}"]
+    recipes = graph.follow([category], ["~in_category", "is_ingredient", "used_in"])
+    print(f"{len(recipes)} recipes reachable from '{CATEGORIES[0]}' in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    path = graph.shortest_path(graph.ids["product:0"], graph.ids["recipe:0"])
+    print(f"shortest path of {len(path or [])} nodes in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    for i in range(0, args.products, 10):
+        graph.remove_node(f"product:{i}")
+    print(f"removed {args.products // 10} products in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    path = os.path.join(tempfile.mkdtemp(), "graph.bin")
+    start = time.perf_counter()
+    graph.save(path)
+    loaded = KnowledgeGraph.load(path)
+    print(f"save + load in {time.perf_counter() - start:.2f}s ({os.path.getsize(path) / 1e6:.2f} MB)")
+    assert loaded.follow([category], ["~in_category", "is_ingredient", "used_in"]) == \
+        graph.follow([category], ["~in_category", "is_ingredient", "used_in"])
+    assert len(loaded) == len(graph) and loaded.edge_count() == graph.edge_count()
@@ -0,0 +1,59 @@
+"""
+Compares one-request-per-product recipe generation with the batch scheduler
+against the fake LLM server.
+
+Usage:
+    python benchmarks/bench_llm_scheduler.py --items 200 --latency 0.2
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.fake_llm_server import start_fake_llm_server
+from src.llm_process import load_llm_model
+from src.llm_scheduler import LLMBatchScheduler
+from src.stream_json import iter_json_items
+
+
+def run(items, latency, batch_size, concurrency, fail_on):
+    titles = [p.get("title", "product") for p in iter_json_items(os.path.join("data", "output", "bonus_items.json"))]
+    prompts = [f"Healthy recipe for {titles[i % len(titles)]}" for i in range(items)]
+    server, base_url, counter = start_fake_llm_server(latency=latency, fail_on=fail_on)
+    llm = load_llm_model("fake", base_url)
+    try:
+        start = time.perf_counter()
+        sequential = []
+        for prompt in prompts:
+            try:
+                sequential.append(llm.generate_text(prompt, 0.7))
+            except Exception:
+                sequential.append(None)
+        sequential_time = time.perf_counter() - start
+        sequential_requests = counter["requests"]
+
+        scheduler = LLMBatchScheduler(llm, batch_size=batch_size, max_concurrency=concurrency)
+        start = time.perf_counter()
+        batched = scheduler.generate_many(prompts)
+        batched_time = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    assert sequential == batched
+    print(f"sequential: {len(prompts)} prompts, {sequential_requests} requests in {sequential_time:.2f}s")
+    print(f"scheduled:  {len(prompts)} prompts, {scheduler.stats['requests']} requests in {batched_time:.2f}s "
+          f"(batch {batch_size}, concurrency {concurrency}, {scheduler.stats['fallbacks']} fallbacks)")
+    print(f"speedup:    {sequential_time / batched_time:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batched LLM scheduling")
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--fail-on", default=None, help="fake a failure for prompts containing this text")
+    args = parser.parse_args()
+    run(args.items, args.latency, args.batch_size, args.concurrency, args.fail_on)
@@ -0,0 +1,71 @@
+"""
+Drains an outbox with parallel senders against the fake SendPulse server,
+after a first sender is killed halfway through, and reports how much work
+the rerun repeated.
+
+Usage:
+    python benchmarks/bench_outbox.py --messages 2000 --senders 4
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.fake_sendpulse_server import start_fake_sendpulse_server
+from src.email_dispatch import EmailDispatcher, SendPulseClient
+from src.outbox import Outbox
+
+DAY = "2025-01-06"
+
+
+def drain(outbox_path, url, lease_seconds, workers):
+    outbox = Outbox(outbox_path, lease_seconds=lease_seconds)
+    dispatcher = EmailDispatcher(SendPulseClient("id", "secret", base_url=url, pool_size=workers),
+                                 max_workers=workers)
+    return outbox.drain(dispatcher, batch_size=50, day=DAY)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark outbox crash recovery")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--senders", type=int, default=4, help="Sender processes draining after the crash")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent sends per sender")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--lease", type=float, default=1.0, help="Lease seconds")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    server, url, counter = start_fake_sendpulse_server(latency=args.latency)
+    server.handle_error = lambda request, client_address: None # Resets from the killed sender
+    try:
+        path = os.path.join(directory, "outbox.sqlite")
+        messages = [{"to": f"user{i}@example.com", "subject": "Bonus", "sender_email": "offers@example.com",
+                     "html": "<p>Deals</p>"} for i in range(args.messages)]
+        outbox = Outbox(path, lease_seconds=args.lease)
+        print(f"queued {outbox.enqueue(messages, day=DAY)} messages")
+
+        crashed = multiprocessing.Process(target=drain, args=(path, url, args.lease, args.workers))
+        crashed.start()
+        time.sleep(1.0)
+        crashed.kill()
+        crashed.join()
+        print(f"sender killed after {counter['emails']} emails: {outbox.counts()}")
+        print(f"requeueing the same run adds {outbox.enqueue(messages, day=DAY)} messages")
+
+        time.sleep(args.lease)
+        start = time.perf_counter()
+        with multiprocessing.Pool(args.senders) as pool:
+            summaries = pool.starmap(drain, [(path, url, args.lease, args.workers)] * args.senders)
+        elapsed = time.perf_counter() - start
+        resent = sum(s["sent"] for s in summaries)
+        print(f"{args.senders} senders resumed and sent {resent} messages in {elapsed:.2f}s: {outbox.counts()}")
+        print(f"server accepted {counter['emails']} emails for {args.messages} recipients "
+              f"({counter['emails'] - args.messages} duplicates from the killed batch)")
+    finally:
+        server.shutdown()
+        shutil.rmtree(directory)
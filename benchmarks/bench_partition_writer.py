@@ -0,0 +1,53 @@
+"""
+Compares write time and disk footprint of the splitter's partition formats.
+
+Usage:
+    python benchmarks/bench_partition_writer.py
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.check_products import filter_and_split_json
+from src.partition_writer import PARTITION_FORMATS, read_partition
+from src.stream_json import iter_json_items
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def run(path):
+    # Items are streamed from the file, so the peak heap shows whether the
+    # splitter holds the catalogue
+    for output_format in PARTITION_FORMATS:
+        directory = tempfile.mkdtemp()
+        try:
+            tracemalloc.start()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                filter_and_split_json(iter_json_items(path), directory, output_format=output_format)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            read_back = sum(sum(1 for _ in read_partition(os.path.join(directory, name)))
+                            for name in os.listdir(directory) if not name.startswith("_"))
+            print(f"{output_format:<8} {elapsed:.3f}s peak {peak / 1e6:5.1f} MB "
+                  f"{directory_size(directory) / 1e6:6.2f} MB ({read_back} items read back)")
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark partition writing")
+    parser.add_argument("path", nargs="?", default=os.path.join("data", "output", "bonus_items_0_1000.json"))
+    args = parser.parse_args()
+    run(args.path)
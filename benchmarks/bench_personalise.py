@@ -0,0 +1,58 @@
+"""
+Times personalised digest generation for many synthetic subscribers.
+
+Usage:
+    python benchmarks/bench_personalise.py --subscribers 1000 --workers 4
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.personalise import DEFAULT_PREFERENCES, DIET_EXCLUDED_CATEGORIES, generate_digests
+from src.product_store import ProductStore
+from src.snapshot import open_snapshot, save_snapshot
+
+
+def synthetic_subscribers(count, categories, seed=3):
+    rng = random.Random(seed)
+    diets = [None, None, *DIET_EXCLUDED_CATEGORIES]
+    return [dict(DEFAULT_PREFERENCES,
+                 email=f"user{i}@example.com",
+                 categories=rng.sample(categories, rng.randint(2, 6)) if rng.random() < 0.5 else None,
+                 diet=rng.choice(diets),
+                 max_price=rng.choice([None, 3.0, 5.0]),
+                 max_nutriscore=rng.choice([None, "B", "C"]),
+                 min_discount=rng.choice([None, 20, 30]))
+            for i in range(count)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark personalised digests")
+    parser.add_argument("path", nargs="?", default=os.path.join("data", "output", "bonus_items_0_1000.json"))
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        snapshot_path = save_snapshot(ProductStore.from_json(args.path), os.path.join(directory, "bench.snap"))
+        store = open_snapshot(snapshot_path)
+        subscribers = synthetic_subscribers(args.subscribers, list(store.indexes["mainCategory"]))
+
+        start = time.perf_counter()
+        results = generate_digests(store, subscribers, os.path.join(directory, "digests"),
+                                   snapshot_path=snapshot_path, max_workers=args.workers)
+        elapsed = time.perf_counter() - start
+        items = sum(r["items"] for r in results)
+        size = sum(r["bytes"] for r in results)
+        pages = sum(len(r["paths"]) for r in results)
+        print(f"{len(results)} digests ({pages} emails), {items} product cards, {size / 1e6:.1f} MB HTML in {elapsed:.2f}s "
+              f"({elapsed / len(results) * 1000:.2f} ms per subscriber, {args.workers} workers)")
+    finally:
+        shutil.rmtree(directory)
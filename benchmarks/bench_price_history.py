@@ -0,0 +1,104 @@
+"""
+Simulates daily runs into a PriceHistory and times appends, history lookups and deal scoring.
+
+Each simulated week some products change their regular price (a few of them
+raised just before going on bonus) and the bonus offers are redrawn; runs
+within a week see the same catalogue, as the AH bonus changes weekly.
+
+Usage:
+    python benchmarks/bench_price_history.py --products 5000 --days 365
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.synthetic_catalogue import _mechanism, generate_catalogue
+from src.price_history import PriceHistory, rank_deals, score_deals
+from src.product_store import ProductStore
+
+
+def weekly_catalogue(rng, products, regular_prices, week_start):
+    for product in products:
+        webshop_id = product["webshopId"]
+        if rng.random() < 0.05:
+            regular_prices[webshop_id] = round(regular_prices[webshop_id] * rng.uniform(0.95, 1.05), 2)
+        product["priceBeforeBonus"] = regular_prices[webshop_id]
+        for field in ("bonusMechanism", "bonusStartDate", "bonusEndDate", "currentPrice"):
+            product.pop(field, None)
+        product["isBonus"] = rng.random() < 0.45
+        product["discountLabels"] = []
+        if product["isBonus"]:
+            if rng.random() < 0.02: # raised for the bonus week only
+                product["priceBeforeBonus"] = round(product["priceBeforeBonus"] * 1.25, 2)
+            mechanism, label, current_price = _mechanism(rng, product["priceBeforeBonus"])
+            product.update({"bonusMechanism": mechanism, "bonusStartDate": week_start.isoformat(),
+                            "bonusEndDate": (week_start + timedelta(days=6)).isoformat(),
+                            "discountLabels": [label]})
+            if current_price is not None:
+                product["currentPrice"] = current_price
+    return ProductStore(products)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the price history store")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    products = list(generate_catalogue(args.products, seed=args.seed))
+    regular_prices = {product["webshopId"]: product["priceBeforeBonus"] for product in products}
+    directory = tempfile.mkdtemp()
+    try:
+        history = PriceHistory(directory)
+        first_day = date(2025, 1, 6) # a Monday
+        append_seconds = 0.0
+        store = None
+        for offset in range(args.days - 1):
+            day = first_day + timedelta(days=offset)
+            if store is None or day.weekday() == 0:
+                store = weekly_catalogue(rng, products, regular_prices, day)
+            start = time.perf_counter()
+            history.append(store, day)
+            append_seconds += time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in history.segments())
+        rows = args.products * args.days
+        print(f"appended {args.days} days x {args.products} products in {append_seconds:.2f}s "
+              f"({append_seconds / args.days * 1000:.1f} ms/day)")
+        print(f"on disk: {size / 1e6:.2f} MB in {len(history.segments())} segments "
+              f"({size / rows:.3f} bytes per product-day)")
+
+        start = time.perf_counter()
+        stats = history.stats()
+        print(f"cold stats over {len(stats)} products: {time.perf_counter() - start:.3f}s")
+        start = time.perf_counter()
+        history.stats()
+        print(f"repeated stats: {time.perf_counter() - start:.3f}s")
+
+        # The next run: append today, then compare with history up to yesterday
+        today = first_day + timedelta(days=args.days - 1)
+        if today.weekday() == 0:
+            store = weekly_catalogue(rng, products, regular_prices, today)
+        history.append(store, today)
+        start = time.perf_counter()
+        history.stats()
+        print(f"stats after one more day: {time.perf_counter() - start:.3f}s")
+        stats = history.stats(until=today - timedelta(days=1))
+
+        start = time.perf_counter()
+        discounts, inflated, lowest = score_deals(store, stats)
+        ranking = rank_deals(store, stats)
+        print(f"scored and ranked {len(store)} offers in {time.perf_counter() - start:.3f}s: "
+              f"{sum(inflated)} inflated, {sum(lowest)} at their lowest price")
+        for p in ranking[:3]:
+            print(f"  {store.products[p]['title']:<32} {discounts[p]:6.1f}%  {stats.get(store.webshop_id[p])}")
+    finally:
+        shutil.rmtree(directory)
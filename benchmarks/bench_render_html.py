@@ -0,0 +1,41 @@
+"""
+Times email rendering with a cold and a warm fragment cache.
+
+Usage:
+    python benchmarks/bench_render_html.py data/output/bonus_items_0_1000.json --emails 1000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.json_to_html import clear_render_caches, generate_product_email_html
+from src.stream_json import iter_json_items
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark HTML email rendering")
+    parser.add_argument("path", nargs="?", default=os.path.join("data", "output", "bonus_items_0_1000.json"))
+    parser.add_argument("--emails", type=int, default=1000, help="Personalised emails of 25 products")
+    args = parser.parse_args()
+
+    products = list(iter_json_items(args.path))
+    clear_render_caches()
+
+    start = time.perf_counter()
+    html = generate_product_email_html(products)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    generate_product_email_html(products)
+    warm = time.perf_counter() - start
+    print(f"{len(products)} products, {len(html) / 1e6:.1f} MB: cold {cold * 1000:.1f} ms, warm {warm * 1000:.1f} ms")
+
+    rng = random.Random(5)
+    start = time.perf_counter()
+    for _ in range(args.emails):
+        generate_product_email_html(rng.sample(products, min(25, len(products))))
+    elapsed = time.perf_counter() - start
+    print(f"{args.emails} emails of 25 products in {elapsed:.2f}s ({elapsed / args.emails * 1000:.3f} ms per email)")
@@ -0,0 +1,70 @@
+"""
+Times building, incrementally updating and querying the full-text SearchIndex.
+
+Ingredients are the product nouns of the synthetic catalogue in recipe form
+("2 el ...", plurals, typos), so most of them resolve through stemming or
+fuzzy matching rather than an exact title.
+
+Usage:
+    python benchmarks/bench_search_index.py --products 100000 --ingredients 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.synthetic_catalogue import CATEGORIES, generate_catalogue
+from src.search_index import SearchIndex
+
+QUANTITIES = ["", "2 el ", "250 gram ", "1 bos ", "3 stuks ", "een handje "]
+
+
+def recipe_ingredients(rng, count):
+    nouns = [noun for _, names in CATEGORIES.values() for noun in names]
+    ingredients = []
+    for _ in range(count):
+        noun = rng.choice(nouns)
+        if rng.random() < 0.2 and len(noun) > 5: # typo
+            i = rng.randrange(1, len(noun) - 1)
+            noun = noun[:i] + noun[i + 1:]
+        ingredients.append(rng.choice(QUANTITIES) + noun)
+    return ingredients
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the full-text product index")
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--ingredients", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    products = list(generate_catalogue(args.products, seed=args.seed))
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.update(products)
+    seconds = time.perf_counter() - start
+    print(f"indexed {len(index)} products in {seconds:.2f}s ({len(index) / seconds:.0f}/s), "
+          f"{len(index.postings)} terms")
+
+    # Next week's catalogue: a tenth renamed, a twentieth gone
+    rng = random.Random(args.seed)
+    for product in rng.sample(products, len(products) // 10):
+        product["title"] += " nieuw recept"
+    next_week = rng.sample(products, len(products) - len(products) // 20)
+    start = time.perf_counter()
+    summary = index.update(next_week)
+    print(f"incremental update {summary} in {time.perf_counter() - start:.2f}s")
+
+    ingredients = recipe_ingredients(rng, args.ingredients)
+    for label in ("cold", "warm"):
+        start = time.perf_counter()
+        resolved = index.resolve(ingredients, k=3)
+        seconds = time.perf_counter() - start
+        matched = sum(1 for matches in resolved.values() if matches)
+        print(f"resolved {len(ingredients)} ingredients ({len(resolved)} distinct, {matched} matched) {label} "
+              f"in {seconds * 1000:.1f} ms ({seconds / len(ingredients) * 1e6:.0f} us each)")
+    for ingredient in ingredients[:3]:
+        print(f"  {ingredient!r:<30} -> {[(w, round(s, 2)) for w, s in resolved[ingredient]]}")
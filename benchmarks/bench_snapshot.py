@@ -0,0 +1,39 @@
+"""
+Compares cold start of a filtering query from the JSON dump and from a snapshot.
+
+Usage:
+    python benchmarks/bench_snapshot.py data/output/bonus_items.json
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.product_store import ProductStore
+from src.snapshot import open_snapshot, save_snapshot
+
+
+def timed(label, build):
+    start = time.perf_counter()
+    store = build()
+    opened = time.perf_counter() - start
+    positions = store.query(max_price=3, max_nutriscore="B")
+    titles = [product.get("title") for product in store.rows(positions)]
+    total = time.perf_counter() - start
+    print(f"{label:<9} open {opened * 1000:8.2f} ms, open + query + rows {total * 1000:8.2f} ms ({len(titles)} rows)")
+    return titles
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark snapshot cold start")
+    parser.add_argument("path", nargs="?", default=os.path.join("data", "output", "bonus_items_0_1000.json"))
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.snap")
+    save_snapshot(ProductStore.from_json(args.path), path)
+    from_json = timed("json", lambda: ProductStore.from_json(args.path))
+    from_snapshot = timed("snapshot", lambda: open_snapshot(path))
+    assert from_json == from_snapshot
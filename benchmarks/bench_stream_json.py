@@ -0,0 +1,41 @@
+"""
+Compares peak Python heap usage of json.load against the streaming reader.
+
+Usage:
+    python benchmarks/bench_stream_json.py data/output/bonus_items_0_1000.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.stream_json import iter_json_items
+
+
+def measure(label, count_items):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = count_items()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10} {count:>6} items in {elapsed:.3f}s, peak {peak / 1e6:.1f} MB")
+
+
+def load_all(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.loads(f.read())
+    items = data["products"] if isinstance(data, dict) else data
+    return sum(1 for _ in items)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark streaming JSON reading")
+    parser.add_argument("path", nargs="?", default=os.path.join("data", "output", "bonus_items_0_1000.json"))
+    args = parser.parse_args()
+    measure("json.load", lambda: load_all(args.path))
+    measure("streaming", lambda: sum(1 for _ in iter_json_items(args.path)))
@@ -0,0 +1,88 @@
+"""
+Local stand-in for an OpenAI-compatible chat completions endpoint.
+
+Answers every request after an artificial latency. Prompts packed by
+src/llm_scheduler.py ("### Item N" markers) get one answer per item, so
+batched and unbatched recipe generation can be compared.
+
+Usage:
+    python benchmarks/fake_llm_server.py --port 8766 --latency 0.5
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_ITEM = re.compile(r"^### Item (\d+)\n(.*?)(?=^### Item |\Z)", re.M | re.S)
+
+
+def fake_answer(prompt, fail_on=None):
+    """
+    Builds the fake completion for a prompt; items containing `fail_on` are left out.
+    """
+    items = _ITEM.findall(prompt)
+    if not items:
+        return f"Recipe generated by fake LLM for: {prompt.strip()}"
+    answers = []
+    for number, text in items:
+        if fail_on and fail_on in text:
+            continue
+        answers.append(f"### Item {number}\nRecipe generated by fake LLM for: {text.strip()}")
+    return "\n".join(answers)
+
+
+def make_handler(latency, fail_on=None):
+    counter = {"requests": 0}
+    lock = threading.Lock()
+
+    class FakeLLMHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            with lock:
+                counter["requests"] += 1
+            time.sleep(latency)
+            prompt = body.get("messages", [{}])[-1].get("content", "")
+            if fail_on and fail_on in prompt and "### Item" not in prompt:
+                status, payload = 500, {"error": "fake failure"}
+            else:
+                content = fake_answer(prompt, fail_on)
+                status, payload = 200, {"choices": [{"message": {"role": "assistant", "content": content}}]}
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return FakeLLMHandler, counter
+
+
+def start_fake_llm_server(port=0, latency=0.2, fail_on=None):
+    """
+    Starts the fake LLM server in a background thread.
+
+    Returns:
+        tuple: (server, base_url, counter). counter["requests"] counts requests served.
+    """
+    handler, counter = make_handler(latency, fail_on)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", counter
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake chat completions server")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    handler, _ = make_handler(args.latency)
+    print(f"Serving fake LLM on http://127.0.0.1:{args.port}")
+    ThreadingHTTPServer(("127.0.0.1", args.port), handler).serve_forever()
@@ -0,0 +1,103 @@
+"""
+Local stand-in for the SendPulse OAuth and SMTP email endpoints.
+
+Tokens expire after `token_ttl` seconds. Emails are accepted after an
+artificial latency; above `max_per_second` messages the server answers
+429 with a Retry-After header, like the real API under throttling.
+
+Usage:
+    python benchmarks/fake_sendpulse_server.py --port 8767 --latency 0.05
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(latency, max_per_second=None, token_ttl=3600):
+    counter = {"tokens": 0, "emails": 0, "throttled": 0, "unauthorised": 0}
+    tokens = {} # token -> expiry
+    window = [] # accept timestamps within the last second
+    lock = threading.Lock()
+
+    class FakeSendPulseHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload, headers=None):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            now = time.monotonic()
+            if self.path == "/oauth/access_token":
+                token = uuid.uuid4().hex
+                with lock:
+                    counter["tokens"] += 1
+                    tokens[token] = now + token_ttl
+                return self._send_json(200, {"access_token": token, "token_type": "Bearer", "expires_in": token_ttl})
+            if self.path != "/smtp/emails":
+                return self._send_json(404, {"error": "not found"})
+
+            token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+            with lock:
+                if tokens.get(token, 0) < now:
+                    counter["unauthorised"] += 1
+                    status = 401
+                else:
+                    window[:] = [t for t in window if now - t < 1.0]
+                    if max_per_second is not None and len(window) >= max_per_second:
+                        counter["throttled"] += 1
+                        status = 429
+                    else:
+                        window.append(now)
+                        status = 200
+            if status == 401:
+                return self._send_json(401, {"error": "invalid_token"})
+            if status == 429:
+                return self._send_json(429, {"error": "Too many requests"}, {"Retry-After": "1"})
+            time.sleep(latency)
+            if not body.get("html") or not body.get("to"):
+                return self._send_json(400, {"error": "missing html or recipients"})
+            with lock:
+                counter["emails"] += 1
+            self._send_json(200, {"result": True, "id": uuid.uuid4().hex})
+
+    return FakeSendPulseHandler, counter
+
+
+def start_fake_sendpulse_server(port=0, latency=0.05, max_per_second=None, token_ttl=3600):
+    """
+    Starts the fake SendPulse server in a background thread.
+
+    Returns:
+        tuple: (server, base_url, counter) with counts of tokens issued, emails
+               accepted and requests throttled or rejected as unauthorised.
+    """
+    handler, counter = make_handler(latency, max_per_second, token_ttl)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", counter
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake SendPulse server")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--max-per-second", type=int, default=None)
+    args = parser.parse_args()
+    handler, _ = make_handler(args.latency, args.max_per_second)
+    print(f"Serving fake SendPulse on http://127.0.0.1:{args.port}")
+    ThreadingHTTPServer(("127.0.0.1", args.port), handler).serve_forever()
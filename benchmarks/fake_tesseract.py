@@ -0,0 +1,82 @@
+"""
+Stand-in for the tesseract CLI, for benchmarking src/image_facts.py where
+tesseract is not installed.
+
+Accepts the subset of tesseract's command line the extractor uses:
+an image path or a .txt list of image paths, `stdout`, `-l <lang>` and
+`--psm <n>`. For every image it burns about --cpu-ms of CPU, like a small
+OCR model would, and prints a Dutch pack label drawn from the image bytes,
+each page followed by a form feed as tesseract does. Loading the "model"
+costs --load-ms once per invocation, which is what batching amortises.
+
+Usage:
+    python benchmarks/fake_tesseract.py image.png stdout -l nld
+    FAKE_OCR_CPU_MS=40 python benchmarks/fake_tesseract.py list.txt stdout
+"""
+import hashlib
+import os
+import random
+import sys
+import time
+
+NUTRITION = (
+    "Voedingswaarde per 100 g\n"
+    "Energie {kj} kJ / {kcal} kcal\n"
+    "Vetten {fat} g\n"
+    "waarvan verzadigd {saturated} g\n"
+    "Koolhydraten {carbs} g\n"
+    "waarvan suikers {sugars} g\n"
+    "Voedingsvezel {fibre} g\n"
+    "Eiwitten {protein} g\n"
+    "Zout {salt} g\n"
+)
+CONTAINS = ["melk", "tarwe", "ei", "soja", "selderij", "mosterd", "sesamzaad", "hazelnoten"]
+TRACES = ["pinda", "noten", "sesam", "lupine"]
+
+
+def burn(milliseconds):
+    end = time.process_time() + milliseconds / 1000
+    x = 0
+    while time.process_time() < end:
+        x = (x * 31 + 7) % 1000003
+    return x
+
+
+def label(data):
+    rng = random.Random(hashlib.sha256(data).digest())
+    fat = round(rng.uniform(0, 30), 1)
+    carbs = round(rng.uniform(0, 70), 1)
+    protein = round(rng.uniform(0, 25), 1)
+    kcal = round(9 * fat + 4 * carbs + 4 * protein)
+    text = "Ingrediënten: water, suiker, zout.\n"
+    if rng.random() < 0.6:
+        text += f"Allergie-informatie: Bevat {', '.join(rng.sample(CONTAINS, rng.randint(1, 3)))}.\n"
+    if rng.random() < 0.3:
+        text += f"Kan sporen van {' en '.join(rng.sample(TRACES, rng.randint(1, 2)))} bevatten.\n"
+    return text + NUTRITION.format(
+        kj=round(kcal * 4.184), kcal=kcal, fat=str(fat).replace(".", ","),
+        saturated=str(round(fat / 3, 1)).replace(".", ","), carbs=str(carbs).replace(".", ","),
+        sugars=str(round(carbs / 4, 1)).replace(".", ","), fibre=str(round(rng.uniform(0, 8), 1)).replace(".", ","),
+        protein=str(protein).replace(".", ","), salt=str(round(rng.uniform(0, 2.5), 2)).replace(".", ","),
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[2] != "stdout":
+        sys.exit("usage: fake_tesseract.py <image|list.txt> stdout [-l lang] [--psm n]")
+    source = sys.argv[1]
+    if source.endswith(".txt"):
+        with open(source, encoding="utf-8") as f:
+            paths = [line.strip() for line in f if line.strip()]
+    else:
+        paths = [source]
+    burn(float(os.environ.get("FAKE_OCR_LOAD_MS", 150)))
+    cpu_ms = float(os.environ.get("FAKE_OCR_CPU_MS", 40))
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            sys.exit(f"Error opening data file {path}: {e}")
+        burn(cpu_ms)
+        sys.stdout.write(label(data) + "\f")
@@ -0,0 +1,160 @@
+"""
+Times and memory-profiles the main pipeline steps on synthetic catalogues.
+
+Every benchmark runs once for timing and once under tracemalloc for peak
+Python memory. Results are written to benchmarks/results/<time>_<commit>.json
+and compared with the previous results file, so a regression shows up as a
+slower or larger entry.
+
+Usage:
+    python benchmarks/run_suite.py --sizes 1000,10000,100000
+    python benchmarks/run_suite.py --sizes 1000000 --only html,images --no-memory
+    python benchmarks/run_suite.py --compare benchmarks/results/<file>.json
+"""
+import argparse
+import contextlib
+import gc
+import glob
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.fake_llm_server import start_fake_llm_server
+from benchmarks.synthetic_catalogue import generate_catalogue
+from src.bonus_mechanism import rank_by_savings
+from src.check_products import filter_and_split_json
+from src.json_to_html import clear_render_caches, generate_product_email_html, get_image_url_by_width
+from src.llm_process import ChatCompletionsLLM
+from src.llm_scheduler import LLMBatchScheduler
+from src.product_store import ProductStore
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def bench_filter_and_split(products, context):
+    directory = tempfile.mkdtemp()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()): # per-run summary printout
+            filter_and_split_json(products, directory, output_format="compact")
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_html_cold(products, context):
+    clear_render_caches()
+    generate_product_email_html(products)
+
+
+def bench_html_warm(products, context):
+    generate_product_email_html(products)
+
+
+def bench_image_urls(products, context):
+    for product in products:
+        get_image_url_by_width(product["images"], 400)
+
+
+def bench_llm_stage(products, context):
+    # Mirrors extract_image_information against the fake model, capped in size
+    store = ProductStore(products)
+    positions = rank_by_savings(store, store.query(bonus_only=True, max_price=6))[:context["llm_items"]]
+    llm = ChatCompletionsLLM("fake-model", context["llm_url"])
+    scheduler = LLMBatchScheduler(llm, batch_size=8, max_concurrency=4)
+    scheduler.generate_many(f"Healthy recipe for {item.get('title', 'product')}" for item in store.rows(positions))
+
+
+BENCHMARKS = {
+    "filter": bench_filter_and_split,
+    "html": bench_html_cold,
+    "html_warm": bench_html_warm,
+    "images": bench_image_urls,
+    "llm": bench_llm_stage,
+}
+
+
+def measure(func, products, context, memory):
+    gc.collect()
+    start = time.perf_counter()
+    func(products, context)
+    seconds = time.perf_counter() - start
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        func(products, context)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, previous_path):
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = {(r["benchmark"], r["size"]): r for r in json.load(f)["results"]}
+    print(f"\nCompared with {os.path.basename(previous_path)}:")
+    for result in results:
+        before = previous.get((result["benchmark"], result["size"]))
+        if not before:
+            continue
+        change = (result["seconds"] / before["seconds"] - 1) * 100 if before["seconds"] else 0.0
+        line = f"  {result['benchmark']:<10} {result['size']:>8}  time {change:+6.1f}%"
+        if result["peak_bytes"] and before.get("peak_bytes"):
+            line += f"  memory {(result['peak_bytes'] / before['peak_bytes'] - 1) * 100:+6.1f}%"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark suite on synthetic catalogues")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated catalogue sizes")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help="Comma-separated benchmarks to run")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc runs")
+    parser.add_argument("--llm-items", type=int, default=200, help="Prompts sent in the LLM benchmark")
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--compare", help="Results file to compare with (default: the latest one)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    names = args.only.split(",")
+    server, llm_url, _ = start_fake_llm_server(latency=args.llm_latency)
+    context = {"llm_url": llm_url, "llm_items": args.llm_items}
+    previous_files = sorted(glob.glob(os.path.join(RESULTS_DIR, "*.json")))
+    results = []
+    try:
+        for size in (int(s) for s in args.sizes.split(",")):
+            products = list(generate_catalogue(size, seed=args.seed))
+            for name in names:
+                seconds, peak = measure(BENCHMARKS[name], products, context, memory=not args.no_memory)
+                results.append({"benchmark": name, "size": size, "seconds": seconds, "peak_bytes": peak,
+                                "items_per_second": size / seconds if seconds else None})
+                memory = f"{peak / 1e6:8.1f} MB" if peak is not None else ""
+                print(f"{name:<10} {size:>8}  {seconds:8.3f}s  {size / seconds:12.0f} items/s  {memory}")
+            del products
+    finally:
+        server.shutdown()
+
+    commit = git_commit()
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d_%H%M%S}_{commit}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"commit": commit, "python": platform.python_version(), "platform": platform.platform(),
+                   "results": results}, f, indent=2)
+    print(f"\nResults saved to {path}")
+    if args.compare or previous_files:
+        compare(results, args.compare or previous_files[-1])
@@ -0,0 +1,123 @@
+"""
+Local stand-in for api.ah.nl used by the benchmarks.
+
+Serves the anonymous token endpoint and the bonus product search endpoint from
+one of the JSON dumps in data/output, with an artificial per-request latency so
+that sequential and concurrent fetching can be compared on a laptop.
+
+Usage:
+    python benchmarks/stub_ah_server.py --port 8765 --latency 0.2
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+DEFAULT_DUMP = os.path.join(os.path.dirname(__file__), "..", "data", "output", "bonus_items.json")
+
+
+def make_handler(products, latency, fail_every=0):
+    """
+    Builds a request handler class serving `products` page by page.
+
+    Search pages carry an ETag and answer 304 to a matching If-None-Match, so
+    conditional fetching can be exercised. `products` may be mutated between
+    runs to simulate catalogue changes.
+
+    Args:
+        products (list): Products served by the search endpoint.
+        latency (float): Seconds to sleep before answering every request.
+        fail_every (int): When > 0, every n-th search request answers 503 once
+                          so that the client retry path is exercised.
+    """
+    counter = {"requests": 0}
+    lock = threading.Lock()
+
+    class StubAHHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # keep-alive, so connection reuse is measurable
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload, etag=False):
+            body = json.dumps(payload).encode("utf-8")
+            if etag:
+                tag = '"%s"' % hashlib.sha1(body).hexdigest()
+                if self.headers.get("If-None-Match") == tag:
+                    self.send_response(304)
+                    self.send_header("ETag", tag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if etag:
+                self.send_header("ETag", tag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            self.rfile.read(length)
+            time.sleep(latency)
+            if self.path.startswith("/mobile-auth/v1/auth/token/anonymous"):
+                self._send_json(200, {"access_token": "stub-token", "expires_in": 3600})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            time.sleep(latency)
+            if not parsed.path.startswith("/mobile-services/product/search/v2"):
+                self._send_json(404, {"error": "not found"})
+                return
+
+            with lock:
+                counter["requests"] += 1
+                should_fail = fail_every and counter["requests"] % fail_every == 0
+            if should_fail:
+                self._send_json(503, {"error": "try again"})
+                return
+
+            query = parse_qs(parsed.query)
+            page = int(query.get("page", ["0"])[0])
+            size = int(query.get("size", ["100"])[0])
+            self._send_json(200, {"products": products[page * size:(page + 1) * size]}, etag=True)
+
+    return StubAHHandler
+
+
+def start_stub_server(products=None, port=0, latency=0.05, fail_every=0):
+    """
+    Starts the stub server in a background thread.
+
+    Returns:
+        tuple: (server, base_url). Call server.shutdown() when done.
+    """
+    if products is None:
+        with open(DEFAULT_DUMP, "r", encoding="utf-8") as f:
+            products = json.load(f)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(products, latency, fail_every))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub AH API server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--dump", default=DEFAULT_DUMP)
+    args = parser.parse_args()
+
+    with open(args.dump, "r", encoding="utf-8") as f:
+        stub_products = json.load(f)
+    httpd = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(stub_products, args.latency))
+    print(f"Serving {len(stub_products)} products on http://127.0.0.1:{args.port}")
+    httpd.serve_forever()
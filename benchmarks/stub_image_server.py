@@ -0,0 +1,120 @@
+"""
+Local stand-in for static.ah.nl product images.
+
+Serves /dam/product/<asset>?rendition=<w>x<h>_... as a decodable PNG of
+that size (about as large as AH's JPEGs), drawn from the asset id and
+revLabel, so the same URL always returns the same bytes and a new revision
+returns different ones. Assets listed in `missing` answer 404, like
+withdrawn product images.
+
+Usage:
+    python benchmarks/stub_image_server.py --port 8768 --latency 0.02
+"""
+import argparse
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+_RENDITION = re.compile(r"(\d+)x(\d+)")
+
+
+def _chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+_pixels = {} # (width, height, variant) -> IHDR and IDAT chunks
+
+
+def png(width, height, seed):
+    """
+    Returns an RGB PNG of coloured bands with a noisy strip, seeded by `seed`.
+
+    Pixels come from one of 64 variants per size, so serving stays cheap;
+    a text chunk carrying the seed keeps every image's bytes unique.
+    """
+    variant = zlib.crc32(seed.encode()) % 64
+    key = (width, height, variant)
+    chunks = _pixels.get(key)
+    if chunks is None:
+        rng = random.Random(variant)
+        rows = []
+        for y in range(height):
+            if y % 16 == 0: # incompressible strip, like photo detail
+                rows.append(b"\0" + rng.randbytes(width * 3))
+            else:
+                rows.append(b"\0" + struct.pack("<I", zlib.crc32(f"{variant}:{y * 4 // height}".encode()))[:3] * width)
+        header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+        chunks = _pixels[key] = _chunk(b"IHDR", header) + _chunk(b"IDAT", zlib.compress(b"".join(rows), 6))
+    return b"\x89PNG\r\n\x1a\n" + chunks + _chunk(b"tEXt", b"Comment\0" + seed.encode()) + _chunk(b"IEND", b"")
+
+
+def make_handler(latency, missing=()):
+    counter = {"requests": 0, "bytes": 0, "not_found": 0}
+    lock = threading.Lock()
+    missing = set(missing)
+
+    class StubImageHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        wbufsize = -1 # headers and body in one send, no Nagle/delayed-ACK stall
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            asset = parts.path.rsplit("/", 1)[-1]
+            query = parse_qs(parts.query)
+            match = _RENDITION.match(query.get("rendition", [""])[0])
+            time.sleep(latency)
+            if not parts.path.startswith("/dam/product/") or not match or asset in missing:
+                with lock:
+                    counter["requests"] += 1
+                    counter["not_found"] += 1
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            data = png(int(match[1]), int(match[2]), f"{asset}:{query.get('revLabel', ['1'])[0]}")
+            with lock:
+                counter["requests"] += 1
+                counter["bytes"] += len(data)
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+            self.end_headers()
+            self.wfile.write(data)
+
+    return StubImageHandler, counter
+
+
+def start_stub_image_server(port=0, latency=0.0, missing=()):
+    """
+    Starts the stub image server in a background thread.
+
+    Returns:
+        tuple: (server, base_url, counter) with counts of requests, bytes served
+               and 404s. Point product image URLs at base_url instead of
+               https://static.ah.nl.
+    """
+    handler, counter = make_handler(latency, missing)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", counter
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub AH image server")
+    parser.add_argument("--port", type=int, default=8768)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+    handler, _ = make_handler(args.latency)
+    print(f"Serving stub images on http://127.0.0.1:{args.port}")
+    ThreadingHTTPServer(("127.0.0.1", args.port), handler).serve_forever()
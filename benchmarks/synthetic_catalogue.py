@@ -0,0 +1,162 @@
+"""
+Generates synthetic AH-shaped bonus catalogues of any size.
+
+Products carry the fields the pipeline reads: the five AH image renditions,
+discount labels matching their bonus mechanism, real main/sub categories,
+prices, Nutri-Scores and bonus periods. Mechanism strings and label codes
+follow the ones seen in data/filtered_jsons. Generation is deterministic for
+a seed, and streamed, so 1M-item catalogues can be written without holding
+them in memory.
+
+Usage:
+    python benchmarks/synthetic_catalogue.py 100000 data/output/synthetic_100k.json
+"""
+import argparse
+import json
+import os
+import random
+from datetime import date, timedelta
+
+# mainCategory -> (subCategories, product nouns)
+CATEGORIES = {
+    "Zuivel, eieren": (["Melk", "Yoghurt", "Eieren", "Boter"], ["halfvolle melk", "Griekse yoghurt", "scharreleieren", "roomboter", "kwark", "vla"]),
+    "Groente, aardappelen": (["Komkommer", "Paprika", "Aardappelen", "Sla"], ["komkommer", "paprika rood", "kruimige aardappelen", "broccoli", "spinazie", "wortelen"]),
+    "Frisdrank, sappen, water": (["Cola", "Sap", "Water"], ["cola zero", "sinaasappelsap", "bronwater", "ice tea", "appelsap"]),
+    "Fruit, verse sappen": (["Bessen", "Appels", "Bananen"], ["blauwe bessen", "aardbeien", "Elstar appels", "bananen", "mango"]),
+    "Borrel, chips, snacks": (["Chips", "Noten"], ["paprika chips", "gezouten pinda's", "tortilla chips", "borrelnoten"]),
+    "Vleeswaren": (["Ham", "Salami"], ["beenham", "salami", "kipfilet plakken", "rookvlees"]),
+    "Vlees": (["Kip", "Rund"], ["kipfilet", "rundergehakt", "varkenshaas", "kippendijen"]),
+    "Kaas": (["Jong belegen", "Oud"], ["jong belegen kaas", "oude kaas", "geraspte kaas", "mozzarella"]),
+    "Bier, wijn, aperitieven": (["Bier", "Wijn"], ["pilsener 6-pack", "rode wijn", "witbier", "rosé"]),
+    "Huishouden": (["Wasmiddel", "Schoonmaak"], ["wasmiddel", "allesreiniger", "vaatwastabletten"]),
+    "Diepvries": (["IJs", "Pizza"], ["roomijs vanille", "pizza margherita", "diepvriesspinazie"]),
+    "Bakkerij": (["Brood"], ["volkoren brood", "croissants", "krentenbollen"]),
+    "Koffie, thee": (["Koffie", "Thee"], ["koffiebonen", "koffiecups", "groene thee"]),
+    "Pasta, rijst, wereldkeuken": (["Pasta", "Rijst"], ["spaghetti", "basmati rijst", "penne", "noedels"]),
+    "Vis": (["Zalm", "Garnalen"], ["zalmfilet", "garnalen", "kabeljauw"]),
+    "Vegetarisch, vegan en plantaardig": (["Vleesvervangers"], ["vegetarische burger", "tofu", "falafel"]),
+}
+BRANDS = ["AH", "AH", "AH Biologisch", "AH Terra", "Coca-Cola", "Lay's", "Heineken", "Campina", "Unox", "Douwe Egberts"]
+NUTRISCORES = ["A", "B", "C", "D", "E", None]
+SALES_UNITS = ["per stuk", "2 stuks", "3 stuks", "150 g", "250 g", "500 g", "1 l", "1,5 l", "0,75 l", "500 ml"]
+RENDITIONS = [(800, "JPG_Q90"), (400, "JPG_Q85"), (200, "JPG_Q85"), (48, "GIF"), (80, "JPG")]
+
+
+def _mechanism(rng, price):
+    """
+    Returns (bonusMechanism, discountLabel, currentPrice) in the forms seen in the dumps.
+    """
+    kind = rng.choices(
+        ["volume", "x_plus_y", "one_free", "percentage", "x_for_y", "fixed", "half", "amount", "weight", "tiered"],
+        weights=[30, 15, 10, 10, 15, 6, 4, 3, 2, 5])[0]
+    if kind == "volume":
+        pct = rng.choice([5, 10, 15, 20, 30])
+        return f"{pct}% volume voordeel", {"code": "DISCOUNT_BUNDLE_BULK", "defaultDescription": f"{pct}% volume voordeel",
+                                           "percentage": pct, "precisePercentage": pct}, round(price * (1 - pct / 100), 2)
+    if kind == "x_plus_y":
+        count, free = rng.choice([(1, 1), (2, 1), (2, 3), (5, 1)])
+        mechanism = f"{count} + {free} gratis" if free < 3 else f"{count} + {free} GRATIS"
+        return mechanism, {"code": "DISCOUNT_X_PLUS_Y_FREE", "defaultDescription": f"{count}+{free} gratis",
+                           "count": count, "freeCount": free}, None
+    if kind == "one_free":
+        return "2e gratis", {"code": "DISCOUNT_ONE_FREE", "defaultDescription": "2e gratis", "count": 2}, None
+    if kind == "percentage":
+        pct = rng.choice([10, 20, 25, 30, 35])
+        mechanism = f"{pct}% korting" if rng.random() < 0.7 else f"{pct}% KORTING"
+        return mechanism, {"code": "DISCOUNT_PERCENTAGE", "defaultDescription": f"{pct}% korting",
+                           "percentage": pct, "precisePercentage": pct}, round(price * (1 - pct / 100), 2)
+    if kind == "x_for_y":
+        count = rng.choice([2, 2, 2, 3, 4])
+        total = round(price * count * rng.uniform(0.6, 0.85), 2)
+        return f"{count} voor {total:.2f}", {"code": "DISCOUNT_X_FOR_Y", "defaultDescription": f"{count} voor {total:.2f}",
+                                             "count": count, "price": total}, None
+    if kind == "fixed":
+        fixed = round(price * rng.uniform(0.6, 0.85), 2)
+        return f"VOOR {fixed:.2f}", {"code": "DISCOUNT_FIXED_PRICE", "defaultDescription": f"voor {fixed:.2f}",
+                                     "price": fixed}, fixed
+    if kind == "half":
+        return "2e Halve Prijs", {"code": "DISCOUNT_ONE_HALF_PRICE", "defaultDescription": "2e halve prijs", "count": 2}, None
+    if kind == "amount":
+        amount = rng.choice([0.5, 1.0, 2.0])
+        return f"{amount:g} euro korting", {"code": "DISCOUNT_AMOUNT", "defaultDescription": f"€{amount:.2f} euro korting",
+                                            "amount": amount}, round(max(price - amount, 0.1), 2)
+    if kind == "weight":
+        grams = rng.choice([100, 500])
+        per = round(price * rng.uniform(0.5, 0.8), 2)
+        return f"{grams} GRAM VOOR {per:.2f}", {"code": "DISCOUNT_WEIGHT", "defaultDescription": f"per {grams} GRAM voor €{per:.2f}",
+                                                 "count": grams, "price": per, "unit": "GRAM"}, per
+    return "stapelen tot 50%", {"code": "DISCOUNT_TIERED_PERCENT", "defaultDescription": "2 stuks 50%", "count": 2,
+                                "percentage": 50, "unit": "PIECE", "precisePercentage": 50}, None
+
+
+def synthetic_product(rng, webshop_id, week_start, bonus_ratio=0.45):
+    main_category = rng.choice(list(CATEGORIES))
+    sub_categories, nouns = CATEGORIES[main_category]
+    brand = rng.choice(BRANDS)
+    price = round(rng.uniform(0.5, 15.0), 2)
+    asset = f"AHI_{webshop_id:016x}"
+    product = {
+        "webshopId": webshop_id,
+        "hqId": webshop_id * 7 + 3,
+        "title": f"{brand} {rng.choice(nouns)}",
+        "salesUnitSize": rng.choice(SALES_UNITS),
+        "images": [
+            {"width": width, "height": width,
+             "url": f"https://static.ah.nl/dam/product/{asset}?revLabel=1&rendition={width}x{width}_{quality}&fileType=binary"}
+            for width, quality in RENDITIONS
+        ],
+        "priceBeforeBonus": price,
+        "mainCategory": main_category,
+        "subCategory": rng.choice(sub_categories),
+        "brand": brand,
+        "nutriscore": rng.choice(NUTRISCORES),
+        "unitPriceDescription": f"prijs per kg €{price * rng.uniform(2, 10):.2f}",
+        "isBonus": rng.random() < bonus_ratio,
+        "discountLabels": [],
+    }
+    if product["isBonus"]:
+        mechanism, label, current_price = _mechanism(rng, price)
+        product.update({
+            "bonusMechanism": mechanism,
+            "bonusStartDate": week_start.isoformat(),
+            "bonusEndDate": (week_start + timedelta(days=6)).isoformat(),
+            "discountLabels": [label],
+        })
+        if current_price is not None:
+            product["currentPrice"] = current_price
+    return product
+
+
+def generate_catalogue(count, seed=0, bonus_ratio=0.45, week_start=date(2025, 6, 30)):
+    """
+    Yields `count` synthetic products with unique webshopIds.
+    """
+    rng = random.Random(seed)
+    for i in range(count):
+        yield synthetic_product(rng, 100000 + i, week_start, bonus_ratio)
+
+
+def write_catalogue(path, count, seed=0, bonus_ratio=0.45):
+    """
+    Streams a catalogue to `path` in the {"products": [...]} layout of the AH dumps.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"products": [')
+        for i, product in enumerate(generate_catalogue(count, seed, bonus_ratio)):
+            if i:
+                f.write(",")
+            f.write(json.dumps(product, ensure_ascii=False))
+        f.write("]}")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic AH catalogue")
+    parser.add_argument("count", type=int)
+    parser.add_argument("path")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bonus-ratio", type=float, default=0.45)
+    args = parser.parse_args()
+    write_catalogue(args.path, args.count, args.seed, args.bonus_ratio)
+    print(f"Wrote {args.count} products to {args.path} ({os.path.getsize(args.path) / 1e6:.1f} MB)")
@@ -1,116 +1,290 @@
-import os
-import json
-import yaml
-import logging
-from datetime import datetime
-
-# Import core modules from the src directory
-from src.get_bonus import get_daily_bonus_items
-from src.check_products import filter_products_for_recommendation
-from src.llm_process import process_with_llm_and_generate_json
-from src.json_to_html import generate_product_email_html as json_to_html_generator
-from src.send_email import send_html_email_sendpulse
-
-# Ensure data/outputs directory exists
-OUTPUT_JSON_DIR = "data/outputs"
-os.makedirs(OUTPUT_JSON_DIR, exist_ok=True)
-
-def main():
-    # Configure logging
-    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-    logging.info("Starting AH Recommendation System Pipeline...")
-
-    # Load configuration
-    try:
-        with open('config.yml', 'r') as f:
-            config = yaml.safe_load(f)
-        logging.info("Configuration loaded successfully.")
-    except FileNotFoundError:
-        logging.error("Error: config.yml not found. Please create it as per the README.")
-        return
-    except Exception as e:
-        logging.error(f"Error loading config.yml: {e}")
-        return
-
-    # --- Step 1: Get Bonus Items ---
-    logging.info("Step 1: Getting daily bonus items...")
-    try:
-        raw_bonus_items = get_daily_bonus_items(config)
-        if not raw_bonus_items:
-            logging.warning("No raw bonus items retrieved. Exiting.")
-            return
-        logging.info(f"Retrieved {len(raw_bonus_items)} raw bonus items.")
-    except Exception as e:
-        logging.error(f"Error in getting daily bonus items: {e}")
-        return
-
-    # --- Step 2: Filter Products and Process with LLM for Recipes ---
-    logging.info("Step 2: Filtering products and processing with LLM for recipes...")
-    try:
-        # Filter products first
-        filtered_products = filter_products_for_recommendation(raw_bonus_items, config)
-        if not filtered_products:
-            logging.warning("No products passed the filtering stage. Exiting.")
-            return
-        logging.info(f"Filtered down to {len(filtered_products)} products.")
-
-        # Process filtered products with LLM to get recipes and structured JSON
-        current_date_str = datetime.now().strftime('%Y%m%d')
-        output_json_filename = config['output_paths']['generated_recommendations_json'].format(date=current_date_str)
-        output_json_path = os.path.join(OUTPUT_JSON_DIR, output_json_filename)
-
-        final_recommendation_data = process_with_llm_and_generate_json(
-            filtered_products, 
-            config, 
-            output_json_path
-        )
-        
-        if not final_recommendation_data:
-            logging.warning("LLM processing did not yield any recommendations or recipes. Exiting.")
-            return
-        logging.info(f"LLM processing complete. Recommendations saved to {output_json_path}")
-
-    except Exception as e:
-        logging.error(f"Error in LLM processing or product filtering: {e}")
-        return
-
-    # --- Step 3: Generate HTML Email ---
-    logging.info("Step 3: Generating HTML email content from processed JSON...")
-    try:
-        # json_to_html_generator takes the path to the JSON file to read from
-        html_output_path = config['email']['html_output_file']
-        json_to_html_generator(output_json_path, html_output_path)
-        logging.info(f"HTML email content saved to {html_output_path}")
-    except Exception as e:
-        logging.error(f"Error in generating HTML email: {e}")
-        return
-
-    # --- Step 4: Send Email (via SendPulse) ---
-    logging.info("Step 4: Sending email...")
-    try:
-        sender_email = os.environ.get(config['email']['sender_email_env_var'])
-        sender_name = config['email']['sender_name']
-        receiver_email = os.environ.get(config['email']['receiver_email_env_var'])
-        subject = f"{config['email']['subject_prefix']} Daily Recommendations - {datetime.now().strftime('%Y-%m-%d')}"
-
-        api_id = os.environ.get(config['sendpulse']['api_id_env_var'])
-        api_secret = os.environ.get(config['sendpulse']['api_secret_env_var'])
-
-        send_html_email_sendpulse(
-            sender_email=sender_email,
-            sender_name=sender_name,
-            receiver_email=receiver_email,
-            subject=subject,
-            html_content_file=html_output_path,
-            api_id=api_id,
-            api_secret=api_secret
-        )
-        logging.info("Email sending process initiated.")
-    except Exception as e:
-        logging.error(f"Error in sending email: {e}")
-        return
-
-    logging.info("AH Recommendation System Pipeline finished successfully.")
-
-if __name__ == "__main__":
-    main()
+import os
+import json
+import sys
+import shlex
+import shutil
+import yaml
+import logging
+import argparse
+from datetime import date, datetime, timedelta
+
+# Import core modules from the src directory
+from src import metrics
+from src.basket_optimizer import optimise_basket
+from src.bonus_mechanism import compute_savings, rank_by_savings
+from src.email_dispatch import EmailDispatcher, SendPulseClient, digest_messages
+from src.embedding_index import DEFAULT_INDEX_PATH, EmbeddingIndex
+from src.image_cache import ImageCache
+from src.image_facts import ImageFactExtractor
+from src.incremental_ingest import fetch_bonus_catalogue
+from src.json_to_html import MAX_EMAIL_BYTES, generate_product_email_html
+from src.llm_process import extract_image_information
+from src.outbox import Outbox
+from src.personalise import DIGEST_DIR, generate_digests, load_subscribers
+from src.pipeline import Pipeline, Stage
+from src.price_history import PriceHistory, rank_deals, score_deals
+from src.product_store import ProductStore
+from src.search_index import DEFAULT_SEARCH_PATH, SearchIndex
+from src.snapshot import (SNAPSHOT_DIR, latest_snapshot, open_snapshot, prune_snapshots, save_snapshot,
+                          snapshot_path, snapshot_version)
+
+
+# --- Stages ---
+# Each stage receives the config and the outputs of its input stages by name.
+
+def ingest_stage(config):
+    # Unchanged pages are revalidated with ETags; the delta is relative to the previous run
+    products, delta = fetch_bonus_catalogue(concurrent=True)
+    if not products:
+        raise RuntimeError("No bonus items retrieved.")
+    # Downstream stages map the catalogue from a snapshot; a new one is only
+    # written on the fetch date on which the catalogue changed
+    settings = config.get("snapshots", {})
+    directory = settings.get("directory", SNAPSHOT_DIR)
+    path = latest_snapshot(directory)
+    if path is None or snapshot_version(path) != delta["version"]:
+        path = save_snapshot(ProductStore(products), snapshot_path(directory=directory), version=delta["version"])
+        prune_snapshots(settings.get("keep", 7), directory)
+    return {"products": products, "delta": delta, "snapshot": path}
+
+
+def fetch_stage(config, ingest):
+    # A reference to the catalogue alone, so stages reading it stay cached while it is unchanged.
+    # Stages reading it take the whole catalogue rather than the delta: the rankings, the
+    # email and the digests list every current offer, not only the ones that changed.
+    # Their per-product work is still limited to the delta by content-keyed caches:
+    # images by URL, facts by image revision and LLM recipes by prompt; rendering HTML is
+    # cheap in comparison. The indexes, which keep state per product, sync the delta.
+    return {"snapshot": ingest["snapshot"], "version": ingest["delta"]["version"]}
+
+
+def savings_stage(config, fetch):
+    store = open_snapshot(fetch["snapshot"])
+    _, discounts = compute_savings(store)
+    return {"ranking": [store.webshop_id[p] for p in rank_by_savings(store)],
+            "discounts": {store.webshop_id[p]: discounts[p] for p in range(len(store)) if discounts[p] == discounts[p]}}
+
+
+def history_stage(config, fetch):
+    # Records today's prices, then scores them against the days before today
+    history = PriceHistory.from_config(config)
+    store = open_snapshot(fetch["snapshot"])
+    today = date.today()
+    appended = history.append(store, today)
+    stats = history.stats(until=today - timedelta(days=1))
+    tolerance = config.get("price_history", {}).get("inflation_tolerance", 0.05)
+    _, inflated, lowest = score_deals(store, stats, tolerance)
+    return {"appended": appended,
+            "ranking": [store.webshop_id[p] for p in rank_deals(store, stats, inflation_tolerance=tolerance)],
+            "inflated": [store.webshop_id[p] for p in range(len(store)) if inflated[p]],
+            "lowest": [store.webshop_id[p] for p in range(len(store)) if lowest[p]]}
+
+
+def embeddings_stage(config, ingest):
+    # The saved index only takes the delta when it reflects the catalogue the delta starts from
+    delta = ingest["delta"]
+    index = EmbeddingIndex.load(DEFAULT_INDEX_PATH) if os.path.exists(f"{DEFAULT_INDEX_PATH}.json") else None
+    if index is not None and index.version == delta["base_version"]:
+        index.sync(delta)
+        logging.info(f"Embedding index synced: {len(delta['added']) + len(delta['changed'])} embedded, "
+                     f"{len(delta['expired'])} expired")
+    else:
+        index = EmbeddingIndex()
+        index.add(ingest["products"])
+        logging.info(f"Embedding index rebuilt: {len(index)} products")
+    index.version = delta["version"]
+    index.save(DEFAULT_INDEX_PATH)
+    return index
+
+
+def search_stage(config, ingest):
+    delta = ingest["delta"]
+    index = SearchIndex.load(DEFAULT_SEARCH_PATH) if os.path.exists(DEFAULT_SEARCH_PATH) else SearchIndex()
+    if index.version is not None and index.version == delta["base_version"]:
+        index.sync(delta)
+        logging.info(f"Search index synced: {len(delta['added']) + len(delta['changed'])} indexed, "
+                     f"{len(delta['expired'])} expired")
+    else:
+        # Out of step with the ingest: compare against the whole catalogue, still
+        # re-tokenising only products whose text changed
+        logging.info(f"Search index update: {index.update(ingest['products'])}")
+    index.version = delta["version"]
+    index.save(DEFAULT_SEARCH_PATH)
+    return index
+
+
+def images_stage(config, fetch):
+    cache = ImageCache.from_config(config)
+    summary = cache.prefetch_products(open_snapshot(fetch["snapshot"]).products, config.get("image_cache", {}).get("width", 400))
+    cache.close()
+    logging.info(f"Images: {summary['fetched']} fetched, {summary['cached']} cached, "
+                 f"{len(summary['failed'])} failed, {summary['evicted']} evicted")
+    return summary
+
+
+def facts_stage(config, fetch):
+    # Only image revisions not seen before are OCR'd; the rest come from the facts cache
+    cache = ImageCache.from_config(config)
+    extractor = ImageFactExtractor.from_config(cache, config)
+    facts, stats = extractor.extract(open_snapshot(fetch["snapshot"]).products)
+    extractor.close()
+    cache.close()
+    rate = f"{stats['images_per_second']:.1f} images/s" if stats["images_per_second"] else "nothing new"
+    logging.info(f"Image facts ({stats['model']}): {stats['processed']} processed, {stats['cached']} cached, "
+                 f"{stats['failed']} failed, {rate}")
+    return {"facts": facts, "failed": stats["failed"]}
+
+
+def recipes_stage(config, fetch, facts, search):
+    store = open_snapshot(fetch["snapshot"])
+    store.attach_facts(facts["facts"])
+    recommended_items, generated_recipes = extract_image_information(store)
+    if not recommended_items:
+        raise RuntimeError("LLM processing did not yield any recommendations.")
+
+    settings = config.get("recommendation_settings", {})
+    recipes_file = settings.get("recipes_file", "data/recipes.json")
+    if not os.path.exists(recipes_file):
+        logging.info(f"No recipes file at {recipes_file}; skipping the basket plan.")
+        return {"items": recommended_items, "recipes": generated_recipes, "basket": None}
+    with open(recipes_file, "r", encoding="utf-8") as f:
+        recipes = json.load(f)
+    basket = optimise_basket(recipes, store, settings.get("basket_budget", 40),
+                             settings.get("basket_objective", "savings"), index=search)
+    logging.info(f"Basket plan: {len(basket['recipes'])} recipes, {len(basket['products'])} products, "
+                 f"cost {basket['total_cost']:.2f}, saves {basket['total_savings']:.2f}")
+    # Recommendations the planned recipes use come first
+    in_basket = {product["webshopId"] for product in basket["products"]}
+    recommended_items.sort(key=lambda item: item.get("webshopId") not in in_basket)
+    return {"items": recommended_items, "recipes": generated_recipes, "basket": basket}
+
+
+def html_stage(config, recipes):
+    return generate_product_email_html(recipes["items"])
+
+
+def archive_stage(config, html, images):
+    # A self-contained copy of the email, rendered from the image cache only
+    directory = config.get("image_cache", {}).get("archive_directory", os.path.join("data", "html", "archive"))
+    os.makedirs(directory, exist_ok=True)
+    cache = ImageCache.from_config(config)
+    path = os.path.join(directory, f"{date.today().isoformat()}.html")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(cache.localise_html(html, inline=True))
+    cache.close()
+    return path
+
+
+def digests_stage(config, fetch):
+    settings = config.get("digests", {})
+    subscribers_file = settings.get("subscribers_file", "data/subscribers.json")
+    if not os.path.exists(subscribers_file):
+        logging.info(f"No subscribers file at {subscribers_file}; skipping personalised digests.")
+        return []
+    # Worker processes map the same snapshot instead of receiving the catalogue
+    return generate_digests(open_snapshot(fetch["snapshot"]), load_subscribers(subscribers_file),
+                            settings.get("output_directory", DIGEST_DIR), snapshot_path=fetch["snapshot"],
+                            max_workers=settings.get("max_workers"),
+                            max_bytes=settings.get("max_email_bytes", MAX_EMAIL_BYTES))
+
+
+def send_stage(config, html, digests):
+    html_output_path = config['email']['html_output_file']
+    with open(html_output_path, 'w', encoding='utf-8') as f:
+        f.write(html)
+    logging.info(f"HTML email content saved to {html_output_path}")
+
+    client = SendPulseClient.from_config(config)
+    sender_email = os.environ.get(config['email']['sender_email_env_var'])
+    receiver_email = os.environ.get(config['email']['receiver_email_env_var'])
+    if not (client.api_id and client.api_secret and sender_email):
+        logging.warning("SendPulse credentials or sender email missing; not sending.")
+        return {"sent": 0, "failed": 0}
+
+    subject = f"{config['email']['subject_prefix']} Daily Recommendations - {datetime.now().strftime('%Y-%m-%d')}"
+    sender_name = config['email']['sender_name']
+    # The outbox skips recipients already sent to today, so reruns only send the rest.
+    # The main email is its own campaign, so a receiver who also subscribes to a
+    # digest gets both instead of colliding with the digest's first part.
+    outbox = Outbox.from_config(config)
+    outbox.enqueue(digest_messages(digests, subject, sender_email, sender_name))
+    if receiver_email:
+        outbox.enqueue([{"to": receiver_email, "subject": subject, "sender_email": sender_email,
+                         "sender_name": sender_name, "html_file": html_output_path}], campaign="daily")
+    summary = outbox.drain(EmailDispatcher.from_config(client, config),
+                           batch_size=config.get("outbox", {}).get("batch_size", 100))
+    logging.info(f"Email sending finished: {summary}, outbox: {outbox.counts(date.today().isoformat())}")
+    return summary
+
+
+def build_pipeline(config):
+    today = lambda: date.today().isoformat()
+    # Installing or removing the OCR tool changes what the facts stage extracts
+    ocr_command = lambda: str(shutil.which(shlex.split(config.get("image_facts", {}).get("ocr_command") or "-")[0]))
+    recipes_file = config.get("recommendation_settings", {}).get("recipes_file", "data/recipes.json")
+    return Pipeline([
+        Stage("ingest", ingest_stage, config_keys=["snapshots"], fingerprint=today), # refetched once a day
+        Stage("fetch", fetch_stage, inputs=["ingest"]),
+        Stage("savings", savings_stage, inputs=["fetch"], files=["src/bonus_mechanism.py"]),
+        Stage("history", history_stage, inputs=["fetch"], config_keys=["price_history"],
+              fingerprint=today), # records every day, also when the catalogue is unchanged
+        Stage("embeddings", embeddings_stage, inputs=["ingest"], files=["src/embedding_index.py"]),
+        Stage("search", search_stage, inputs=["ingest"], files=["src/search_index.py"]),
+        Stage("images", images_stage, inputs=["fetch"], config_keys=["image_cache"], cache=False),
+        # After the images stage, so its downloads and evictions are done; only
+        # complete results are reused, images that failed are retried next run
+        Stage("facts", facts_stage, inputs=["fetch"], config_keys=["image_facts"],
+              files=["src/image_facts.py"], fingerprint=ocr_command, after=["images"],
+              cache=lambda facts: not facts["failed"]),
+        Stage("recipes", recipes_stage, inputs=["fetch", "facts", "search"],
+              files=[recipes_file, "src/basket_optimizer.py"],
+              config_keys=["llm_config", "langgraph_config", "llm_scheduler", "recommendation_settings"]),
+        Stage("html", html_stage, inputs=["recipes"], files=["src/json_to_html.py"]),
+        Stage("archive", archive_stage, inputs=["html", "images"], config_keys=["image_cache"], cache=False),
+        Stage("digests", digests_stage, inputs=["fetch"], config_keys=["digests"], cache=False),
+        Stage("send", send_stage, inputs=["html", "digests"], config_keys=["email", "sendpulse"], cache=False),
+    ], config, max_workers=config.get("pipeline", {}).get("max_workers", 4))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AH Recommendation System Pipeline")
+    parser.add_argument("targets", nargs="*", help="Stages to produce (default: all)")
+    parser.add_argument("--force", nargs="*", default=[], help="Stages to rerun even when cached")
+    args = parser.parse_args()
+
+    # Configure logging
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.info("Starting AH Recommendation System Pipeline...")
+
+    # Load configuration
+    try:
+        with open('config.yml', 'r') as f:
+            config = yaml.safe_load(f)
+        logging.info("Configuration loaded successfully.")
+    except FileNotFoundError:
+        logging.error("Error: config.yml not found. Please create it as per the README.")
+        return 1
+    except Exception as e:
+        logging.error(f"Error loading config.yml: {e}")
+        return 1
+
+    metrics_settings = config.get("metrics", {})
+    if metrics_settings.get("enabled"):
+        metrics.enable()
+    pipeline = build_pipeline(config)
+    unknown = [name for name in args.targets + args.force if name not in pipeline.stages]
+    if unknown:
+        parser.error(f"unknown stage(s) {', '.join(unknown)}; choose from {', '.join(pipeline.stages)}")
+    report = pipeline.run(targets=args.targets or None, force=args.force)
+    if metrics_settings.get("enabled") and metrics_settings.get("prometheus_file"):
+        metrics.write_prometheus(metrics_settings["prometheus_file"])
+    for name, stage in report["stages"].items():
+        logging.info(f"  {name:<11} {stage['status']:<8} {stage.get('seconds', 0):.2f}s")
+    if report["failed"]:
+        logging.error(f"Pipeline failed at {report['failed']}; rerun to resume. Report: {report['report']}")
+        return 1
+    logging.info(f"AH Recommendation System Pipeline finished in {report['seconds']:.2f}s. Report: {report['report']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+import math
+import time
+
+from src.bonus_mechanism import compute_savings, parse_mechanism
+from src.search_index import SearchIndex
+
+# Health points per Nutri-Score rank (A best); unknown scores count as neutral
+HEALTH_POINTS = {0: 2.5, 1: 5, 2: 4, 3: 3, 4: 2, 5: 1}
+
+
+def _offer(store, position, effective_prices):
+    """
+    Returns (quantity, cost, savings) of buying a product under its bonus.
+
+    Multi-buy mechanisms ("2 voor 3.99", "1 + 1 gratis") need their full
+    quantity to get the discount; the whole pack is bought.
+    """
+    regular = store.price_before_bonus[position]
+    if math.isnan(regular):
+        regular = store.price[position]
+    effective = effective_prices[position]
+    if math.isnan(effective):
+        return 1, regular, 0.0
+    rule = parse_mechanism(store.products[position].get("bonusMechanism"))
+    quantity = rule.get("quantity", 1) if rule else 1
+    return quantity, quantity * effective, quantity * max(regular - effective, 0.0)
+
+
+def resolve_ingredients(ingredients, store, index, effective_prices, k=5, min_relative_score=0.75):
+    """
+    Picks, for every ingredient, the bonus product with the lowest effective
+    price among its closest matches from SearchIndex.resolve: the top `k`
+    scoring at least `min_relative_score` of the best match's score.
+
+    Returns:
+        dict: {ingredient: store position}; unmatched ingredients are left out,
+              and so are products without any price, which cannot be budgeted.
+    """
+    positions = {webshop_id: p for p, webshop_id in enumerate(store.webshop_id)}
+    resolved = {}
+    for ingredient, matches in index.resolve(ingredients, k=k).items():
+        best = None
+        for webshop_id, score in matches:
+            position = positions.get(webshop_id)
+            if position is None or score < min_relative_score * matches[0][1]:
+                continue
+            price = effective_prices[position]
+            price = store.price[position] if math.isnan(price) else price
+            if math.isnan(price):
+                continue
+            if best is None or price < best[0]:
+                best = (price, position)
+        if best is not None:
+            resolved[ingredient] = best[1]
+    return resolved
+
+
+def optimise_basket(recipes, store, budget, objective="savings", index=None, time_budget=0.2):
+    """
+    Chooses recipes and the bonus products to buy for them.
+
+    Recipes sharing a product only pay for it once, so the value of a recipe
+    depends on what is already in the basket. The optimiser runs a greedy
+    selection on marginal value per marginal euro, updating only the recipes
+    that share a product with each pick, followed by swap-based local search
+    until `time_budget` seconds have passed. Recipes adding no value are never
+    picked, and budget freed by a swap is refilled greedily.
+
+    Args:
+        recipes (list): {"name": str, "ingredients": [str, ...]} dictionaries.
+        store (ProductStore): Current bonus catalogue.
+        budget (float): Maximum amount to spend on products.
+        objective (str): "savings" maximises euros saved, "health" the summed
+                         Nutri-Score points of the bought products.
+        index (SearchIndex): Full-text product index used to resolve
+                             ingredients; built from the store when omitted.
+        time_budget (float): Seconds available, including ingredient resolution.
+
+    Returns:
+        dict: {"recipes": [...], "products": [{webshopId, title, quantity, cost, savings}],
+               "total_cost", "total_savings", "total_health", "elapsed"}
+    """
+    start = time.perf_counter()
+    effective_prices, _ = compute_savings(store)
+    if index is None:
+        index = SearchIndex()
+        index.add(store.products)
+
+    # Resolve every distinct ingredient once
+    ingredients = {i for recipe in recipes for i in recipe.get("ingredients", [])}
+    resolved = resolve_ingredients(ingredients, store, index, effective_prices)
+
+    offers = {}
+    recipe_products = []
+    for recipe in recipes:
+        products = {resolved[i] for i in recipe.get("ingredients", []) if i in resolved}
+        for position in products:
+            if position not in offers:
+                quantity, cost, savings = _offer(store, position, effective_prices)
+                offers[position] = (quantity, cost, savings, HEALTH_POINTS[store.nutriscore[position]])
+        recipe_products.append(products)
+
+    value_of = 2 if objective == "savings" else 3
+    users = {} # product -> recipes using it
+    for r, products in enumerate(recipe_products):
+        for position in products:
+            users.setdefault(position, []).append(r)
+
+    # Marginal cost/value of each recipe given the current basket
+    marginal_cost = [sum(offers[p][1] for p in products) for products in recipe_products]
+    marginal_value = [sum(offers[p][value_of] for p in products) for products in recipe_products]
+
+    basket = set()
+    chosen = []
+    spent = 0.0
+    candidates = {r for r, products in enumerate(recipe_products) if products}
+    while candidates:
+        best, best_ratio = None, 0.0
+        for r in candidates:
+            cost = marginal_cost[r]
+            if marginal_value[r] <= 0 or spent + cost > budget:
+                continue
+            ratio = marginal_value[r] / cost if cost > 0 else math.inf
+            if ratio > best_ratio:
+                best, best_ratio = r, ratio
+        if best is None:
+            break
+        candidates.discard(best)
+        chosen.append(best)
+        spent += marginal_cost[best]
+        for position in recipe_products[best] - basket:
+            basket.add(position)
+            for r in users[position]:
+                marginal_cost[r] -= offers[position][1]
+                marginal_value[r] -= offers[position][value_of]
+
+    def evaluate(selection):
+        products = set().union(*(recipe_products[r] for r in selection)) if selection else set()
+        return (sum(offers[p][1] for p in products), sum(offers[p][value_of] for p in products),
+                products)
+
+    def refill(selection, cost, value, basket):
+        # Adds the recipe with the best marginal value per euro that still fits, until none does
+        while True:
+            best = None
+            for r, products in enumerate(recipe_products):
+                if not products or r in selection:
+                    continue
+                extra = products - basket
+                extra_cost = sum(offers[p][1] for p in extra)
+                extra_value = sum(offers[p][value_of] for p in extra)
+                if extra_value <= 0 or cost + extra_cost > budget:
+                    continue
+                ratio = extra_value / extra_cost if extra_cost > 0 else math.inf
+                if best is None or ratio > best[0]:
+                    best = (ratio, r, extra, extra_cost, extra_value)
+            if best is None:
+                return selection, cost, value, basket
+            _, r, extra, extra_cost, extra_value = best
+            selection, cost, value, basket = selection + [r], cost + extra_cost, value + extra_value, basket | extra
+
+    # Local search: swap one chosen recipe for one unchosen recipe while it helps
+    cost, value, basket = evaluate(chosen)
+    improved = True
+    while improved and time.perf_counter() - start < time_budget:
+        improved = False
+        outside = [r for r, products in enumerate(recipe_products) if products and r not in chosen]
+        for i in range(len(chosen)):
+            for other in outside:
+                if time.perf_counter() - start >= time_budget:
+                    break
+                trial = chosen[:i] + chosen[i + 1:] + [other]
+                trial_cost, trial_value, trial_basket = evaluate(trial)
+                if trial_cost <= budget and trial_value > value + 1e-9:
+                    chosen, cost, value, basket = refill(trial, trial_cost, trial_value, trial_basket)
+                    improved = True
+                    break
+            if improved:
+                break
+
+    products = [
+        {
+            "webshopId": store.webshop_id[p],
+            "title": store.products[p].get("title"),
+            "quantity": offers[p][0],
+            "cost": round(offers[p][1], 2),
+            "savings": round(offers[p][2], 2),
+        }
+        for p in sorted(basket, key=lambda p: -offers[p][2])
+    ]
+    return {
+        "recipes": [recipes[r].get("name") for r in chosen],
+        "products": products,
+        "total_cost": round(sum(offers[p][1] for p in basket), 2),
+        "total_savings": round(sum(offers[p][2] for p in basket), 2),
+        "total_health": sum(offers[p][3] for p in basket),
+        "elapsed": time.perf_counter() - start,
+    }
@@ -0,0 +1,184 @@
+import math
+import re
+from array import array
+from functools import lru_cache
+
+# Each rule is a compiled pattern and a function turning its match into a
+# pricing rule dict. A rule has a "kind" and describes what a shopper pays
+# per item when buying under the mechanism:
+#   factor       - pays price_before_bonus * factor per item
+#   fixed        - pays `price` per item
+#   bundle       - pays `price` for `quantity` items
+#   amount_off   - pays price_before_bonus - `amount` per item
+#   weight       - pays `price` per `grams`, scaled by the item's salesUnitSize
+_NUMBER = r"(\d+(?:[.,]\d+)?)"
+
+
+def _number(text):
+    return float(text.replace(",", "."))
+
+
+MECHANISM_RULES = [
+    # "2 voor 0.99", "2 VOOR 8.75", "2 stapelen voor 2.00"
+    (re.compile(rf"^(\d+)\s+(?:stapelen\s+)?voor\s+{_NUMBER}$", re.I),
+     lambda m: {"kind": "bundle", "quantity": int(m[1]), "price": _number(m[2])}),
+    # "100 GRAM VOOR 1.28"
+    (re.compile(rf"^(\d+)\s+gram\s+voor\s+{_NUMBER}$", re.I),
+     lambda m: {"kind": "weight", "grams": int(m[1]), "price": _number(m[2])}),
+    # "VOOR 4.99"
+    (re.compile(rf"^voor\s+{_NUMBER}$", re.I),
+     lambda m: {"kind": "fixed", "price": _number(m[1])}),
+    # "1 + 1 gratis", "2 + 3 GRATIS"
+    (re.compile(r"^(\d+)\s*\+\s*(\d+)\s+gratis$", re.I),
+     lambda m: {"kind": "factor", "factor": int(m[1]) / (int(m[1]) + int(m[2])),
+                "quantity": int(m[1]) + int(m[2])}),
+    # "2e gratis"
+    (re.compile(r"^2e\s+gratis$", re.I),
+     lambda m: {"kind": "factor", "factor": 0.5, "quantity": 2}),
+    # "2e Halve Prijs"
+    (re.compile(r"^2e\s+halve\s+prijs$", re.I),
+     lambda m: {"kind": "factor", "factor": 0.75, "quantity": 2}),
+    # "25% korting", "10% volume voordeel", "20% pakketkorting", "35% Op=Op korting",
+    # "stapelen tot 50%" (the best tier is used)
+    (re.compile(rf"^(?:stapelen\s+tot\s+{_NUMBER}%|{_NUMBER}%\s+.*(?:korting|voordeel))$", re.I),
+     lambda m: {"kind": "factor", "factor": 1 - _number(m[1] or m[2]) / 100}),
+    # "1 euro korting"
+    (re.compile(rf"^{_NUMBER}\s+euro\s+korting$", re.I),
+     lambda m: {"kind": "amount_off", "amount": _number(m[1])}),
+]
+
+_GRAMS_PER_UNIT = {"g": 1, "gr": 1, "gram": 1, "kg": 1000, "kilo": 1000}
+_UNIT_SIZE = re.compile(r"(?:(\d+)\s*x\s*)?(\d+(?:[.,]\d+)?)\s*(kg|kilo|gram|gr|g)\b", re.I)
+
+
+@lru_cache(maxsize=None)
+def parse_mechanism(mechanism):
+    """
+    Parses a bonusMechanism string such as "2 voor 0.99" into a pricing rule.
+
+    Results are memoised per distinct string, so a catalogue costs one regex
+    pass per mechanism rather than per product.
+
+    Returns:
+        dict: The pricing rule (see MECHANISM_RULES), or None when the
+              mechanism is missing or not understood (e.g. "BONUS").
+    """
+    if not mechanism:
+        return None
+    text = " ".join(mechanism.split())
+    for pattern, build in MECHANISM_RULES:
+        match = pattern.match(text)
+        if match:
+            return build(match)
+    return None
+
+
+@lru_cache(maxsize=None)
+def parse_unit_grams(sales_unit_size):
+    """
+    Returns the weight in grams of a salesUnitSize such as "250 g", "ca. 110 g"
+    or "2 x 1 kg", or None when it is not a weight.
+    """
+    if not sales_unit_size:
+        return None
+    match = _UNIT_SIZE.search(sales_unit_size)
+    if not match:
+        return None
+    count = int(match[1]) if match[1] else 1
+    return count * _number(match[2]) * _GRAMS_PER_UNIT[match[3].lower()]
+
+
+def effective_price(rule, price_before_bonus, sales_unit_size=None):
+    """
+    Returns the price paid per item under a parsed mechanism.
+
+    Args:
+        rule (dict): Result of parse_mechanism.
+        price_before_bonus (float): Regular price of one item.
+        sales_unit_size (str): salesUnitSize, needed for "GRAM VOOR" rules.
+
+    Returns:
+        float: Effective price per item, or NaN when it cannot be determined.
+    """
+    if rule is None or price_before_bonus is None or math.isnan(price_before_bonus):
+        return math.nan
+    kind = rule["kind"]
+    if kind == "factor":
+        return price_before_bonus * rule["factor"]
+    if kind == "fixed":
+        return rule["price"]
+    if kind == "bundle":
+        return rule["price"] / rule["quantity"]
+    if kind == "amount_off":
+        return max(price_before_bonus - rule["amount"], 0.0)
+    if kind == "weight":
+        grams = parse_unit_grams(sales_unit_size)
+        return rule["price"] * grams / rule["grams"] if grams else math.nan
+    return math.nan
+
+
+def discount_percentage(effective, price_before_bonus):
+    """
+    Returns the saving in percent of the regular price, NaN when unknown.
+    """
+    if math.isnan(effective) or not price_before_bonus or math.isnan(price_before_bonus):
+        return math.nan
+    return round((1 - effective / price_before_bonus) * 100, 2)
+
+
+def compute_savings(store):
+    """
+    Computes effective prices and discount percentages for a whole ProductStore.
+
+    Work is done per distinct mechanism through the store's bonusMechanism
+    index: each mechanism is parsed once and applied to the price column for
+    all of its products.
+
+    Returns:
+        tuple: (effective_prices, discount_percentages), two array('d') columns
+               aligned with the store; NaN where the mechanism is not understood.
+    """
+    count = len(store)
+    effective_prices = array("d", [math.nan]) * count
+    discounts = array("d", [math.nan]) * count
+    price_before_bonus = store.price_before_bonus
+
+    for mechanism, positions in store.indexes["bonusMechanism"].items():
+        rule = parse_mechanism(mechanism)
+        if rule is None:
+            continue
+        if rule["kind"] == "weight":
+            # Only these need the product's sales unit size
+            for p in positions:
+                regular = price_before_bonus[p]
+                effective = effective_price(rule, regular, store.products[p].get("salesUnitSize"))
+                effective_prices[p] = effective
+                discounts[p] = discount_percentage(effective, regular)
+            continue
+        for p in positions:
+            regular = price_before_bonus[p]
+            effective = effective_price(rule, regular)
+            effective_prices[p] = effective
+            discounts[p] = discount_percentage(effective, regular)
+
+    return effective_prices, discounts
+
+
+def rank_by_savings(store, positions=None, min_discount=None):
+    """
+    Orders products by discount percentage, largest saving first.
+
+    Args:
+        store (ProductStore): Catalogue to rank.
+        positions (iterable): Restrict ranking to these positions (e.g. a query result).
+        min_discount (float): Drop products saving less than this percentage.
+
+    Returns:
+        list: Positions into the store. Products with an unknown discount are
+              dropped when min_discount is set and ranked last otherwise.
+    """
+    _, discounts = compute_savings(store)
+    positions = range(len(store)) if positions is None else positions
+    if min_discount is not None:
+        positions = [p for p in positions if discounts[p] >= min_discount] # NaN compares False
+    return sorted(positions, key=lambda p: -discounts[p] if not math.isnan(discounts[p]) else math.inf)
@@ -1,80 +1,104 @@
 import json
 import os
 
-def filter_and_split_json(input_json_data, output_directory="filtered_jsons"):
+from src.grouping import DEFAULT_GROUP_KEYS, build_partitions, partition_summary
+from src.partition_writer import PARTITION_FORMATS, PartitionStreamWriter
+from src.stream_json import iter_json_items
+
+# Characters replaced or dropped when a partition value becomes a filename
+_FILENAME_TABLE = str.maketrans({
+    " ": "_", "/": "_", "\\": "_",
+    "'": None, '"': None, "(": None, ")": None, "[": None, "]": None, ",": None
+})
+
+def partition_filename(category, value_key, extension=".json"):
+    """
+    Builds the clean output filename for one partition value.
+    """
+    return f"{category}_{str(value_key).translate(_FILENAME_TABLE)}{extension}"
+
+def filter_and_split_json(input_json_data, output_directory="filtered_jsons", filter_categories=None,
+                          output_format="pretty", max_open_files=64):
     """
     Filters items from a JSON dataset based on specified categories and creates
     separate JSON files for each unique value within those categories.
 
     Args:
-        input_json_data (str): A JSON string containing a list of items.
-                                Each item is expected to be a dictionary.
+        input_json_data (str or iterable): A JSON string containing a list of items,
+                                or any iterable of item dictionaries, such as
+                                the generator returned by `iter_json_items`.
+                                Items are consumed in a single pass and each
+                                one is appended to its partition files as it
+                                is read, so a stream is never held in memory.
         output_directory (str): The directory where the new JSON files will be saved.
                                  Defaults to "filtered_jsons".
+        filter_categories (list): Keys to split by. Nested keys such as
+                                 "discountLabels[].code" are supported.
+                                 Defaults to bonusMechanism, nutriscore and mainCategory.
+        output_format (str): Partition file format, one of PARTITION_FORMATS:
+                             "pretty" (default), "compact", "jsonl" or "ids".
+                             Files are read back with `read_partition`.
+        max_open_files (int): Partition files kept open while splitting.
+
+    Returns:
+        dict: The partition index from `build_partitions`, or None on invalid input.
     """
-    try:
-        items = json.loads(input_json_data)
-        if not isinstance(items, list):
-            print("Error: Input JSON must be a list of items.")
+    if isinstance(input_json_data, str):
+        try:
+            items = json.loads(input_json_data)
+            if not isinstance(items, list):
+                print("Error: Input JSON must be a list of items.")
+                return
+        except json.JSONDecodeError as e:
+            print(f"Error decoding JSON: {e}")
             return
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON: {e}")
-        return
-    except Exception as e:
-        print(f"An unexpected error occurred during JSON loading: {e}")
-        return
+        except Exception as e:
+            print(f"An unexpected error occurred during JSON loading: {e}")
+            return
+    else:
+        items = input_json_data
 
     # Ensure the output directory exists
     os.makedirs(output_directory, exist_ok=True)
     print(f"Output files will be saved in: '{os.path.abspath(output_directory)}'\n")
 
-    # Categories to filter by
-    filter_categories = ["bonusMechanism", "nutriscore", "mainCategory"]
+    # Categories to filter by, all grouped in one pass over the items
+    filter_categories = filter_categories or DEFAULT_GROUP_KEYS
+    writer = PartitionStreamWriter(output_directory, output_format, max_open_files)
+    filenames = {} # (category, value) -> filename without extension
 
-    # Dictionary to hold unique types and their counts
-    unique_types_summary = {category: {} for category in filter_categories}
+    def write_item(item, memberships):
+        names = []
+        for membership in memberships:
+            name = filenames.get(membership)
+            if name is None:
+                name = filenames[membership] = partition_filename(*membership, extension="")
+            names.append(name)
+        writer.write(item, names)
+
+    try:
+        index = build_partitions(items, filter_categories, on_item=write_item)
+    except BaseException:
+        writer.abort()
+        raise
+    results = writer.close()
+    extension = PARTITION_FORMATS[output_format]
 
     # Process each filter category
     for category in filter_categories:
         print(f"--- Processing by '{category}' ---")
-        filtered_data_by_category = {}
-
-        # Group items by the current category's value
-        for item in items:
-            category_value = item.get(category)
-            if category_value is not None:
-                # Convert list values to tuple for dictionary key hashing
-                if isinstance(category_value, list):
-                    category_value_key = tuple(category_value)
-                    display_value = str(category_value) # For printing
-                else:
-                    category_value_key = category_value
-                    display_value = category_value # For printing
-
-                if category_value_key not in filtered_data_by_category:
-                    filtered_data_by_category[category_value_key] = []
-                filtered_data_by_category[category_value_key].append(item)
-                
-                # Update unique types summary for reporting
-                unique_types_summary[category][display_value] = unique_types_summary[category].get(display_value, 0) + 1
+        if index["missing"][category]:
+            print(f"Warning: {index['missing'][category]} items missing '{category}' field.")
+        filtered_data_by_category = index["partitions"][category]
+
+        # Report each filtered segment's file, written while the items streamed
+        for value_key in filtered_data_by_category:
+            output_filename = os.path.join(output_directory, filenames[category, value_key] + extension)
+            written = results[output_filename]
+            if isinstance(written, Exception):
+                print(f"Error saving file {output_filename}: {written}")
             else:
-                print(f"Warning: Item missing '{category}' field: {item.get('id', 'No ID provided')}")
-
-
-        # Save each filtered segment to a new JSON file
-        for value_key, segment_items in filtered_data_by_category.items():
-            # Create a clean filename
-            filename_value = str(value_key).replace(" ", "_").replace("/", "_").replace("\\", "_").replace("'", "").replace('"', '').replace("(", "").replace(")", "").replace("[", "").replace("]", "").replace(",", "")
-            output_filename = os.path.join(output_directory, f"{category}_{filename_value}.json")
-            
-            try:
-                with open(output_filename, 'w', encoding='utf-8') as f:
-                    json.dump(segment_items, f, indent=4, ensure_ascii=False)
-                print(f"  - Created '{output_filename}' with {len(segment_items)} items.")
-            except IOError as e:
-                print(f"Error saving file {output_filename}: {e}")
-            except Exception as e:
-                print(f"An unexpected error occurred while saving: {e}")
+                print(f"  - Created '{output_filename}' with {written} items.")
 
         print(f"\nTotal unique types for '{category}': {len(filtered_data_by_category)}")
         print("-" * (20 + len(category)) + "\n")
@@ -82,21 +106,20 @@ def filter_and_split_json(input_json_data, output_directory="filtered_jsons"):
 
     # Final summary report
     print("--- Overall Summary ---")
-    for category, types_data in unique_types_summary.items():
+    for category, types_data in partition_summary(index).items():
         print(f"'{category}' has {len(types_data)} different types.")
         for type_value, count in types_data.items():
             print(f"  - Type '{type_value}': {count} occurrences in original data.")
     print("-----------------------\n")
+    return index
 
 # --- Example Usage ---
-# To use your own JSON file, uncomment the following lines and
-# ensure 'output/bonus_items.json' exists in your script's working directory,
-# or provide the full path to the file.
-try:
-    with open("output/bonus_items.json", 'r', encoding='utf-8') as f:
-        my_json_data = f.read()
-    filter_and_split_json(my_json_data)
-except FileNotFoundError:
-    print("Error: 'output/bonus_items.json' not found. Please ensure the file exists at the specified path.")
-except Exception as e:
-    print(f"An error occurred while reading the input file: {e}")
+# To use your own JSON file, ensure 'output/bonus_items.json' exists in your
+# script's working directory, or provide the full path to the file.
+if __name__ == "__main__":
+    try:
+        filter_and_split_json(iter_json_items("output/bonus_items.json"))
+    except FileNotFoundError:
+        print("Error: 'output/bonus_items.json' not found. Please ensure the file exists at the specified path.")
+    except Exception as e:
+        print(f"An error occurred while reading the input file: {e}")
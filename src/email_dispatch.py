@@ -0,0 +1,254 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src import metrics
+from src.llm_scheduler import RateBudget
+from src.send_email import iter_email_payload
+
+# Base URL of the SendPulse API. Can be pointed at a local fake server
+# (see benchmarks/fake_sendpulse_server.py) through SENDPULSE_API_BASE.
+SENDPULSE_API_BASE = os.environ.get("SENDPULSE_API_BASE", "https://api.sendpulse.com")
+
+# Statuses that mean "try again later" rather than "this message is wrong"
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Tokens are renewed this many seconds before SendPulse expires them
+TOKEN_REFRESH_MARGIN = 60
+
+
+class SendPulseClient:
+    """
+    SendPulse API client that reuses its OAuth token and connections.
+
+    The access token is requested once and shared by all threads until
+    shortly before it expires; a 401 renews it once. Requests go through a
+    keep-alive connection pool sized for the dispatcher's concurrency.
+
+    Args:
+        api_id (str): SendPulse API ID.
+        api_secret (str): SendPulse API secret.
+        base_url (str): API base URL.
+        pool_size (int): Keep-alive connections kept open.
+        timeout (float): Seconds before a request is abandoned.
+    """
+
+    def __init__(self, api_id, api_secret, base_url=SENDPULSE_API_BASE, pool_size=16, timeout=30):
+        self.api_id = api_id
+        self.api_secret = api_secret
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        metrics.instrument_session(self.session, "sendpulse")
+        self.token = None
+        self.token_expiry = 0.0
+        self.token_requests = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, pool_size=16):
+        """
+        Builds a client from the environment variables named in the `sendpulse` section of config.yml.
+        """
+        settings = config.get("sendpulse", {})
+        return cls(
+            os.environ.get(settings.get("api_id_env_var", "SENDPULSE_API_ID")),
+            os.environ.get(settings.get("api_secret_env_var", "SENDPULSE_API_SECRET")),
+            pool_size=pool_size,
+        )
+
+    def access_token(self, stale=None):
+        """
+        Returns a valid access token, requesting one only when there is none,
+        it is about to expire, or it equals `stale` (rejected by the API).
+        """
+        with self.lock:
+            if self.token is None or self.token == stale or time.monotonic() >= self.token_expiry:
+                response = self.session.post(
+                    f"{self.base_url}/oauth/access_token",
+                    json={"grant_type": "client_credentials",
+                          "client_id": self.api_id, "client_secret": self.api_secret},
+                    timeout=self.timeout,
+                )
+                response.raise_for_status()
+                body = response.json()
+                self.token = body["access_token"]
+                expires_in = body.get("expires_in", 3600)
+                self.token_expiry = time.monotonic() + expires_in - min(TOKEN_REFRESH_MARGIN, expires_in / 2)
+                self.token_requests += 1
+            return self.token
+
+    def send(self, message):
+        """
+        Posts one message to /smtp/emails.
+
+        Args:
+            message (dict): {"to", "subject", "sender_email", "sender_name"} plus
+                            either "html" (str) or "html_file" (path), and
+                            optionally "name" for the recipient.
+
+        Returns:
+            requests.Response: The API response, whatever its status.
+        """
+        email_data = {
+            "text": "Please enable HTML to view this email.",
+            "subject": message["subject"],
+            "from": {"name": message.get("sender_name"), "email": message["sender_email"]},
+            "to": [{"email": message["to"], **({"name": message["name"]} if message.get("name") else {})}],
+        }
+        if "html_file" in message:
+            # Digest pages are bounded in size (see iter_email_pages), so the body
+            # is built in memory once and can be resent on retries
+            body = b"".join(iter_email_payload(email_data, message["html_file"]))
+        else:
+            body = json.dumps(dict(email_data, html=message["html"])).encode("ascii")
+
+        token = self.access_token()
+        for attempt in range(2):
+            response = self.session.post(
+                f"{self.base_url}/smtp/emails", data=body, timeout=self.timeout,
+                headers={"Content-Type": "application/json", "Authorization": f"Bearer {token}"},
+            )
+            if response.status_code != 401 or attempt:
+                return response
+            token = self.access_token(stale=token)
+
+
+def _retry_delay(response, attempt, backoff, max_backoff):
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), max_backoff)
+        except ValueError:
+            pass
+    return min(backoff * 2 ** attempt, max_backoff)
+
+
+class EmailDispatcher:
+    """
+    Sends many messages concurrently through a SendPulseClient.
+
+    Sends are spread over a thread pool and throttled by a messages-per-second
+    budget. Throttling (429) and server errors are retried with exponential
+    backoff, honouring Retry-After; other errors, unreadable messages and
+    unexpected success replies fail the message at once.
+
+    Args:
+        client (SendPulseClient): Shared API client.
+        max_workers (int): Messages in flight at once.
+        messages_per_second (float): Send budget, None for unlimited.
+        max_retries (int): Retries per message after the first attempt.
+        backoff (float): Base delay of the exponential backoff in seconds.
+        max_backoff (float): Upper bound of a single delay in seconds.
+    """
+
+    def __init__(self, client, max_workers=8, messages_per_second=None, max_retries=4,
+                 backoff=0.5, max_backoff=30.0):
+        self.client = client
+        self.max_workers = max(max_workers, 1)
+        # RateBudget counts requests per window; a one second window gives a per-second rate
+        self.budget = RateBudget(messages_per_second, window=1.0)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    @classmethod
+    def from_config(cls, client, config):
+        """
+        Builds a dispatcher from the `email_dispatch` section of config.yml.
+        """
+        settings = config.get("email_dispatch", {})
+        return cls(
+            client,
+            max_workers=settings.get("max_workers", 8),
+            messages_per_second=settings.get("messages_per_second"),
+            max_retries=settings.get("max_retries", 4),
+            backoff=settings.get("backoff_seconds", 0.5),
+        )
+
+    def _send_one(self, message):
+        start = time.perf_counter()
+        result = {"to": message["to"], "status": "failed", "id": None, "attempts": 0, "error": None}
+        for attempt in range(self.max_retries + 1):
+            self.budget.acquire(1)
+            result["attempts"] += 1
+            response = None
+            try:
+                response = self.client.send(message)
+            except requests.exceptions.RequestException as e:
+                result["error"] = str(e)
+            except OSError as e:
+                # The message itself is broken (e.g. its html_file is gone); retrying cannot help
+                result["error"] = f"Unreadable message: {e}"
+                break
+            else:
+                if response.status_code < 400:
+                    # A 2xx may mean the email was accepted, so it is not retried even if unreadable
+                    try:
+                        body = response.json()
+                    except ValueError:
+                        body = None
+                    if isinstance(body, dict) and body.get("result"):
+                        result.update(status="sent", id=body.get("id"), error=None)
+                    else:
+                        result["error"] = f"Unexpected response: {body if body is not None else response.text[:200]}"
+                    break
+                result["error"] = f"HTTP {response.status_code}: {response.text[:200]}"
+                if response.status_code not in RETRY_STATUSES:
+                    break
+            if attempt < self.max_retries:
+                time.sleep(_retry_delay(response, attempt, self.backoff, self.max_backoff))
+        metrics.count("emails", status=result["status"])
+        if result["status"] != "sent":
+            logging.warning(f"Sending to {message['to']} failed after {result['attempts']} attempts: {result['error']}")
+        result["elapsed"] = time.perf_counter() - start
+        return result
+
+    def _send_guarded(self, message):
+        # One broken message must not abort the batch: the others may already be accepted
+        try:
+            return self._send_one(message)
+        except Exception as e:
+            logging.warning(f"Sending to {message.get('to')} failed: {type(e).__name__}: {e}")
+            metrics.count("emails", status="failed")
+            return {"to": message.get("to"), "status": "failed", "id": None, "attempts": 1,
+                    "error": f"{type(e).__name__}: {e}", "elapsed": 0.0}
+
+    def send_many(self, messages):
+        """
+        Sends all messages. Never raises for a single message; its error is
+        reported in its result instead.
+
+        Returns:
+            list: {"to", "status" ("sent"/"failed"), "id", "attempts", "error", "elapsed"}
+                  per message, in input order.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self._send_guarded, messages))
+
+
+def digest_messages(digests, subject, sender_email, sender_name=None):
+    """
+    Builds dispatcher messages from the results of src/personalise.py's
+    generate_digests: one message per page, numbered in the subject when a
+    digest has several.
+    """
+    messages = []
+    for digest in digests:
+        if not digest["items"]:
+            continue
+        pages = digest["paths"]
+        for part, path in enumerate(pages, 1):
+            messages.append({"to": digest["email"], "sender_email": sender_email, "sender_name": sender_name,
+                             "subject": subject if len(pages) == 1 else f"{subject} ({part}/{len(pages)})",
+                             "html_file": path, "part": part})
+    return messages
@@ -0,0 +1,252 @@
+import json
+import math
+import os
+import re
+import zlib
+from array import array
+from bisect import bisect_right
+
+# Dimensionality of the hashed n-gram embeddings
+DEFAULT_DIM = 256
+
+# Default location of the on-disk index (<path>.f32 matrix + <path>.json ids)
+DEFAULT_INDEX_PATH = os.path.join("data", "embeddings", "products")
+
+# Relative weights of the feature groups in a product embedding
+WORD_WEIGHT = 1.0
+TRIGRAM_WEIGHT = 0.5
+CATEGORY_WEIGHT = 0.5
+
+_WORD = re.compile(r"\w+", re.U)
+
+
+def _features(text, weight, word_weight=WORD_WEIGHT, trigram_weight=TRIGRAM_WEIGHT):
+    for word in _WORD.findall(text.lower()):
+        yield f"w:{word}", weight * word_weight
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            yield f"t:{padded[i:i + 3]}", weight * trigram_weight
+
+
+def product_text(product):
+    """
+    Returns the (title, categories) text of a product used for its embedding.
+    """
+    categories = " ".join(filter(None, (product.get("mainCategory"), product.get("subCategory"))))
+    return product.get("title") or "", categories
+
+
+def embed_text(text, categories="", dim=DEFAULT_DIM):
+    """
+    Embeds text with signed feature hashing of words and character trigrams.
+
+    Features are hashed with crc32, which is stable across processes, and the
+    vector is L2-normalised, so a dot product is the cosine similarity.
+
+    Returns:
+        dict: Sparse embedding {dimension: weight}.
+    """
+    vector = {}
+    features = list(_features(text, 1.0))
+    features.extend(_features(categories, CATEGORY_WEIGHT))
+    for feature, weight in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        dimension = h % dim
+        vector[dimension] = vector.get(dimension, 0.0) + (weight if h & 0x80000000 else -weight)
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    if norm == 0:
+        return {}
+    return {d: w / norm for d, w in vector.items() if w}
+
+
+def embed_batch(texts, dim=DEFAULT_DIM):
+    """
+    Embeds a batch of (text, categories) pairs into one contiguous float32 matrix.
+
+    Returns:
+        array: Row-major array('f') of len(texts) * dim values.
+    """
+    matrix = array("f", bytes(4 * dim * len(texts)))
+    for row, (text, categories) in enumerate(texts):
+        offset = row * dim
+        for dimension, weight in embed_text(text, categories, dim).items():
+            matrix[offset + dimension] = weight
+    return matrix
+
+
+class EmbeddingIndex:
+    """
+    Exact top-k cosine similarity index over product embeddings.
+
+    Embeddings are kept as one contiguous row-major float32 matrix, which is
+    what is stored on disk. Because hashed n-gram vectors are sparse, search
+    walks per-dimension posting lists (dimension -> rows, weights) built from
+    the matrix, so a query only touches rows sharing a feature with it.
+    Products can be added and removed as they enter and leave bonus; removed
+    rows are dropped once they outnumber the live ones, and when the index is
+    saved. `version` records the catalogue
+    version (src/incremental_ingest.py) the index reflects, so a saved index
+    can be brought up to date with the next ingestion delta alone.
+
+    Args:
+        dim (int): Embedding dimensionality.
+    """
+
+    def __init__(self, dim=DEFAULT_DIM):
+        self.dim = dim
+        self.matrix = array("f")
+        self.ids = [] # row -> webshopId, None for removed rows
+        self.rows = {} # webshopId -> row
+        self.postings = {} # dimension -> (array of rows, array of weights)
+        self.version = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _index_row(self, row):
+        offset = row * self.dim
+        for dimension in range(self.dim):
+            weight = self.matrix[offset + dimension]
+            if weight:
+                rows, weights = self.postings.setdefault(dimension, (array("I"), array("f")))
+                rows.append(row)
+                weights.append(weight)
+
+    def add(self, products):
+        """
+        Embeds and adds products in one batch, replacing existing entries
+        with the same webshopId.
+        """
+        products = [p for p in products if p.get("webshopId") is not None]
+        self.remove(p["webshopId"] for p in products)
+        first_row = len(self.ids)
+        self.matrix.extend(embed_batch([product_text(p) for p in products], self.dim))
+        for offset, product in enumerate(products):
+            row = first_row + offset
+            self.ids.append(product["webshopId"])
+            self.rows[product["webshopId"]] = row
+            self._index_row(row)
+
+    def remove(self, webshop_ids):
+        """
+        Removes products; their rows are ignored by searches from now on.
+        """
+        for webshop_id in webshop_ids:
+            row = self.rows.pop(webshop_id, None)
+            if row is not None:
+                self.ids[row] = None
+        if len(self.ids) - len(self.rows) > len(self.rows):
+            self.compact()
+
+    def compact(self):
+        """
+        Drops removed rows from the matrix and the posting lists.
+        """
+        live = [row for row, webshop_id in enumerate(self.ids) if webshop_id is not None]
+        matrix = array("f")
+        for row in live:
+            matrix.extend(self.matrix[row * self.dim:(row + 1) * self.dim])
+        self.matrix = matrix
+        self.ids = [self.ids[row] for row in live]
+        self.rows = {webshop_id: row for row, webshop_id in enumerate(self.ids)}
+        self.postings = {}
+        for row in range(len(self.ids)):
+            self._index_row(row)
+
+    def _scores(self, query):
+        scores = {}
+        for dimension, weight in query.items():
+            posting = self.postings.get(dimension)
+            if posting is None:
+                continue
+            for row, row_weight in zip(*posting):
+                scores[row] = scores.get(row, 0.0) + weight * row_weight
+        return scores
+
+    def search(self, text, k=10, categories=""):
+        """
+        Returns the k products most similar to a text (e.g. a recipe ingredient).
+
+        Returns:
+            list: (webshopId, cosine similarity) tuples, most similar first.
+        """
+        scores = self._scores(embed_text(text, categories, self.dim))
+        ids = self.ids
+        ranked = sorted(((s, r) for r, s in scores.items() if ids[r] is not None), reverse=True)
+        return [(ids[r], s) for s, r in ranked[:k]]
+
+    def vector(self, webshop_id):
+        """
+        Returns the sparse embedding of an indexed product.
+        """
+        offset = self.rows[webshop_id] * self.dim
+        return {d: w for d, w in enumerate(self.matrix[offset:offset + self.dim]) if w}
+
+    def near_duplicates(self, threshold=0.8):
+        """
+        Finds pairs of indexed products whose similarity is at least `threshold`,
+        e.g. "AH Komkommer" and "AH Biologische Komkommer".
+
+        All pairs are scored in one pass over the posting lists: each row only
+        visits the rows after it (posting lists are in row order), so every
+        pair is scored once.
+
+        Returns:
+            list: (webshopId, webshopId, similarity) tuples, most similar first.
+        """
+        if len(self.ids) != len(self.rows):
+            self.compact()
+        pairs = []
+        ids, matrix, postings, dim = self.ids, self.matrix, self.postings, self.dim
+        for row, webshop_id in enumerate(ids):
+            scores = {}
+            get = scores.get
+            for dimension, weight in enumerate(matrix[row * dim:(row + 1) * dim]):
+                if not weight:
+                    continue
+                rows, weights = postings[dimension]
+                start = bisect_right(rows, row)
+                for other, other_weight in zip(rows[start:], weights[start:]):
+                    scores[other] = get(other, 0.0) + weight * other_weight
+            pairs.extend((webshop_id, ids[other], score) for other, score in scores.items() if score >= threshold)
+        return sorted(pairs, key=lambda pair: -pair[2])
+
+    def save(self, path=DEFAULT_INDEX_PATH):
+        """
+        Writes the live rows as a contiguous float32 matrix (<path>.f32) and
+        their webshopIds (<path>.json).
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        live = [row for row, webshop_id in enumerate(self.ids) if webshop_id is not None]
+        with open(f"{path}.f32.tmp", "wb") as f:
+            for row in live:
+                self.matrix[row * self.dim:(row + 1) * self.dim].tofile(f)
+        with open(f"{path}.json.tmp", "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "ids": [self.ids[row] for row in live], "version": self.version}, f)
+        os.replace(f"{path}.f32.tmp", f"{path}.f32")
+        os.replace(f"{path}.json.tmp", f"{path}.json")
+
+    @classmethod
+    def load(cls, path=DEFAULT_INDEX_PATH):
+        """
+        Loads an index written by `save`.
+        """
+        with open(f"{path}.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(meta["dim"])
+        index.version = meta.get("version")
+        with open(f"{path}.f32", "rb") as f:
+            index.matrix.fromfile(f, len(meta["ids"]) * index.dim)
+        for row, webshop_id in enumerate(meta["ids"]):
+            index.ids.append(webshop_id)
+            index.rows[webshop_id] = row
+            index._index_row(row)
+        return index
+
+    def sync(self, delta):
+        """
+        Applies an ingestion delta from src/incremental_ingest.py.
+        """
+        # Products without a webshopId are keyed "None" by the ingest and were never indexed
+        self.remove(int(webshop_id) for webshop_id in delta.get("expired", []) if str(webshop_id).isdigit())
+        self.add(delta.get("added", []) + delta.get("changed", []))
@@ -0,0 +1,111 @@
+from array import array
+
+# Default partitions written by the category splitter
+DEFAULT_GROUP_KEYS = ["bonusMechanism", "nutriscore", "mainCategory"]
+
+
+def parse_key(key):
+    """
+    Splits a key such as "discountLabels[].code" into path segments.
+
+    Returns:
+        list: (field, expand) tuples; expand is True when the field holds a list
+              whose elements should each be grouped on ("[]" suffix).
+    """
+    segments = []
+    for part in key.split("."):
+        expand = part.endswith("[]")
+        segments.append((part[:-2] if expand else part, expand))
+    return segments
+
+
+def resolve_key(item, segments):
+    """
+    Returns the list of values an item has for a parsed key.
+
+    Plain list values (without "[]") are returned as one tuple so they can be
+    used as a dictionary key, matching the splitter's historic behaviour.
+    An empty list means the item is missing the key.
+    """
+    values = [item]
+    for field, expand in segments:
+        next_values = []
+        for value in values:
+            if not isinstance(value, dict):
+                continue
+            child = value.get(field)
+            if child is None:
+                continue
+            if expand and isinstance(child, list):
+                next_values.extend(c for c in child if c is not None)
+            else:
+                next_values.append(child)
+        values = next_values
+    return [_hashable(v) for v in values]
+
+
+def _hashable(value):
+    if isinstance(value, list):
+        return tuple(_hashable(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+    return value
+
+
+def build_partitions(items, keys=None, on_item=None):
+    """
+    Groups items on several keys in a single pass.
+
+    Args:
+        items (iterable): Product dictionaries, consumed once.
+        keys (list): Keys to group by, e.g. ["mainCategory", "discountLabels[].code"].
+                     Defaults to DEFAULT_GROUP_KEYS.
+        on_item (callable): Optional; called as on_item(item, memberships) for
+                            every item, where memberships lists the (key, value)
+                            partitions it joined. Lets callers consume each item
+                            while it streams instead of keeping the items.
+
+    Returns:
+        dict: {
+            "partitions": {key: {value: array of item positions}},
+            "missing": {key: number of items without a value},
+            "count": number of items seen
+        }
+        Positions refer to the order in which `items` yielded the products.
+        An item with several values for an expanded key appears once per value.
+    """
+    keys = list(keys or DEFAULT_GROUP_KEYS)
+    parsed = [(key, parse_key(key)) for key in keys]
+    partitions = {key: {} for key in keys}
+    missing = dict.fromkeys(keys, 0)
+
+    count = 0
+    for position, item in enumerate(items):
+        count += 1
+        memberships = []
+        for key, segments in parsed:
+            values = resolve_key(item, segments)
+            if not values:
+                missing[key] += 1
+                continue
+            groups = partitions[key]
+            for value in dict.fromkeys(values): # de-duplicate, keep order
+                positions = groups.get(value)
+                if positions is None:
+                    positions = groups[value] = array("I")
+                positions.append(position)
+                memberships.append((key, value))
+        if on_item is not None:
+            on_item(item, memberships)
+
+    return {"partitions": partitions, "missing": missing, "count": count}
+
+
+def partition_summary(index):
+    """
+    Returns {key: {value: number of items}} for an index from build_partitions.
+    """
+    return {
+        key: {value: len(positions) for value, positions in groups.items()}
+        for key, groups in index["partitions"].items()
+    }
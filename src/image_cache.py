@@ -0,0 +1,291 @@
+import base64
+import hashlib
+import html
+import io
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src import metrics
+from src.json_to_html import best_image_url
+
+try:
+    from PIL import Image
+except ImportError: # Thumbnails are optional; AH's own smaller renditions are used instead
+    Image = None
+
+# Default location of the cache: objects/<aa>/<sha256> blobs plus an index.sqlite
+DEFAULT_IMAGE_CACHE_DIR = os.path.join("data", "images")
+
+# Eviction brings the cache back under this share of max_bytes, so it does not
+# evict on every download once full
+EVICTION_LOW_WATER = 0.9
+
+# Connection errors from a host, without any success, after which the rest
+# of a prefetch skips it instead of waiting out every timeout
+HOST_FAILURE_LIMIT = 5
+
+_IMG_SRC = re.compile(r'(<img\b[^>]*?\bsrc=")([^"]+)(")')
+
+
+class ImageCache:
+    """
+    Content-addressed on-disk cache of product images with size-based eviction.
+
+    Images are stored once per content under their SHA-256 and an SQLite
+    index maps URLs (and derived thumbnails) to them, so the same picture
+    behind two URLs takes space once. When the blobs exceed `max_bytes` the
+    least recently used ones are evicted. AH rendition URLs carry a revLabel,
+    so a cached URL never needs revalidating; a new revision is a new URL.
+
+    Downloads go through one pooled, instrumented session on a thread pool.
+    `path`, `data_uri` and `localise_html` never touch the network, so
+    previews and archives can be rendered offline from what was prefetched.
+
+    Args:
+        directory (str): Root of the cache.
+        max_bytes (int): Size above which images are evicted.
+        max_workers (int): Concurrent downloads.
+        timeout (float): Seconds before a download is abandoned.
+    """
+
+    def __init__(self, directory=DEFAULT_IMAGE_CACHE_DIR, max_bytes=500 * 1024 * 1024, max_workers=16, timeout=20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False,
+                                          isolation_level=None, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL") # a lost index entry only means a refetch
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, digest TEXT NOT NULL,"
+            " content_type TEXT, fetched_at REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS urls_digest ON urls (digest)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        metrics.instrument_session(self.session, "images")
+        self._host_failures = {}
+        self._reachable_hosts = set()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds a cache from the `image_cache` section of config.yml.
+        """
+        settings = config.get("image_cache", {})
+        return cls(
+            directory=settings.get("directory", DEFAULT_IMAGE_CACHE_DIR),
+            max_bytes=int(settings.get("max_megabytes", 500) * 1024 * 1024),
+            max_workers=settings.get("max_workers", 16),
+        )
+
+    def _blob_path(self, digest):
+        return os.path.join(self.directory, "objects", digest[:2], digest)
+
+    def _lookup(self, url):
+        with self.lock:
+            row = self.connection.execute("SELECT digest, content_type FROM urls WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE blobs SET last_access = ? WHERE digest = ?", (time.time(), row[0]))
+        path = self._blob_path(row[0])
+        return (path, row[1]) if os.path.exists(path) else None
+
+    def path(self, url):
+        """
+        Returns the local file of a cached URL, or None. Never downloads.
+        """
+        found = self._lookup(url)
+        return found[0] if found else None
+
+    def data_uri(self, url):
+        """
+        Returns a cached image as a data: URI for self-contained HTML, or None. Never downloads.
+        """
+        found = self._lookup(url)
+        if found is None:
+            return None
+        with open(found[0], "rb") as f:
+            return f"data:{found[1] or 'image/jpeg'};base64,{base64.b64encode(f.read()).decode('ascii')}"
+
+    def store(self, url, data, content_type):
+        """
+        Adds content under `url` and returns its local path.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        now = time.time()
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.execute("INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?)", (url, digest, content_type, now))
+            self.connection.execute("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?)", (digest, len(data), now))
+            self.connection.execute("COMMIT")
+        return path
+
+    def _download(self, url):
+        """
+        Returns (url, "cached" | "fetched" | "failed", bytes downloaded, error).
+        """
+        if self.path(url):
+            return url, "cached", 0, None
+        host = urlsplit(url).netloc
+        if self._host_failures.get(host, 0) >= HOST_FAILURE_LIMIT:
+            return url, "failed", 0, f"Skipped: {host} is unreachable"
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.exceptions.ConnectionError as e:
+            with self.lock:
+                if host not in self._reachable_hosts:
+                    self._host_failures[host] = self._host_failures.get(host, 0) + 1
+            return url, "failed", 0, str(e)
+        except requests.exceptions.RequestException as e:
+            return url, "failed", 0, str(e)
+        self._reachable_hosts.add(host)
+        content_type = response.headers.get("Content-Type", "").split(";")[0]
+        if response.status_code != 200:
+            return url, "failed", 0, f"HTTP {response.status_code}"
+        if not content_type.startswith("image/"):
+            return url, "failed", 0, f"Not an image: {content_type or 'no content type'}"
+        self.store(url, response.content, content_type)
+        return url, "fetched", len(response.content), None
+
+    def prefetch(self, urls):
+        """
+        Downloads the URLs that are not cached yet, concurrently, then evicts
+        down to `max_bytes` if needed.
+
+        Returns:
+            dict: {"cached", "fetched", "bytes", "seconds", "failed": {url: error}, "evicted"}
+        """
+        start = time.perf_counter()
+        summary = {"cached": 0, "fetched": 0, "bytes": 0, "failed": {}}
+        self._host_failures = {} # host -> connection errors
+        self._reachable_hosts = set() # hosts that answered at least once are never skipped
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for url, status, size, error in executor.map(self._download, dict.fromkeys(u for u in urls if u)):
+                if status == "failed":
+                    summary["failed"][url] = error
+                else:
+                    summary[status] += 1
+                    summary["bytes"] += size
+                metrics.count("images", status=status)
+        summary["evicted"] = self.evict()
+        summary["seconds"] = time.perf_counter() - start
+        if summary["failed"]:
+            logging.warning(f"{len(summary['failed'])} images could not be fetched, "
+                            f"e.g. {next(iter(summary['failed'].items()))}")
+        return summary
+
+    def prefetch_products(self, products, target_width=400):
+        """
+        Prefetches the rendition of each product that the email embeds.
+        """
+        return self.prefetch(best_image_url(product, target_width) for product in products)
+
+    def total_bytes(self):
+        with self.lock:
+            return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def evict(self):
+        """
+        Removes least recently used images until the cache is under its low-water mark.
+
+        Returns:
+            int: Number of images removed.
+        """
+        with self.lock:
+            total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            target = self.max_bytes * EVICTION_LOW_WATER
+            evicted = []
+            for digest, size in self.connection.execute("SELECT digest, size FROM blobs ORDER BY last_access").fetchall():
+                if total <= target:
+                    break
+                evicted.append(digest)
+                total -= size
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.executemany("DELETE FROM urls WHERE digest = ?", [(d,) for d in evicted])
+            self.connection.executemany("DELETE FROM blobs WHERE digest = ?", [(d,) for d in evicted])
+            self.connection.execute("COMMIT")
+        for digest in evicted:
+            try:
+                os.unlink(self._blob_path(digest))
+            except FileNotFoundError:
+                pass
+        return len(evicted)
+
+    def thumbnail(self, url, width, quality=80):
+        """
+        Returns the local path of a resized JPEG of a cached image, creating it
+        once; None when the image is not cached or Pillow is not installed.
+
+        Thumbnails are cached under "<url>#w=<width>q<quality>" and evicted like
+        other images.
+        """
+        key = f"{url}#w={width}q{quality}"
+        path = self.path(key)
+        if path or Image is None:
+            return path
+        source = self.path(url)
+        if source is None:
+            return None
+        try:
+            with Image.open(source) as image:
+                image.thumbnail((width, width))
+                output = io.BytesIO()
+                image.convert("RGB").save(output, "JPEG", quality=quality, optimize=True)
+        except OSError as e:
+            logging.warning(f"Could not make a thumbnail of {url}: {e}")
+            return None
+        return self.store(key, output.getvalue(), "image/jpeg")
+
+    def localise_html(self, page, inline=False, missing=None):
+        """
+        Points the <img> tags of rendered HTML at the cache, for offline previews and archives.
+
+        Args:
+            page (str): HTML from src/json_to_html.py.
+            inline (bool): Embed images as data: URIs (one self-contained file)
+                           instead of file:// links into the cache.
+            missing (str): Replacement for images that are not cached; they
+                           keep their remote URL when None.
+        """
+        def replace(match):
+            url = html.unescape(match[2])
+            local = self.data_uri(url) if inline else self.path(url)
+            if local is None:
+                local = missing or url
+            elif not inline:
+                local = "file://" + os.path.abspath(local)
+            return f"{match[1]}{html.escape(local)}{match[3]}"
+
+        return _IMG_SRC.sub(replace, page)
+
+    def close(self):
+        self.session.close()
+        self.connection.close()
@@ -0,0 +1,349 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shlex
+import shutil
+import sqlite3
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from src import metrics
+
+# Default location of the extracted facts, keyed per image revision
+DEFAULT_FACTS_PATH = os.path.join("data", "cache", "image_facts.sqlite")
+
+# Bump when parsing changes, so every image is extracted again
+EXTRACTOR_VERSION = "2"
+
+_ASSET = re.compile(r"/dam/product/([^?/]+)")
+_REV_LABEL = re.compile(r"[?&]revLabel=(\d+)")
+
+# Nutrient -> pattern of its row in a Dutch nutrition table, value per 100 g/ml first
+NUTRIENTS = {
+    "energy_kcal": re.compile(r"(\d+(?:[.,]\d+)?)\s*kcal"),
+    "fat": re.compile(r"(?m)^(?![^\n]*verzadigd)[^\n]*?\bvet(?:ten)?\b[^\d\n]*(\d+(?:[.,]\d+)?)\s*g"),
+    "saturated_fat": re.compile(r"verzadigd[^\d\n]*(\d+(?:[.,]\d+)?)\s*g"),
+    "carbohydrates": re.compile(r"koolhydraten[^\d\n]*(\d+(?:[.,]\d+)?)\s*g"),
+    "sugars": re.compile(r"suikers[^\d\n]*(\d+(?:[.,]\d+)?)\s*g"),
+    "fibre": re.compile(r"vezels?[^\d\n]*(\d+(?:[.,]\d+)?)\s*g"),
+    "protein": re.compile(r"eiwit(?:ten)?[^\d\n]*(\d+(?:[.,]\d+)?)\s*g"),
+    "salt": re.compile(r"\bzout\b[^\d\n]*(\d+(?:[.,]\d+)?)\s*g"),
+}
+
+# The 14 EU allergen groups and the Dutch words naming them on packs
+ALLERGENS = {
+    "gluten": ("gluten", "tarwe", "rogge", "gerst", "haver", "spelt", "kamut"),
+    "schaaldieren": ("schaaldier", "garnaal", "garnalen", "krab", "kreeft"),
+    "ei": ("ei", "eieren", "eigeel", "kippenei", "kippeneiwit"), # not "eiwit": protein, on every nutrition table
+    "vis": ("vis", "ansjovis"),
+    "pinda": ("pinda", "pindas", "aardnoot"),
+    "soja": ("soja", "sojabonen"),
+    "melk": ("melk", "lactose", "melkeiwit", "boter", "room", "kaas"),
+    "noten": ("noten", "amandel", "amandelen", "hazelnoot", "hazelnoten", "walnoot", "walnoten",
+              "cashewnoten", "pecannoten", "pistache", "macadamianoten"),
+    "selderij": ("selderij", "selderie"),
+    "mosterd": ("mosterd",),
+    "sesam": ("sesam", "sesamzaad"),
+    "sulfiet": ("sulfiet", "sulfieten", "zwaveldioxide"),
+    "lupine": ("lupine",),
+    "weekdieren": ("weekdier", "weekdieren", "mossel", "mosselen", "inktvis"),
+}
+_ALLERGEN_WORDS = {word: group for group, words in ALLERGENS.items() for word in words}
+_CONTAINS = re.compile(r"\bbevat\b:?([^.\n]*)")
+# Rows with an amount belong to the nutrition table ("100 g bevat: ... eiwitten 3 g")
+_NUTRITION_ROW = re.compile(r"(?m)^[^\n]*\d\s*(?:g|mg|kj|kcal)\b[^\n]*$")
+_MAY_CONTAIN = re.compile(r"\b(?:kan|kunnen)\b[^.\n]*?\bbevatten\b[^.\n]*|\bsporen van\b[^.\n]*")
+_WORD = re.compile(r"[a-zë]+")
+
+
+def revision(url):
+    """
+    Returns (asset id, revLabel) of an AH image URL; revLabel is 0 when absent.
+    """
+    asset = _ASSET.search(url)
+    rev = _REV_LABEL.search(url)
+    return (asset[1] if asset else url), (int(rev[1]) if rev else 0)
+
+
+def image_key(url, model):
+    """
+    Returns the cache key of an image: one per asset revision and model, so
+    other renditions of the same revision reuse the result and a new revLabel
+    is extracted again.
+    """
+    asset, rev = revision(url)
+    return hashlib.sha256(f"{EXTRACTOR_VERSION}\0{model}\0{asset}\0{rev}".encode("utf-8")).hexdigest()
+
+
+def ocr_image_url(product):
+    """
+    Returns the URL of the largest rendition of a product, the one most readable for OCR.
+    """
+    images = [img for img in product.get("images") or () if img.get("url")]
+    if not images:
+        return None
+    return max(images, key=lambda img: img.get("width") or 0)["url"]
+
+
+def image_info(data):
+    """
+    Returns {"format", "width", "height"} read from the header of a PNG, GIF, BMP or JPEG.
+    """
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        width, height = struct.unpack(">II", data[16:24])
+        return {"format": "png", "width": width, "height": height}
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        width, height = struct.unpack("<HH", data[6:10])
+        return {"format": "gif", "width": width, "height": height}
+    if data[:2] == b"BM":
+        width, height = struct.unpack("<ii", data[18:26])
+        return {"format": "bmp", "width": width, "height": abs(height)}
+    if data[:2] == b"\xff\xd8":
+        i = 2
+        while i + 9 <= len(data) and data[i] == 0xFF:
+            marker = data[i + 1]
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC): # start of frame
+                height, width = struct.unpack(">HH", data[i + 5:i + 9])
+                return {"format": "jpeg", "width": width, "height": height}
+            i += 2 + struct.unpack(">H", data[i + 2:i + 4])[0]
+        return {"format": "jpeg", "width": None, "height": None}
+    return {"format": None, "width": None, "height": None}
+
+
+def _allergen_groups(text):
+    return sorted({_ALLERGEN_WORDS[w] for w in _WORD.findall(text) if w in _ALLERGEN_WORDS})
+
+
+def parse_pack_text(text):
+    """
+    Extracts nutrition values and allergens from OCR text of a Dutch pack shot.
+
+    Returns:
+        dict: {"nutrition": {nutrient: value per 100 g/ml}, "allergens": [...],
+               "may_contain": [...]} with allergen groups from ALLERGENS.
+    """
+    text = text.lower()
+    nutrition = {}
+    for nutrient, pattern in NUTRIENTS.items():
+        match = pattern.search(text)
+        if match:
+            nutrition[nutrient] = float(match[1].replace(",", "."))
+    # Allergens are only read from the ingredient and allergen text
+    text = _NUTRITION_ROW.sub("", text)
+    may_contain = set()
+    for match in _MAY_CONTAIN.finditer(text):
+        may_contain.update(_allergen_groups(match[0]))
+    allergens = set()
+    for match in _CONTAINS.finditer(_MAY_CONTAIN.sub(" ", text)):
+        allergens.update(_allergen_groups(match[1]))
+    return {"nutrition": nutrition, "allergens": sorted(allergens), "may_contain": sorted(may_contain - allergens)}
+
+
+def _ocr(paths, command, language, timeout):
+    """
+    Runs the OCR command once for a batch of images, through a list file,
+    and returns one text per image.
+    """
+    fd, list_path = tempfile.mkstemp(suffix=".txt")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("\n".join(paths) + "\n")
+        result = subprocess.run(command + [list_path, "stdout", "-l", language, "--psm", "6"],
+                                capture_output=True, text=True, timeout=timeout,
+                                env=dict(os.environ, OMP_THREAD_LIMIT="1")) # one core per worker
+    finally:
+        os.unlink(list_path)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip()[-300:] or f"exit status {result.returncode}")
+    pages = result.stdout.split("\f") # tesseract ends every page with a form feed
+    if len(pages) == len(paths) + 1:
+        pages.pop()
+    if len(pages) != len(paths):
+        raise RuntimeError(f"OCR returned {len(pages)} pages for {len(paths)} images")
+    return pages
+
+
+def _extract_batch(batch, command, language, timeout):
+    """
+    Worker: extracts facts from a batch of (key, url, path).
+
+    Returns:
+        list: (key, facts or None, error or None) per image.
+    """
+    results = []
+    readable = []
+    infos = []
+    for key, url, path in batch:
+        try:
+            with open(path, "rb") as f:
+                header = f.read(65536)
+            size = os.path.getsize(path)
+        except OSError as e:
+            # e.g. evicted from the image cache since it was looked up
+            results.append((key, None, f"Unreadable image: {e}"))
+            continue
+        info = image_info(header)
+        info["bytes"] = size
+        readable.append((key, url, path))
+        infos.append({"image": info, "revision": revision(url)[1], "ocr": bool(command)})
+    batch = readable
+    if not command or not batch:
+        return results + [(key, facts, None) for (key, _, _), facts in zip(batch, infos)]
+    try:
+        texts = _ocr([path for _, _, path in batch], command, language, timeout)
+    except (OSError, RuntimeError, subprocess.SubprocessError) as e:
+        if len(batch) == 1:
+            return results + [(batch[0][0], None, str(e))]
+        # Isolate the image that broke the batch
+        return results + [result for task in batch for result in _extract_batch([task], command, language, timeout)]
+    for (key, _, _), facts, text in zip(batch, infos, texts):
+        facts.update(parse_pack_text(text), text_chars=len(text.strip()))
+        results.append((key, facts, None))
+    return results
+
+
+class ImageFactExtractor:
+    """
+    Extracts nutrition and allergen facts from product pack shots on the CPU.
+
+    The largest rendition of every product is taken from the ImageCache
+    (src/image_cache.py), batched and OCR'd in a process pool, one OCR
+    process per batch so the model is loaded once per batch rather than per
+    image. Facts are cached in SQLite per image revision: an image is only
+    processed again when AH publishes a new revLabel for it.
+
+    OCR runs through a tesseract-compatible command (`tesseract`, or e.g.
+    benchmarks/fake_tesseract.py). Without one, only the image format and
+    size are recorded; those entries are keyed separately, so installing
+    tesseract later extracts every image again.
+
+    Args:
+        image_cache (ImageCache): Where images are downloaded to and read from.
+        path (str): SQLite file of the facts cache.
+        ocr_command (str): OCR command line; None or "" to skip OCR.
+        language (str): OCR language (tesseract traineddata name).
+        max_workers (int): Worker processes, defaults to the CPU count.
+        batch_size (int): Images per OCR invocation.
+        timeout (float): Seconds allowed per batch.
+    """
+
+    def __init__(self, image_cache, path=DEFAULT_FACTS_PATH, ocr_command="tesseract", language="nld",
+                 max_workers=None, batch_size=16, timeout=300):
+        self.image_cache = image_cache
+        self.command = shlex.split(ocr_command) if ocr_command else []
+        if self.command and shutil.which(self.command[0]) is None:
+            logging.warning(f"OCR command '{self.command[0]}' not found; only image metadata will be extracted.")
+            self.command = []
+        self.model = f"ocr:{self.command[-1]}:{language}" if self.command else "header"
+        self.language = language
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS facts (key TEXT PRIMARY KEY, asset TEXT NOT NULL,"
+            " revision INTEGER NOT NULL, facts TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+
+    @classmethod
+    def from_config(cls, image_cache, config):
+        """
+        Builds an extractor from the `image_facts` section of config.yml.
+        """
+        settings = config.get("image_facts", {})
+        return cls(
+            image_cache,
+            path=settings.get("path", DEFAULT_FACTS_PATH),
+            ocr_command=settings.get("ocr_command", "tesseract"),
+            language=settings.get("language", "nld"),
+            max_workers=settings.get("max_workers"),
+            batch_size=settings.get("batch_size", 16),
+        )
+
+    def _cached(self, keys):
+        found = {}
+        keys = list(keys)
+        with self.lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self.connection.execute(
+                    f"SELECT key, facts FROM facts WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+                found.update((key, json.loads(facts)) for key, facts in rows)
+        return found
+
+    def _save(self, rows):
+        now = time.time()
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.executemany("INSERT OR REPLACE INTO facts VALUES (?, ?, ?, ?, ?)",
+                                        [(key, *revision(url), json.dumps(facts), now) for key, url, facts in rows])
+            self.connection.execute("COMMIT")
+
+    def extract(self, products):
+        """
+        Returns facts for every product with an image, extracting only new image revisions.
+
+        Returns:
+            tuple: ({webshopId: facts}, stats) where stats holds the counts of
+                   images, cached, processed and failed, the seconds spent and
+                   the processing throughput in images per second.
+        """
+        start = time.perf_counter()
+        images = {} # key -> (url, [webshopIds])
+        for product in products:
+            url = ocr_image_url(product)
+            if url and product.get("webshopId") is not None:
+                images.setdefault(image_key(url, self.model), (url, []))[1].append(product["webshopId"])
+        results = self._cached(images)
+        stats = {"images": len(images), "cached": len(results), "processed": 0, "failed": 0, "model": self.model}
+
+        pending = [(key, url) for key, (url, _) in images.items() if key not in results]
+        if pending:
+            self.image_cache.prefetch(url for _, url in pending)
+        tasks = []
+        for key, url in pending:
+            path = self.image_cache.path(url)
+            if path is None:
+                stats["failed"] += 1
+            else:
+                tasks.append((key, url, path))
+
+        process_start = time.perf_counter()
+        if tasks:
+            batches = [tasks[i:i + self.batch_size] for i in range(0, len(tasks), self.batch_size)]
+            urls = {key: url for key, url, _ in tasks}
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                for batch in executor.map(_extract_batch, batches, repeat(self.command), repeat(self.language),
+                                          repeat(self.timeout)):
+                    done = [(key, urls[key], facts) for key, facts, error in batch if facts is not None]
+                    for key, _, facts in done:
+                        results[key] = facts
+                    for key, _, error in batch:
+                        if error is not None:
+                            logging.warning(f"Extracting facts from {urls[key]} failed: {error}")
+                    stats["processed"] += len(done)
+                    stats["failed"] += len(batch) - len(done)
+                    self._save(done)
+        process_seconds = time.perf_counter() - process_start
+
+        stats["seconds"] = time.perf_counter() - start
+        stats["images_per_second"] = stats["processed"] / process_seconds if stats["processed"] else None
+        metrics.count("image_facts", stats["processed"], status="processed")
+        metrics.count("image_facts", stats["cached"], status="cached")
+        metrics.count("image_facts", stats["failed"], status="failed")
+        facts = {webshop_id: results[key] for key, (_, webshop_ids) in images.items() if key in results
+                 for webshop_id in webshop_ids}
+        return facts, stats
+
+    def close(self):
+        self.connection.close()
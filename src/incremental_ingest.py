@@ -0,0 +1,215 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import date
+
+from src.new_test import (
+    AH_API_BASE,
+    create_session,
+    fetch_bonus_page,
+    fetch_pages,
+    filter_bonus_products,
+    get_token,
+)
+
+# Files kept between runs in the same folder the full fetch writes to
+OUTPUT_DIR = "output"
+MANIFEST_PATH = os.path.join(OUTPUT_DIR, "bonus_manifest.json")
+CATALOGUE_PATH = os.path.join(OUTPUT_DIR, "bonus_catalogue.json")
+DELTA_PATH = os.path.join(OUTPUT_DIR, "bonus_delta.json")
+
+# Fields that describe the (anonymous) shopper rather than the product, so a
+# change in them is not a catalogue change
+VOLATILE_FIELDS = ("isPreviouslyBought",)
+
+
+def product_key(product):
+    return str(product.get("webshopId"))
+
+
+def product_hash(product):
+    """
+    Returns a stable content hash of a product, ignoring volatile fields.
+    """
+    content = {k: v for k, v in product.items() if k not in VOLATILE_FIELDS}
+    encoded = json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+def _read_json(path, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except json.JSONDecodeError as e:
+        logging.warning(f"Ignoring unreadable '{path}': {e}")
+        return default
+
+
+def _write_json_atomic(data, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """
+    Loads the ingestion manifest.
+
+    Returns:
+        dict: {"products": {webshopId: hash}, "pages": {page: {"etag", "ids"}}, "fetched_at": str}
+    """
+    manifest = _read_json(path, {})
+    manifest.setdefault("products", {})
+    manifest.setdefault("pages", {})
+    return manifest
+
+
+def catalogue_version(hashes):
+    """
+    Returns an identifier of a catalogue state (webshopId -> content hash), so
+    indexes can tell whether a delta applies to the state they were built from.
+    """
+    encoded = json.dumps(hashes, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+def diff_catalogue(products, previous_hashes, today=None):
+    """
+    Compares the current catalogue against the hashes of the previous run.
+
+    Args:
+        products (list): Current bonus products.
+        previous_hashes (dict): webshopId -> content hash from the manifest.
+        today (str): ISO date used to expire products whose bonusEndDate has passed.
+                     Defaults to the current date.
+
+    Returns:
+        tuple: (delta, hashes). delta holds the "added" and "changed" products and
+               the "expired" webshopIds; hashes is the new webshopId -> hash map.
+    """
+    today = today or date.today().isoformat()
+    delta = {"added": [], "changed": [], "expired": []}
+    hashes = {}
+
+    for product in products:
+        key = product_key(product)
+        end_date = product.get("bonusEndDate")
+        if end_date and end_date < today:
+            continue
+        digest = product_hash(product)
+        hashes[key] = digest
+        if key not in previous_hashes:
+            delta["added"].append(product)
+        elif previous_hashes[key] != digest:
+            delta["changed"].append(product)
+
+    delta["expired"] = sorted(key for key in previous_hashes if key not in hashes)
+    return delta, hashes
+
+
+def fetch_bonus_catalogue(concurrent=True, max_workers=4, base_url=AH_API_BASE, session=None,
+                          manifest_path=MANIFEST_PATH, catalogue_path=CATALOGUE_PATH, today=None):
+    """
+    Fetches the bonus catalogue incrementally, returning it together with what
+    changed since the previous run.
+
+    Pages are requested with If-None-Match when the manifest holds a validator for
+    them; a 304 answer is served from the locally kept catalogue. The manifest and
+    catalogue are only rewritten when something changed.
+
+    Args:
+        concurrent (bool): Fetch pages over a bounded thread pool.
+        max_workers (int): Maximum number of page requests in flight.
+        base_url (str): Base URL of the AH API (or a local stub server).
+        session (requests.Session): Optional session to reuse.
+        manifest_path (str): Location of the webshopId -> hash and page validator manifest.
+        catalogue_path (str): Location of the full catalogue kept for 304 answers.
+        today (str): ISO date used for expiry, defaults to the current date.
+
+    Returns:
+        tuple: (products, delta). products are the current bonus products whose
+               bonus has not ended; delta is {"added": [...], "changed": [...],
+               "expired": [webshopId, ...], "unchanged": int, "not_modified_pages": int,
+               "base_version", "version"}, where the versions identify the
+               catalogue before and after it (see catalogue_version).
+    """
+    size = 100
+    max_pages = 20
+    start = time.perf_counter()
+
+    manifest = load_manifest(manifest_path)
+    previous = {product_key(p): p for p in _read_json(catalogue_path, [])}
+    page_meta = {}
+    not_modified = []
+
+    own_session = session is None
+    if own_session:
+        session = create_session(pool_size=max(max_workers, 1))
+
+    try:
+        token = get_token(session=session, base_url=base_url)
+
+        def fetch_page(page):
+            cached = manifest["pages"].get(str(page), {})
+            # Only revalidate pages whose products we can still serve locally
+            etag = cached.get("etag") if all(i in previous for i in cached.get("ids", [])) else None
+            products, etag = fetch_bonus_page(token, page, size, session, base_url, etag=etag)
+            if products is None:
+                not_modified.append(page)
+                products = [previous[i] for i in cached["ids"]]
+            if products:
+                page_meta[str(page)] = {"etag": etag, "ids": [product_key(p) for p in products]}
+            return products
+
+        all_products = fetch_pages(fetch_page, concurrent=concurrent,
+                                   max_workers=max_workers, max_pages=max_pages)
+    finally:
+        if own_session:
+            session.close()
+
+    bonus_products = filter_bonus_products(all_products)
+    delta, hashes = diff_catalogue(bonus_products, manifest["products"], today)
+    delta["unchanged"] = len(hashes) - len(delta["added"]) - len(delta["changed"])
+    delta["not_modified_pages"] = len(not_modified)
+    delta["base_version"] = catalogue_version(manifest["products"])
+    delta["version"] = catalogue_version(hashes)
+
+    if delta["added"] or delta["changed"] or delta["expired"] or page_meta != manifest["pages"]:
+        _write_json_atomic(all_products, catalogue_path)
+        _write_json_atomic({
+            "products": hashes,
+            "pages": page_meta,
+            "fetched_at": date.today().isoformat() if today is None else today
+        }, manifest_path)
+
+    logging.info(f"Delta: {len(delta['added'])} added, {len(delta['changed'])} changed, "
+                 f"{len(delta['expired'])} expired, {delta['unchanged']} unchanged "
+                 f"({len(not_modified)} pages not modified) in {time.perf_counter() - start:.2f}s")
+    return [p for p in bonus_products if product_key(p) in hashes], delta
+
+
+def get_bonus_delta(concurrent=True, max_workers=4, base_url=AH_API_BASE, session=None,
+                    manifest_path=MANIFEST_PATH, catalogue_path=CATALOGUE_PATH, today=None):
+    """
+    Fetches the bonus catalogue incrementally and returns only what changed since
+    the previous run; see fetch_bonus_catalogue.
+    """
+    return fetch_bonus_catalogue(concurrent, max_workers, base_url, session,
+                                 manifest_path, catalogue_path, today)[1]
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    delta = get_bonus_delta()
+    _write_json_atomic(delta, DELTA_PATH)
+    logging.info(f"Saved delta to {DELTA_PATH}")
+
+
+if __name__ == "__main__":
+    main()
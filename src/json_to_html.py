@@ -1,44 +1,14 @@
+import io
 import json
 import os # Import the os module for path handling
+import threading
+from collections import OrderedDict
+from html import escape
 
-def get_image_url_by_width(images_list, target_width=400):
-    """
-    Finds the URL for the image closest to the target_width, preferring larger
-    if exact match not found.
-    """
-    if not images_list:
-        return ""
-    
-    best_match = None
-    min_diff = float('inf')
+from src.partition_writer import read_partition, write_atomic
 
-    for img in images_list:
-        if 'width' in img and 'url' in img:
-            width = img['width']
-            diff = abs(width - target_width)
-            if diff < min_diff:
-                min_diff = diff
-                best_match = img
-            elif diff == min_diff and width > (best_match['width'] if best_match else 0):
-                # Prefer larger image if difference is the same
-                best_match = img
-    
-    return best_match['url'] if best_match else images_list[0].get('url', '') # Fallback to first URL if no width found
-
-
-def generate_product_email_html(products_data):
-    """
-    Generates an HTML string for an email displaying multiple product items
-    in a structured, visually appealing format.
-
-    Args:
-        products_data (list): A list of dictionaries, where each dictionary
-                              represents a single product item with details.
-
-    Returns:
-        str: A complete HTML string ready to be used as an email body.
-    """
-    html_template = """
+# Static parts of the email, rendered around the product fragments
+HTML_HEAD = """
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -47,15 +17,15 @@ def generate_product_email_html(products_data):
         <title>Your Product Offers</title>
         <style>
             /* Basic Reset & Body Styles */
-            body, table, td, a {{ -webkit-text-size-adjust: 100%; -ms-text-size-adjust: 100%; }}
-            table, td {{ mso-table-lspace: 0pt; mso-table-rspace: 0pt; }}
-            img {{ -ms-interpolation-mode: bicubic; border: 0; height: auto; line-height: 100%; outline: none; text-decoration: none; }}
-            a {{ text-decoration: none; }}
-            .ExternalClass {{ width: 100%; }}
-            .ExternalClass, .ExternalClass p, .ExternalClass span, .ExternalClass font, .ExternalClass td, .ExternalClass div {{ line-height: 100%; }}
+            body, table, td, a { -webkit-text-size-adjust: 100%; -ms-text-size-adjust: 100%; }
+            table, td { mso-table-lspace: 0pt; mso-table-rspace: 0pt; }
+            img { -ms-interpolation-mode: bicubic; border: 0; height: auto; line-height: 100%; outline: none; text-decoration: none; }
+            a { text-decoration: none; }
+            .ExternalClass { width: 100%; }
+            .ExternalClass, .ExternalClass p, .ExternalClass span, .ExternalClass font, .ExternalClass td, .ExternalClass div { line-height: 100%; }
 
             /* Container for the whole email */
-            .email-container {{
+            .email-container {
                 max-width: 600px;
                 margin: auto;
                 background-color: #ffffff;
@@ -63,77 +33,77 @@ def generate_product_email_html(products_data):
                 color: #333333;
                 border-radius: 8px;
                 overflow: hidden; /* For rounded corners */
-            }}
+            }
             /* Header */
-            .header {{
+            .header {
                 background-color: #007bff;
                 color: #ffffff;
                 padding: 20px;
                 text-align: center;
                 border-top-left-radius: 8px;
                 border-top-right-radius: 8px;
-            }}
-            .header h1 {{
+            }
+            .header h1 {
                 margin: 0;
                 font-size: 24px;
                 font-weight: bold;
-            }}
+            }
             /* Product Item Styling */
-            .product-item {{
+            .product-item {
                 background-color: #f9f9f9;
                 border: 1px solid #eeeeee;
                 border-radius: 8px;
                 margin-bottom: 20px;
                 padding: 15px;
-            }}
-            .product-table {{
+            }
+            .product-table {
                 width: 100%;
                 border-collapse: collapse;
-            }}
-            .product-image-cell {{
+            }
+            .product-image-cell {
                 width: 30%;
                 vertical-align: top;
                 padding-right: 15px;
-            }}
-            .product-details-cell {{
+            }
+            .product-details-cell {
                 width: 45%;
                 vertical-align: top;
                 padding-right: 15px;
-            }}
-            .product-discount-cell {{
+            }
+            .product-discount-cell {
                 width: 25%;
                 vertical-align: top;
                 text-align: right;
-            }}
-            .product-image {{
+            }
+            .product-image {
                 max-width: 100%;
                 height: auto;
                 display: block;
                 border-radius: 6px;
-            }}
-            .product-title {{
+            }
+            .product-title {
                 font-size: 18px;
                 font-weight: bold;
                 margin-top: 0;
                 margin-bottom: 5px;
                 color: #007bff;
-            }}
-            .product-info {{
+            }
+            .product-info {
                 font-size: 14px;
                 margin-bottom: 3px;
                 line-height: 1.4;
-            }}
-            .price-before-bonus {{
+            }
+            .price-before-bonus {
                 text-decoration: line-through;
                 color: #888888;
                 font-size: 13px;
-            }}
-            .current-price {{
+            }
+            .current-price {
                 font-size: 16px;
                 font-weight: bold;
                 color: #28a745; /* Green for current price */
-            }}
-            .discount-label {{
+            }
+            .discount-label {
                 background-color: #ffe0b2; /* Light orange */
                 color: #e65100; /* Darker orange */
                 padding: 5px 8px;
@@ -143,8 +113,8 @@ def generate_product_email_html(products_data):
                 display: inline-block; /* Allows multiple labels to stack */
                 margin-bottom: 5px;
                 line-height: 1.2;
-            }}
-            .footer {{
+            }
+            .footer {
                 background-color: #f1f1f1;
                 color: #666666;
                 padding: 20px;
@@ -152,7 +122,7 @@ def generate_product_email_html(products_data):
                 font-size: 12px;
                 border-bottom-left-radius: 8px;
                 border-bottom-right-radius: 8px;
-            }}
+            }
         </style>
     </head>
     <body>
@@ -169,7 +139,9 @@ def generate_product_email_html(products_data):
                         <!-- Product Listings -->
                         <tr>
                             <td style="padding: 20px;">
-                                {products_html}
+                                """
+
+HTML_TAIL = """
                             </td>
                         </tr>
                         <!-- Footer -->
@@ -188,105 +160,277 @@ def generate_product_email_html(products_data):
     </html>
     """
 
-    products_html_snippets = []
-    for product in products_data:
-        # Safely get product details
-        title = product.get("title", "N/A")
-        webshop_id = product.get("webshopId", "N/A")
-        sales_unit_size = product.get("salesUnitSize", "N/A")
-        unit_price_description = product.get("unitPriceDescription", "N/A")
-        bonus_start_date = product.get("bonusStartDate", "N/A")
-        bonus_end_date = product.get("bonusEndDate", "N/A")
-        bonus_mechanism = product.get("bonusMechanism", "N/A")
-        
-        # Get raw price values to check for existence
-        current_price_raw = product.get('currentPrice')
-        price_before_bonus_raw = product.get('priceBeforeBonus')
-
-        # Price display logic:
-        price_display_html = ""
-        if current_price_raw is not None:
-            # If currentPrice exists, display priceBeforeBonus (if exists) struck through, then currentPrice
-            if price_before_bonus_raw is not None:
-                price_display_html = (
-                    f'<span class="price-before-bonus">€{price_before_bonus_raw:.2f}</span> '
-                    f'<span class="current-price">€{current_price_raw:.2f}</span>'
-                )
-            else:
-                # If only currentPrice is available
-                price_display_html = f'<span class="current-price">€{current_price_raw:.2f}</span>'
-        else:
-            # If currentPrice is not available, display priceBeforeBonus (if exists) as the main price, not struck through
-            if price_before_bonus_raw is not None:
-                price_display_html = f'<span class="current-price">€{price_before_bonus_raw:.2f}</span>'
-            else:
-                price_display_html = "N/A" # Fallback if neither price is available
-
-
-        main_category = product.get("mainCategory", "N/A")
-        sub_category = product.get("subCategory", "N/A")
-        discount_labels = product.get("discountLabels", [])
-        
-        # Get appropriate image URL
-        image_url = get_image_url_by_width(product.get("images", []), target_width=400)
-        if not image_url: # Fallback to a placeholder if no image URL is found
-            image_url = "https://placehold.co/400x400/cccccc/333333?text=No+Image"
-
-        discount_labels_html = ""
-        for label in discount_labels:
-            desc = label.get("defaultDescription", "")
-            amount = label.get("amount")
-            if desc:
-                discount_labels_html += f'<span class="discount-label">{desc}</span><br>'
-            elif amount is not None:
-                discount_labels_html += f'<span class="discount-label">€{amount:.2f} off</span><br>'
-
-        product_snippet = f"""
+PLACEHOLDER_IMAGE_URL = "https://placehold.co/400x400/cccccc/333333?text=No+Image"
+
+# Upper bound on cached per-product fragments and image choices; the weekly catalogue is ~1000 items
+FRAGMENT_CACHE_SIZE = 20000
+
+# Characters handed to a file or socket at once when streaming an email
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Gmail clips HTML bodies above ~102 KB; larger digests are split into pages
+MAX_EMAIL_BYTES = 100_000
+
+_fragments = OrderedDict() # (webshopId, content key) -> HTML fragment
+_best_images = OrderedDict() # (webshopId, target width, image urls) -> URL
+# Renders may run on several threads; held only while touching the caches
+_cache_lock = threading.Lock()
+
+
+def get_image_url_by_width(images_list, target_width=400):
+    """
+    Finds the URL for the image closest to the target_width, preferring larger
+    if exact match not found.
+    """
+    if not images_list:
+        return ""
+    
+    best_match = None
+    min_diff = float('inf')
+
+    for img in images_list:
+        if 'width' in img and 'url' in img:
+            width = img['width']
+            diff = abs(width - target_width)
+            if diff < min_diff:
+                min_diff = diff
+                best_match = img
+            elif diff == min_diff and width > (best_match['width'] if best_match else 0):
+                # Prefer larger image if difference is the same
+                best_match = img
+    
+    return best_match['url'] if best_match else images_list[0].get('url', '') # Fallback to first URL if no width found
+
+
+def best_image_url(product, target_width=400):
+    """
+    Returns the image URL of a product closest to `target_width`.
+
+    The choice is made once per product and image set and kept in an index,
+    so repeated renders of the same product skip the scan over its images.
+    """
+    images = product.get("images") or ()
+    key = (product.get("webshopId"), target_width, tuple(img.get("url") for img in images))
+    with _cache_lock:
+        url = _best_images.get(key)
+        if url is not None:
+            _best_images.move_to_end(key)
+            return url
+    url = get_image_url_by_width(images, target_width) or PLACEHOLDER_IMAGE_URL
+    _remember(_best_images, key, url)
+    return url
+
+
+def _remember(cache, key, value):
+    # Least recently used entries are dropped beyond FRAGMENT_CACHE_SIZE
+    with _cache_lock:
+        cache[key] = value
+        if len(cache) > FRAGMENT_CACHE_SIZE:
+            cache.popitem(last=False)
+
+
+def _text(value):
+    return escape(str(value))
+
+
+def _price_html(current_price, price_before_bonus):
+    # Strike through priceBeforeBonus when a currentPrice exists, otherwise it is the main price
+    if current_price is not None:
+        if price_before_bonus is not None:
+            return (
+                f'<span class="price-before-bonus">€{price_before_bonus:.2f}</span> '
+                f'<span class="current-price">€{current_price:.2f}</span>'
+            )
+        return f'<span class="current-price">€{current_price:.2f}</span>'
+    if price_before_bonus is not None:
+        return f'<span class="current-price">€{price_before_bonus:.2f}</span>'
+    return "N/A" # Fallback if neither price is available
+
+
+def _discount_labels_html(labels):
+    parts = []
+    for desc, amount in labels:
+        if desc:
+            parts.append(f'<span class="discount-label">{_text(desc)}</span><br>')
+        elif amount is not None:
+            parts.append(f'<span class="discount-label">€{amount:.2f} off</span><br>')
+    return "".join(parts)
+
+
+def render_product_fragment(product):
+    """
+    Returns the HTML table of one product, escaping all product text.
+
+    Fragments are cached by webshopId and the values they are rendered from,
+    so a product that is unchanged between emails (or subscribers) is only
+    rendered once per process.
+    """
+    labels = tuple(
+        (label.get("defaultDescription", ""), label.get("amount"))
+        for label in product.get("discountLabels") or ()
+    )
+    image_url = best_image_url(product, target_width=400)
+    content = (
+        product.get("title", "N/A"), product.get("salesUnitSize", "N/A"),
+        product.get("unitPriceDescription", "N/A"), product.get("bonusStartDate", "N/A"),
+        product.get("bonusEndDate", "N/A"), product.get("bonusMechanism", "N/A"),
+        product.get("currentPrice"), product.get("priceBeforeBonus"),
+        product.get("mainCategory", "N/A"), product.get("subCategory", "N/A"),
+        labels, image_url,
+    )
+    key = (product.get("webshopId", "N/A"), content)
+    with _cache_lock:
+        fragment = _fragments.get(key)
+        if fragment is not None:
+            _fragments.move_to_end(key)
+            return fragment
+
+    (title, sales_unit_size, unit_price_description, bonus_start_date, bonus_end_date,
+     bonus_mechanism, current_price, price_before_bonus, main_category, sub_category, _, _) = content
+    title = _text(title)
+    fragment = f"""
         <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" class="product-item">
             <tr>
                 <td class="product-image-cell">
-                    <img src="{image_url}" alt="{title}" width="150" height="150" class="product-image">
+                    <img src="{escape(image_url)}" alt="{title}" width="150" height="150" class="product-image">
                 </td>
                 <td class="product-details-cell">
-                    <p class="product-title">{title} ({webshop_id})</p>
-                    <p class="product-info"><strong>Bonus Period:</strong> {bonus_start_date} to {bonus_end_date}</p>
-                    <p class="product-info"><strong>Bonus Mechanism:</strong> {bonus_mechanism}</p>
-                    <p class="product-info">{price_display_html}</p>
-                    <p class="product-info"><strong>Category:</strong> {main_category} &gt; {sub_category}</p>
-                    <p class="product-info">{sales_unit_size} ({unit_price_description})</p>
+                    <p class="product-title">{title} ({_text(key[0])})</p>
+                    <p class="product-info"><strong>Bonus Period:</strong> {_text(bonus_start_date)} to {_text(bonus_end_date)}</p>
+                    <p class="product-info"><strong>Bonus Mechanism:</strong> {_text(bonus_mechanism)}</p>
+                    <p class="product-info">{_price_html(current_price, price_before_bonus)}</p>
+                    <p class="product-info"><strong>Category:</strong> {_text(main_category)} &gt; {_text(sub_category)}</p>
+                    <p class="product-info">{_text(sales_unit_size)} ({_text(unit_price_description)})</p>
                 </td>
                 <td class="product-discount-cell">
-                    {discount_labels_html}
+                    {_discount_labels_html(labels)}
                 </td>
             </tr>
         </table>
         """
-        products_html_snippets.append(product_snippet)
-    
-    return html_template.format(products_html="".join(products_html_snippets))
+    _remember(_fragments, key, fragment)
+    return fragment
+
+
+def clear_render_caches():
+    """
+    Empties the fragment and image caches, e.g. between catalogue weeks.
+    """
+    with _cache_lock:
+        _fragments.clear()
+        _best_images.clear()
+
+
+def generate_product_email_html(products_data):
+    """
+    Generates an HTML string for an email displaying multiple product items
+    in a structured, visually appealing format.
+
+    The static head and footer are module constants and each product comes
+    from the fragment cache, so an email is mostly a single string join.
+
+    Args:
+        products_data (iterable): A list or any iterable (e.g. `iter_json_items`)
+                              of dictionaries, where each dictionary
+                              represents a single product item with details.
+
+    Returns:
+        str: A complete HTML string ready to be used as an email body.
+    """
+    parts = [HTML_HEAD]
+    parts.extend(render_product_fragment(product) for product in products_data)
+    parts.append(HTML_TAIL)
+    return "".join(parts)
+
+
+def iter_product_email_html(products_data, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yields the email of `generate_product_email_html` in chunks of about
+    `chunk_size` characters.
+
+    Products are consumed lazily, so memory stays bounded by the chunk size
+    however many products the digest holds.
+    """
+    buffer, size = [HTML_HEAD], len(HTML_HEAD)
+    for product in products_data:
+        fragment = render_product_fragment(product)
+        buffer.append(fragment)
+        size += len(fragment)
+        if size >= chunk_size:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    buffer.append(HTML_TAIL)
+    yield "".join(buffer)
+
+
+def write_product_email_html(products_data, output, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Streams the email to a file path (written atomically), an open text or
+    binary file, or a connected socket.
+
+    Returns:
+        int: Number of UTF-8 bytes written.
+    """
+    written = 0
+
+    def write(f):
+        nonlocal written
+        binary = not isinstance(f, io.TextIOBase)
+        send = getattr(f, "sendall", None) or f.write
+        for chunk in iter_product_email_html(products_data, chunk_size):
+            data = chunk.encode("utf-8")
+            send(data if binary else chunk)
+            written += len(data)
+
+    if isinstance(output, (str, os.PathLike)):
+        write_atomic(os.fspath(output), write)
+    else:
+        write(output)
+    return written
+
+
+def iter_email_pages(products_data, max_bytes=MAX_EMAIL_BYTES):
+    """
+    Splits a digest into complete HTML documents of at most `max_bytes`
+    (UTF-8) each, to send as several emails or publish as several pages.
+
+    A single product larger than the limit still gets a page of its own.
+
+    Yields:
+        str: One complete HTML document per email or page.
+    """
+    overhead = len(HTML_HEAD.encode("utf-8")) + len(HTML_TAIL.encode("utf-8"))
+    fragments, size, pages = [], overhead, 0
+    for product in products_data:
+        fragment = render_product_fragment(product)
+        fragment_size = len(fragment.encode("utf-8"))
+        if fragments and size + fragment_size > max_bytes:
+            yield "".join([HTML_HEAD, *fragments, HTML_TAIL])
+            fragments, size, pages = [], overhead, pages + 1
+        fragments.append(fragment)
+        size += fragment_size
+    if fragments or not pages:
+        yield "".join([HTML_HEAD, *fragments, HTML_TAIL])
 
 # --- Example Usage ---
-# Path to your input JSON file
+# Path to your input partition file (any format written by filter_and_split_json)
 input_json_file_path = "filtered_jsons/mainCategory_Koffie_thee.json"
 output_html_file_path = "generated_email.html" # Define the output HTML file path
 
-try:
-    with open(input_json_file_path, 'r', encoding='utf-8') as f:
-        products_to_email = json.load(f) # Use json.load directly as the file contains the list
-    
-    # Generate the HTML
-    generated_html = generate_product_email_html(products_to_email)
+if __name__ == "__main__":
+    try:
+        # Works for pretty, compact, JSON Lines and id-list partitions
+        products_to_email = read_partition(input_json_file_path)
 
-    # Save the generated HTML to a file instead of printing
-    with open(output_html_file_path, 'w', encoding='utf-8') as f:
-        f.write(generated_html)
-    
-    print(f"Generated HTML email saved to: {os.path.abspath(output_html_file_path)}")
-
-except FileNotFoundError:
-    print(f"Error: The file '{input_json_file_path}' was not found.")
-    print("Please ensure you have run the previous JSON filtering script to create this file.")
-except json.JSONDecodeError as e:
-    print(f"Error decoding JSON from '{input_json_file_path}': {e}")
-except Exception as e:
-    print(f"An unexpected error occurred: {e}")
+        # Stream the HTML straight into the output file
+        write_product_email_html(products_to_email, output_html_file_path)
+
+        print(f"Generated HTML email saved to: {os.path.abspath(output_html_file_path)}")
+
+    except FileNotFoundError:
+        print(f"Error: The file '{input_json_file_path}' was not found.")
+        print("Please ensure you have run the previous JSON filtering script to create this file.")
+    except json.JSONDecodeError as e:
+        print(f"Error decoding JSON from '{input_json_file_path}': {e}")
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
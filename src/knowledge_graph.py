@@ -0,0 +1,275 @@
+import json
+import os
+import struct
+from array import array
+from collections import deque
+
+# Default location of the serialised graph
+DEFAULT_GRAPH_PATH = os.path.join("data", "graph", "knowledge_graph.bin")
+
+# File layout: MAGIC | header length (u32, little endian) | header JSON |
+# CSR offsets (u64 per node + 1) | targets (u32 per edge) | relations (u8 per edge)
+MAGIC = b"AHGRAPH1"
+
+
+class KnowledgeGraph:
+    """
+    Typed property graph with integer node ids and adjacency indexes.
+
+    Nodes are identified by a unique key such as "product:54074" and get a
+    dense integer id. Every node has a type ("product", "recipe", "category",
+    "ingredient", ...) and a small attribute dict; nodes are indexed by type.
+    Edges carry a relation code and are kept as per-node adjacency arrays in
+    both directions, so neighbour lookups are O(degree). Updates are
+    incremental: nodes and edges can be added or removed when the weekly
+    catalogue changes. Removed node ids are not reused.
+    """
+
+    def __init__(self):
+        self.keys = [] # id -> key, None once removed
+        self.ids = {} # key -> id
+        self.types = [] # id -> type name
+        self.attrs = [] # id -> attribute dict
+        self.by_type = {} # type -> set of ids
+        self.relations = [] # relation code -> name
+        self.relation_codes = {} # name -> code
+        self.out_targets = [] # id -> array of target ids
+        self.out_relations = [] # id -> array of relation codes
+        self.in_sources = []
+        self.in_relations = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def edge_count(self):
+        keys = self.keys
+        return sum(1 for targets in self.out_targets for t in targets if keys[t] is not None)
+
+    def _relation_code(self, relation):
+        code = self.relation_codes.get(relation)
+        if code is None:
+            if len(self.relations) >= 256:
+                raise ValueError("A graph supports at most 256 relation types.")
+            code = self.relation_codes[relation] = len(self.relations)
+            self.relations.append(relation)
+        return code
+
+    def add_node(self, key, node_type, **attrs):
+        """
+        Adds a node, or updates the attributes of an existing one.
+
+        Returns:
+            int: The node id.
+        """
+        node = self.ids.get(key)
+        if node is not None:
+            self.attrs[node].update(attrs)
+            return node
+        node = len(self.keys)
+        self.keys.append(key)
+        self.ids[key] = node
+        self.types.append(node_type)
+        self.attrs.append(attrs)
+        self.by_type.setdefault(node_type, set()).add(node)
+        for adjacency, typecode in ((self.out_targets, "I"), (self.out_relations, "B"),
+                                    (self.in_sources, "I"), (self.in_relations, "B")):
+            adjacency.append(array(typecode))
+        return node
+
+    def add_edge(self, source, target, relation):
+        """
+        Adds a typed edge between two node ids, unless it already exists.
+        """
+        code = self._relation_code(relation)
+        targets, relations = self.out_targets[source], self.out_relations[source]
+        for i, existing in enumerate(targets):
+            if existing == target and relations[i] == code:
+                return
+        targets.append(target)
+        relations.append(code)
+        self.in_sources[target].append(source)
+        self.in_relations[target].append(code)
+
+    def remove_node(self, key):
+        """
+        Removes a node and all of its edges.
+
+        Edges pointing at the node from its neighbours are left in their
+        adjacency arrays and skipped by queries, so removal costs O(degree of
+        the node) instead of rewriting every neighbour; `save` drops them.
+        """
+        node = self.ids.pop(key, None)
+        if node is None:
+            return
+        for adjacency in (self.out_targets, self.out_relations, self.in_sources, self.in_relations):
+            del adjacency[node][:]
+        self.by_type[self.types[node]].discard(node)
+        self.keys[node] = None
+
+    def node(self, node):
+        """
+        Returns {"id", "key", "type", **attrs} for a node id.
+        """
+        return dict(self.attrs[node], id=node, key=self.keys[node], type=self.types[node])
+
+    def nodes_of_type(self, node_type, **attrs):
+        """
+        Returns the ids of nodes of a type whose attributes match `attrs`.
+        """
+        nodes = self.by_type.get(node_type, ())
+        if not attrs:
+            return sorted(nodes)
+        return sorted(n for n in nodes if all(self.attrs[n].get(k) == v for k, v in attrs.items()))
+
+    def neighbours(self, node, relation=None, direction="out"):
+        """
+        Returns neighbour ids of a node, optionally restricted to one relation.
+
+        Args:
+            direction (str): "out" follows edges forward, "in" backward.
+        """
+        if direction == "out":
+            nodes, relations = self.out_targets[node], self.out_relations[node]
+        else:
+            nodes, relations = self.in_sources[node], self.in_relations[node]
+        keys = self.keys
+        if relation is None:
+            return [n for n in nodes if keys[n] is not None]
+        code = self.relation_codes.get(relation)
+        return [n for n, r in zip(nodes, relations) if r == code and keys[n] is not None]
+
+    def follow(self, nodes, path):
+        """
+        Follows a sequence of relations from a set of nodes.
+
+        Args:
+            nodes (iterable): Start node ids.
+            path (list): Relation names; prefix a name with "~" to follow it backward.
+
+        Returns:
+            list: Sorted ids reached after the last step.
+        """
+        frontier = set(nodes)
+        for step in path:
+            direction = "in" if step.startswith("~") else "out"
+            relation = step.lstrip("~")
+            frontier = {n for node in frontier for n in self.neighbours(node, relation, direction)}
+        return sorted(frontier)
+
+    def reachable(self, nodes, target_type=None, max_depth=None):
+        """
+        Breadth-first search along outgoing edges.
+
+        Returns:
+            list: Sorted ids reachable from `nodes` (excluding them), optionally
+                  only those of `target_type`.
+        """
+        start = set(nodes)
+        seen = set(start)
+        queue = deque((node, 0) for node in start)
+        while queue:
+            node, depth = queue.popleft()
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for neighbour in self.out_targets[node]:
+                if neighbour not in seen and self.keys[neighbour] is not None:
+                    seen.add(neighbour)
+                    queue.append((neighbour, depth + 1))
+        found = seen - start
+        if target_type is not None:
+            found &= self.by_type.get(target_type, set())
+        return sorted(found)
+
+    def shortest_path(self, source, target, undirected=True):
+        """
+        Returns the node ids of a shortest path from source to target, or None.
+        """
+        parents = {source: None}
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            if node == target:
+                path = []
+                while node is not None:
+                    path.append(node)
+                    node = parents[node]
+                return path[::-1]
+            neighbours = list(self.out_targets[node])
+            if undirected:
+                neighbours.extend(self.in_sources[node])
+            for neighbour in neighbours:
+                if neighbour not in parents and self.keys[neighbour] is not None:
+                    parents[neighbour] = node
+                    queue.append(neighbour)
+        return None
+
+    def to_dict(self):
+        """
+        Returns the graph in the former {"nodes": [...], "edges": [...]} layout.
+        """
+        nodes = [dict(self.attrs[n], id=self.keys[n], type=self.types[n])
+                 for n in range(len(self.keys)) if self.keys[n] is not None]
+        edges = [{"source": self.keys[s], "target": self.keys[t], "relation": self.relations[r]}
+                 for s in range(len(self.keys))
+                 for t, r in zip(self.out_targets[s], self.out_relations[s]) if self.keys[t] is not None]
+        return {"nodes": nodes, "edges": edges}
+
+    def save(self, path=DEFAULT_GRAPH_PATH):
+        """
+        Serialises the graph: node metadata as a JSON header, edges as CSR arrays.
+        """
+        offsets = array("Q", [0])
+        targets = array("I")
+        relations = array("B")
+        keys = self.keys
+        for node in range(len(keys)):
+            for target, code in zip(self.out_targets[node], self.out_relations[node]):
+                if keys[target] is not None:
+                    targets.append(target)
+                    relations.append(code)
+            offsets.append(len(targets))
+        header = json.dumps({
+            "keys": self.keys, "types": self.types, "attrs": self.attrs,
+            "relations": self.relations
+        }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            for values in (offsets, targets, relations):
+                values.tofile(f)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_GRAPH_PATH):
+        """
+        Loads a graph written by `save`.
+        """
+        graph = cls()
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"'{path}' is not a knowledge graph file.")
+            header = json.loads(f.read(struct.unpack("<I", f.read(4))[0]))
+            offsets = array("Q")
+            offsets.fromfile(f, len(header["keys"]) + 1)
+            targets = array("I")
+            targets.fromfile(f, offsets[-1])
+            relations = array("B")
+            relations.fromfile(f, offsets[-1])
+
+        for relation in header["relations"]:
+            graph._relation_code(relation)
+        for key, node_type, attrs in zip(header["keys"], header["types"], header["attrs"]):
+            node = graph.add_node(key if key is not None else f"_removed:{len(graph.keys)}", node_type, **attrs)
+            if key is None:
+                graph.remove_node(graph.keys[node])
+        for node in range(len(graph.keys)):
+            start, end = offsets[node], offsets[node + 1]
+            graph.out_targets[node] = targets[start:end]
+            graph.out_relations[node] = relations[start:end]
+            for target, code in zip(targets[start:end], relations[start:end]):
+                graph.in_sources[target].append(node)
+                graph.in_relations[target].append(code)
+        return graph
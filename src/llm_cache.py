@@ -0,0 +1,155 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from src import metrics
+
+# Default location of the on-disk cache, next to the other generated data
+DEFAULT_CACHE_PATH = os.path.join("data", "cache", "llm_cache.sqlite")
+
+
+def normalise_prompt(prompt):
+    """
+    Collapses whitespace so formatting-only differences share a cache entry.
+    """
+    return " ".join(prompt.split())
+
+
+def cache_key(model_name, temperature, prompt):
+    text = f"{model_name}\0{float(temperature)!r}\0{normalise_prompt(prompt)}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    SQLite-backed prompt/response cache with TTL and LRU eviction.
+
+    Entries expire `ttl_seconds` after they were written. When more than
+    `max_entries` are stored, the least recently used ones are evicted.
+    Hit, miss, expiry and eviction counts of this process are kept in `stats`.
+
+    Args:
+        path (str): SQLite file, created when missing.
+        ttl_seconds (float): Lifetime of an entry, None to keep entries forever.
+        max_entries (int): Maximum number of entries, None for unbounded.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=30 * 24 * 3600, max_entries=10000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, response TEXT NOT NULL,"
+            " created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds a cache from the `llm_cache` section of config.yml, or returns
+        None when the section is missing or disabled.
+        """
+        settings = config.get("llm_cache")
+        if not settings or not settings.get("enabled", True):
+            return None
+        ttl_days = settings.get("ttl_days")
+        return cls(
+            path=settings.get("path", DEFAULT_CACHE_PATH),
+            ttl_seconds=ttl_days * 24 * 3600 if ttl_days is not None else None,
+            max_entries=settings.get("max_entries"),
+        )
+
+    def get(self, key):
+        """
+        Returns the cached response for a key, or None.
+        """
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                metrics.count("llm_cache_misses")
+                return None
+            response, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                metrics.count("llm_cache_misses")
+                return None
+            self.connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.stats["hits"] += 1
+            metrics.count("llm_cache_hits")
+            return response
+
+    def put(self, key, response):
+        """
+        Stores a response and evicts least recently used entries beyond max_entries.
+        """
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            if self.max_entries is not None:
+                evicted = self.connection.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    " SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                ).rowcount
+                self.stats["evictions"] += max(evicted, 0)
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class CachedLLM:
+    """
+    Wraps an LLM client so `generate_text` is answered from an LLMResponseCache
+    when the same model, temperature and prompt were seen before.
+
+    Other attributes (e.g. `generate_batch`) are forwarded to the wrapped client;
+    LLMBatchScheduler uses `lookup` and `store` to serve batches from the cache.
+    """
+
+    def __init__(self, llm, cache, model_name):
+        self.llm = llm
+        self.cache = cache
+        self.model_name = model_name
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    def lookup(self, prompt, temperature):
+        return self.cache.get(cache_key(self.model_name, temperature, prompt))
+
+    def store(self, prompt, temperature, response):
+        if response is not None:
+            self.cache.put(cache_key(self.model_name, temperature, prompt), response)
+
+    def generate_text(self, prompt, temperature):
+        response = self.lookup(prompt, temperature)
+        if response is None:
+            response = self.llm.generate_text(prompt, temperature)
+            self.store(prompt, temperature, response)
+        else:
+            logging.debug(f"LLM cache hit for: {prompt[:50]}...")
+        return response
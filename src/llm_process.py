@@ -1,6 +1,16 @@
+import hashlib
 import os
 import yaml
 import logging
+import requests
+
+from src import metrics
+from src.bonus_mechanism import rank_by_savings
+from src.embedding_index import DEFAULT_DIM, embed_text
+from src.knowledge_graph import KnowledgeGraph
+from src.llm_cache import CachedLLM, LLMResponseCache
+from src.llm_scheduler import LLMBatchScheduler
+from src.product_store import ProductStore
 
 # Placeholder for actual LLM and LangGraph integration
 # This file would contain the detailed logic for:
@@ -12,12 +22,45 @@ import logging
 # Configure logging for this module
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def load_llm_model(model_name, api_endpoint):
+class ChatCompletionsLLM:
+    """
+    Minimal client for an OpenAI-compatible chat completions endpoint, such as
+    GitHub Models or the local fake server in benchmarks/fake_llm_server.py.
+    """
+    def __init__(self, model_name, api_endpoint, api_key=None, timeout=60):
+        self.model_name = model_name
+        self.url = api_endpoint.rstrip("/") + "/chat/completions"
+        self.session = metrics.instrument_session(requests.Session(), "llm") # keep-alive across calls
+        self.session.headers["Content-Type"] = "application/json"
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+        self.timeout = timeout
+
+    def generate_text(self, prompt, temperature):
+        payload = {
+            "model": self.model_name,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature
+        }
+        response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+def load_llm_model(model_name, api_endpoint, api_key=None, cache=None):
     """
-    Placeholder: Loads or initializes the GitHub-hosted LLM model.
-    In a real scenario, this would involve API calls to the LLM service.
+    Loads or initializes the GitHub-hosted LLM model.
+    An http(s) endpoint gets a chat completions client; anything else falls
+    back to the placeholder DummyLLM. With an LLMResponseCache the client is
+    wrapped in a CachedLLM, so repeated prompts are served from disk.
     """
     logging.info(f"Loading GitHub-hosted LLM model: {model_name} from {api_endpoint}...")
+    if api_endpoint.startswith(("http://", "https://")):
+        llm = ChatCompletionsLLM(model_name, api_endpoint, api_key)
+    else:
+        llm = _dummy_llm()
+    return CachedLLM(llm, cache, model_name) if cache is not None else llm
+
+def _dummy_llm():
     # Example: dummy model object
     class DummyLLM:
         def generate_text(self, prompt, temperature):
@@ -26,41 +69,67 @@ def load_llm_model(model_name, api_endpoint):
             if "recipe" in prompt.lower():
                 return f"Recipe generated by LLM for: {prompt}"
             return f"LLM response for: {prompt}"
+
+        def generate_batch(self, prompts, temperature):
+            return [self.generate_text(prompt, temperature) for prompt in prompts]
     return DummyLLM()
 
-def generate_embeddings(text, embedding_model_api):
+def generate_embeddings(text, embedding_model_api=None, dim=DEFAULT_DIM):
     """
-    Placeholder: Generates embeddings for text using a GitHub-compatible embedding model.
+    Generates a dense embedding for text with the local hashed n-gram model
+    from src/embedding_index.py. `embedding_model_api` is kept for callers of
+    the former placeholder and is not used.
     """
     logging.info(f"Generating embeddings for text: {text[:30]}...")
-    # Simulate embedding vector
-    return [0.1] * 768 # Dummy embedding vector
+    vector = [0.0] * dim
+    for dimension, weight in embed_text(text, dim=dim).items():
+        vector[dimension] = weight
+    return vector
 
-def build_knowledge_graph_with_langgraph(data, llm, embedding_model, temperature):
+def build_knowledge_graph_with_langgraph(data, llm, embedding_model, temperature, graph=None):
     """
     Placeholder: Builds the knowledge graph using LangGraph based on processed data.
     This is where the complex orchestration of LLM calls, RAG, and graph construction
     would occur using LangGraph agents/chains.
+    `llm` may be a client or an LLMBatchScheduler; recipe prompts are batched.
+
+    Products are linked to their category and to the recipe the LLM suggests.
+    Passing the graph of a previous run updates it in place: products already
+    in the graph are not prompted again.
+
+    Returns:
+        KnowledgeGraph: The graph (use `to_dict()` for the nodes/edges layout).
     """
     logging.info("Building knowledge graph with LangGraph...")
     logging.info(f"LangGraph temperature setting: {temperature}")
 
-    # Dummy graph creation
-    knowledge_graph = {
-        "nodes": [],
-        "edges": []
-    }
-    
-    for i, item in enumerate(data):
-        node_id = f"product_{i}"
-        knowledge_graph["nodes"].append({"id": node_id, "type": "product", "name": item.get('title')})
-        # Simulate LLM interaction for recipe generation or insights
-        recipe_prompt = f"Generate a healthy recipe idea using {item.get('title')}."
-        llm_response = llm.generate_text(recipe_prompt, temperature)
-        knowledge_graph["nodes"].append({"id": f"recipe_{i}", "type": "recipe", "description": llm_response})
-        knowledge_graph["edges"].append({"source": node_id, "target": f"recipe_{i}", "relation": "inspires_recipe"})
-
-    logging.info("Knowledge graph construction simulated.")
+    knowledge_graph = graph if graph is not None else KnowledgeGraph()
+
+    new_items = []
+    for item in data:
+        key = f"product:{item.get('webshopId')}"
+        known = key in knowledge_graph.ids
+        node_id = knowledge_graph.add_node(key, "product", name=item.get('title'),
+                                           category=item.get('mainCategory'), isBonus=bool(item.get('isBonus')))
+        if item.get('mainCategory'):
+            category_id = knowledge_graph.add_node(f"category:{item['mainCategory']}", "category", name=item['mainCategory'])
+            knowledge_graph.add_edge(node_id, category_id, "in_category")
+        if not known:
+            new_items.append((node_id, item))
+
+    # Simulate LLM interaction for recipe generation or insights, batched
+    recipe_prompts = [f"Generate a healthy recipe idea using {item.get('title')}." for _, item in new_items]
+    scheduler = llm if isinstance(llm, LLMBatchScheduler) else LLMBatchScheduler(llm, temperature)
+    llm_responses = scheduler.generate_many(recipe_prompts)
+
+    for (node_id, item), llm_response in zip(new_items, llm_responses):
+        if llm_response is None:
+            continue
+        recipe_key = f"recipe:{hashlib.sha1(llm_response.encode('utf-8')).hexdigest()[:16]}"
+        recipe_id = knowledge_graph.add_node(recipe_key, "recipe", description=llm_response)
+        knowledge_graph.add_edge(node_id, recipe_id, "inspires_recipe")
+
+    logging.info(f"Knowledge graph has {len(knowledge_graph)} nodes and {knowledge_graph.edge_count()} edges.")
     return knowledge_graph
 
 def extract_image_information(items_data):
@@ -69,7 +138,10 @@ def extract_image_information(items_data):
     for product recommendations. This is the core logic described in the README.
 
     Args:
-        items_data (list): List of product items (dictionaries).
+        items_data (iterable or ProductStore): Product items (dictionaries), either
+                               a list, a stream such as `iter_json_items`, or an
+                               already built ProductStore, possibly with image
+                               facts attached.
 
     Returns:
         tuple: (recommended_items, generated_recipes)
@@ -91,7 +163,9 @@ def extract_image_information(items_data):
     langgraph_temperature = config['langgraph_config']['temperature']
 
     # Initialize LLM and Embedding Model (placeholders)
-    llm = load_llm_model(llm_model_name, llm_api_endpoint)
+    llm_api_key = os.environ.get(config['llm_config'].get('llm_api_key_env_var', 'GITHUB_TOKEN'))
+    cache = LLMResponseCache.from_config(config)
+    llm = load_llm_model(llm_model_name, llm_api_endpoint, llm_api_key, cache)
     # embedding_model = some_embedding_model_initializer(config['embedding_model_api_key_env_var']) # Placeholder
 
     # --- Core Logic Simulation ---
@@ -103,17 +177,30 @@ def extract_image_information(items_data):
     # 5. Using RAG to find relevant recipes/info.
     # 6. Building and updating a dynamic knowledge graph with LangGraph.
 
-    # Simulating recommendations and recipes based on input data
-    recommended_items = [
-        item for item in items_data
-        if item.get('isBonus') and item.get('currentPrice', 0) < 6
-    ]
-
-    generated_recipes = []
-    for item in recommended_items:
-        # Simulate LLM generating a recipe using the item's title
-        recipe_idea = llm.generate_text(f"Healthy recipe for {item.get('title', 'product')}", langgraph_temperature)
-        generated_recipes.append(recipe_idea)
+    # Simulating recommendations and recipes based on input data:
+    # bonus items under 6 euro, selected on the store's price column, that save
+    # at least min_discount_percentage, best saving first
+    store = items_data if isinstance(items_data, ProductStore) else ProductStore(items_data)
+    # and contain none of the excluded allergens according to the pack shots
+    min_discount = config.get('recommendation_settings', {}).get('min_discount_percentage')
+    exclude_allergens = config.get('recommendation_settings', {}).get('exclude_allergens')
+    candidates = store.query(bonus_only=True, max_price=6, exclude_allergens=exclude_allergens)
+    recommended_positions = rank_by_savings(store, candidates, min_discount)
+    recommended_items = store.rows(recommended_positions)
+
+    # Simulate LLM generating a recipe using the item's title, several items per request
+    scheduler = LLMBatchScheduler.from_config(llm, config)
+    try:
+        generated_recipes = scheduler.generate_many(
+            f"Healthy recipe for {item.get('title', 'product')}" for item in recommended_items
+        )
+        logging.info(f"LLM scheduler stats: {scheduler.stats}")
+        if cache is not None:
+            logging.info(f"LLM cache stats: {cache.stats}")
+    finally:
+        # The scheduler has finished with the cache; release its SQLite connection
+        if cache is not None:
+            cache.close()
 
     # Build a dummy knowledge graph (actual LangGraph logic would be here)
     # knowledge_graph = build_knowledge_graph_with_langgraph(items_data, llm, embedding_model, langgraph_temperature)
@@ -0,0 +1,201 @@
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src import metrics
+
+# Markers used when several prompts are packed into a single request
+PACKED_HEADER = (
+    "Answer each of the following {count} requests separately. Start every answer "
+    "with its marker line, e.g. '### Item 1', and do not add other text.\n\n"
+)
+ITEM_MARKER = "### Item {number}"
+_ITEM_SPLIT = re.compile(r"^### Item (\d+)\s*$", re.M)
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English/Dutch text
+    return max(1, len(text) // 4)
+
+
+class RateBudget:
+    """
+    Thread-safe sliding-window budget of requests and tokens per minute.
+
+    `acquire` blocks until a request of the given token size fits in both limits.
+    A limit of None is unlimited.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, window=60.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window = window
+        self.events = [] # (timestamp, tokens)
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.events = [(t, n) for t, n in self.events if now - t < self.window]
+                used_tokens = sum(n for _, n in self.events)
+                requests_ok = self.requests_per_minute is None or len(self.events) < self.requests_per_minute
+                # A single oversized request is let through once the window is empty
+                tokens_ok = (self.tokens_per_minute is None or not self.events
+                             or used_tokens + tokens <= self.tokens_per_minute)
+                if requests_ok and tokens_ok:
+                    self.events.append((now, tokens))
+                    return
+                wait = self.window - (now - self.events[0][0])
+            time.sleep(max(wait, 0.01))
+
+
+def pack_prompts(prompts):
+    """
+    Packs several prompts into one request with numbered item markers.
+    """
+    parts = [PACKED_HEADER.format(count=len(prompts))]
+    for number, prompt in enumerate(prompts, start=1):
+        parts.append(f"{ITEM_MARKER.format(number=number)}\n{prompt}\n")
+    return "\n".join(parts)
+
+
+def unpack_response(response, count):
+    """
+    Splits a packed response back into per-item answers.
+
+    Returns:
+        list: `count` answers; an entry is None when its marker is missing.
+    """
+    answers = [None] * count
+    pieces = _ITEM_SPLIT.split(response or "")
+    # pieces = [preamble, number, text, number, text, ...]
+    for number, text in zip(pieces[1::2], pieces[2::2]):
+        index = int(number) - 1
+        if 0 <= index < count and answers[index] is None:
+            answers[index] = text.strip()
+    return answers
+
+
+class LLMBatchScheduler:
+    """
+    Groups prompts into batches and runs them concurrently against an LLM client.
+
+    A client exposing `generate_batch(prompts, temperature)` receives each batch
+    as one call. Otherwise the batch is packed into a single prompt for
+    `generate_text` and the answer is split on item markers. Items whose answer
+    is missing, or whose batch fails, are retried one by one, so a single bad
+    item never sinks its batch.
+
+    When `llm` is a CachedLLM, cached prompts are answered up front, only the
+    misses are sent, and their answers are stored back in the cache.
+
+    Args:
+        llm: Client with `generate_text(prompt, temperature)`.
+        temperature (float): Generation temperature passed to the client.
+        batch_size (int): Prompts per request.
+        max_concurrency (int): Requests in flight at once.
+        requests_per_minute (int): Request budget, None for unlimited.
+        tokens_per_minute (int): Estimated prompt token budget, None for unlimited.
+    """
+
+    def __init__(self, llm, temperature=0.7, batch_size=8, max_concurrency=4,
+                 requests_per_minute=None, tokens_per_minute=None):
+        self.llm = llm
+        # Requests go to the wrapped client; the cache is consulted in generate_many
+        self.client = llm.llm if hasattr(llm, "lookup") else llm
+        self.temperature = temperature
+        self.batch_size = max(batch_size, 1)
+        self.max_concurrency = max(max_concurrency, 1)
+        self.budget = RateBudget(requests_per_minute, tokens_per_minute)
+        self.stats = {"requests": 0, "items": 0, "cached": 0, "fallbacks": 0, "failures": 0}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, llm, config):
+        """
+        Builds a scheduler from the `llm_scheduler` and `langgraph_config` sections of config.yml.
+        """
+        settings = config.get("llm_scheduler", {})
+        return cls(
+            llm,
+            temperature=config.get("langgraph_config", {}).get("temperature", 0.7),
+            batch_size=settings.get("batch_size", 8),
+            max_concurrency=settings.get("max_concurrency", 4),
+            requests_per_minute=settings.get("requests_per_minute"),
+            tokens_per_minute=settings.get("tokens_per_minute"),
+        )
+
+    def _count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def _call(self, method, prompt_or_prompts, tokens):
+        self.budget.acquire(tokens)
+        self._count("requests")
+        metrics.count("llm_requests")
+        metrics.count("llm_prompt_tokens", tokens)
+        response = method(prompt_or_prompts, self.temperature)
+        if metrics.is_enabled():
+            answers = [response] if isinstance(response, str) else response or []
+            metrics.count("llm_completion_tokens", sum(estimate_tokens(a) for a in answers if a))
+        return response
+
+    def _run_single(self, prompt):
+        try:
+            return self._call(self.client.generate_text, prompt, estimate_tokens(prompt))
+        except Exception as e:
+            logging.warning(f"LLM request failed for prompt '{prompt[:50]}...': {e}")
+            self._count("failures")
+            return None
+
+    def _run_batch(self, prompts):
+        if len(prompts) == 1:
+            return [self._run_single(prompts[0])]
+        tokens = sum(estimate_tokens(p) for p in prompts)
+        try:
+            if hasattr(self.client, "generate_batch"):
+                answers = list(self._call(self.client.generate_batch, prompts, tokens))
+                answers = (answers + [None] * len(prompts))[:len(prompts)]
+            else:
+                response = self._call(self.client.generate_text, pack_prompts(prompts), tokens)
+                answers = unpack_response(response, len(prompts))
+        except Exception as e:
+            logging.warning(f"LLM batch of {len(prompts)} prompts failed, retrying items one by one: {e}")
+            answers = [None] * len(prompts)
+
+        for index, answer in enumerate(answers):
+            if answer is None:
+                self._count("fallbacks")
+                answers[index] = self._run_single(prompts[index])
+        return answers
+
+    def generate_many(self, prompts):
+        """
+        Generates answers for all prompts.
+
+        Returns:
+            list: One answer per prompt, in order; None where the LLM failed.
+        """
+        prompts = list(prompts)
+        answers = [None] * len(prompts)
+        self._count("items", len(prompts))
+
+        pending = list(range(len(prompts)))
+        if hasattr(self.llm, "lookup"):
+            for index in pending:
+                answers[index] = self.llm.lookup(prompts[index], self.temperature)
+            pending = [index for index in pending if answers[index] is None]
+            self._count("cached", len(prompts) - len(pending))
+
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            results = executor.map(lambda batch: self._run_batch([prompts[i] for i in batch]), batches)
+            for batch, batch_answers in zip(batches, results):
+                for index, answer in zip(batch, batch_answers):
+                    answers[index] = answer
+                    if hasattr(self.llm, "store"):
+                        self.llm.store(prompts[index], self.temperature, answer)
+        return answers
@@ -0,0 +1,255 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+# Process-wide registry. Everything is a no-op until `enable()` is called, so
+# instrumented code only pays for one global lookup and a branch.
+_enabled = False
+_lock = threading.Lock()
+_counters = {} # (name, labels) -> value
+_observations = {} # (name, labels) -> [count, sum, max]
+_stages = {} # stage name -> accumulated span values
+
+_PROC_IO = "/proc/self/io"
+_METRIC_NAME = re.compile(r"[^a-zA-Z0-9_:]")
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _observations.clear()
+        _stages.clear()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+def count(name, amount=1, **labels):
+    """
+    Adds `amount` to a counter, e.g. count("llm_requests") or
+    count("http_requests", client="ah", status=200).
+    """
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, value, **labels):
+    """
+    Records one observation (e.g. a latency in seconds) into a count/sum/max summary.
+    """
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        summary = _observations.get(key)
+        if summary is None:
+            _observations[key] = [1, value, value]
+        else:
+            summary[0] += 1
+            summary[1] += value
+            summary[2] = max(summary[2], value)
+
+
+def _io_counters():
+    # Bytes passed to read/write syscalls by this process (Linux only)
+    try:
+        with open(_PROC_IO, "rb") as f:
+            fields = dict(line.split(b":") for line in f.read().splitlines())
+        return int(fields[b"rchar"]), int(fields[b"wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+class _Span:
+    """
+    Context manager timing one execution of a stage.
+
+    Set `items_in` / `items_out` inside the block; bytes read and written are
+    taken from /proc/self/io, which counts the whole process, so stages running
+    at the same time share their I/O.
+    """
+
+    __slots__ = ("name", "items_in", "items_out", "_start", "_cpu_start", "_io_start")
+
+    def __init__(self, name):
+        self.name = name
+        self.items_in = None
+        self.items_out = None
+
+    def __enter__(self):
+        self._io_start = _io_counters()
+        self._cpu_start = time.thread_time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._start
+        cpu = time.thread_time() - self._cpu_start
+        io_end = _io_counters() if self._io_start else None
+        with _lock:
+            stage = _stages.setdefault(self.name, {
+                "calls": 0, "errors": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                "items_in": 0, "items_out": 0, "bytes_read": 0, "bytes_written": 0,
+            })
+            stage["calls"] += 1
+            stage["errors"] += exc_type is not None
+            stage["wall_seconds"] += wall
+            stage["cpu_seconds"] += cpu
+            stage["items_in"] += self.items_in or 0
+            stage["items_out"] += self.items_out or 0
+            if io_end:
+                stage["bytes_read"] += io_end[0] - self._io_start[0]
+                stage["bytes_written"] += io_end[1] - self._io_start[1]
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def stage(name):
+    """
+    Returns a context manager measuring wall time, CPU time of the calling
+    thread, items in/out and bytes read/written for a stage.
+    """
+    return _Span(name) if _enabled else _NULL_SPAN
+
+
+def instrument_session(session, client):
+    """
+    Counts requests and records response latencies of a requests.Session,
+    labelled with `client` ("ah", "sendpulse", "llm", ...).
+    """
+    def record(response, *args, **kwargs):
+        if _enabled:
+            labels = {"client": client, "method": response.request.method, "status": response.status_code}
+            count("http_requests", **labels)
+            observe("http_request_seconds", response.elapsed.total_seconds(), client=client)
+        return response
+
+    session.hooks["response"].append(record)
+    return session
+
+
+def peak_rss_bytes():
+    """
+    Returns the peak resident set size of this process and of its finished
+    child processes (e.g. process pool workers), or None when unavailable.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+
+def report():
+    """
+    Returns everything recorded so far as a JSON-serialisable dict.
+    """
+    with _lock:
+        return {
+            "stages": {name: dict(values) for name, values in _stages.items()},
+            "counters": [dict(labels, name=name, value=value)
+                         for (name, labels), value in sorted(_counters.items(), key=str)],
+            "observations": [dict(labels, name=name, count=c, sum=s, max=m)
+                             for (name, labels), (c, s, m) in sorted(_observations.items(), key=str)],
+            "peak_rss_bytes": peak_rss_bytes(),
+        }
+
+
+def write_report(path):
+    """
+    Writes `report()` as JSON and returns it.
+    """
+    data = report()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    return data
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels) + "}"
+
+
+def prometheus_text(prefix="ah_"):
+    """
+    Returns the recorded metrics in the Prometheus text exposition format,
+    e.g. for node_exporter's textfile collector.
+    """
+    lines = []
+    with _lock:
+        for name, values in sorted(_stages.items()):
+            for field, value in values.items():
+                metric = f"{prefix}stage_{field}"
+                lines.append(f"{metric}{_prometheus_labels([('stage', name)])} {value}")
+        for (name, labels), value in sorted(_counters.items(), key=str):
+            lines.append(f"{prefix}{_METRIC_NAME.sub('_', name)}_total{_prometheus_labels(labels)} {value}")
+        for (name, labels), (c, s, m) in sorted(_observations.items(), key=str):
+            metric = f"{prefix}{_METRIC_NAME.sub('_', name)}"
+            lines.append(f"{metric}_count{_prometheus_labels(labels)} {c}")
+            lines.append(f"{metric}_sum{_prometheus_labels(labels)} {s}")
+            lines.append(f"{metric}_max{_prometheus_labels(labels)} {m}")
+    rss = peak_rss_bytes()
+    if rss:
+        for process, value in rss.items():
+            lines.append(f"{prefix}peak_rss_bytes{_prometheus_labels([('process', process)])} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path, prefix="ah_"):
+    """
+    Writes `prometheus_text()` atomically, as the textfile collector expects.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        f.write(prometheus_text(prefix))
+    os.replace(f"{path}.tmp", path)
@@ -1,41 +1,99 @@
 import requests
 import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-def get_token():
-    url = "https://api.ah.nl/mobile-auth/v1/auth/token/anonymous"
+from src import metrics
+from src.product_store import ProductStore
+from src.snapshot import save_snapshot, snapshot_path
+
+# Base URL of the AH mobile API. Can be pointed at a local stub server
+# (see benchmarks/stub_ah_server.py) through the AH_API_BASE environment variable.
+AH_API_BASE = os.environ.get("AH_API_BASE", "https://api.ah.nl")
+
+# HTTP statuses that are retried with exponential backoff
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+AH_HEADERS = {
+    "User-Agent": "Appie/8.22.3",
+    "X-Application": "AHWEBSHOP",
+    "X-Client-Name": "ah-web",
+    "X-Client-Version": "1.0.0",
+    "Accept": "application/json"
+}
+
+def create_session(pool_size=8, retries=3, backoff_factor=0.5):
+    """
+    Creates a requests session with a connection pool and retry/backoff policy.
+
+    Args:
+        pool_size (int): Maximum number of keep-alive connections kept per host.
+        retries (int): Number of retries for connection errors and retryable statuses.
+        backoff_factor (float): Base of the exponential backoff between retries
+                                (0.5 -> 0.5s, 1s, 2s, ...). Retry-After is honoured on 429.
+
+    Returns:
+        requests.Session: A session that reuses TCP/TLS connections across calls.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=None, # Also retry the token POST
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(AH_HEADERS)
+    return metrics.instrument_session(session, "ah")
+
+def get_token(session=None, base_url=AH_API_BASE):
+    url = f"{base_url}/mobile-auth/v1/auth/token/anonymous"
     body = {"clientId": "appie"}
-    headers = {
-        "User-Agent": "Appie/8.22.3",
-        "X-Application": "AHWEBSHOP",
-        "X-Client-Name": "ah-web",
-        "X-Client-Version": "1.0.0",
-        "Accept": "application/json"
-    }
-    response = requests.post(url, json=body, headers=headers)
+    http = session or requests
+    response = http.post(url, json=body, headers=AH_HEADERS)
     response.raise_for_status()
     return response.json()["access_token"]
 
-def fetch_bonus_items(token, page=0, size=100):
-    url = "https://api.ah.nl/mobile-services/product/search/v2"
+def fetch_bonus_page(token, page=0, size=100, session=None, base_url=AH_API_BASE, etag=None):
+    """
+    Fetches one page of the bonus search, optionally as a conditional request.
+
+    Args:
+        etag (str): Validator of a previous response for this page. When given it
+                    is sent as If-None-Match, and a 304 answer yields no products.
+
+    Returns:
+        tuple: (products, etag). products is None when the server answered
+               304 Not Modified; etag is the validator of the response, if any.
+    """
+    url = f"{base_url}/mobile-services/product/search/v2"
     params = {
         "bonus": "ANY",
         "availableOnline": "true",
         "page": page,
         "size": size
     }
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "User-Agent": "Appie/8.22.3",
-        "X-Application": "AHWEBSHOP",
-        "X-Client-Name": "ah-web",
-        "X-Client-Version": "1.0.0",
-        "Accept": "application/json"
-    }
-    response = requests.get(url, params=params, headers=headers)
+    headers = dict(AH_HEADERS, Authorization=f"Bearer {token}")
+    if etag:
+        headers["If-None-Match"] = etag
+    http = session or requests
+    response = http.get(url, params=params, headers=headers)
+    if response.status_code == 304:
+        return None, etag
     response.raise_for_status()
     data = response.json()
-    return data.get("products", [])
+    return data.get("products", []), response.headers.get("ETag")
+
+def fetch_bonus_items(token, page=0, size=100, session=None, base_url=AH_API_BASE):
+    products, _ = fetch_bonus_page(token, page, size, session, base_url)
+    return products
 
 def save_as_json(data, filename="bonus_items.json"):
     os.makedirs("output", exist_ok=True)
@@ -43,21 +101,115 @@ def save_as_json(data, filename="bonus_items.json"):
         json.dump(data, f, ensure_ascii=False, indent=2)
     print(f"✅ Saved {len(data)} items to output/{filename}")
 
-def get_all_bonus_items():
-    token = get_token()
-    all_products = []
-    page = 0
-    size = 100  # max items per request
-    max_pages = 20  # limit pagination
+def _fetch_pages_sequentially(fetch_page, max_pages):
+    """
+    Fetches pages one after another until the first empty page.
 
-    while page < max_pages:
+    Args:
+        fetch_page (callable): Called with a page number, returns that page's products.
+
+    Returns:
+        list: Products of all pages before the first empty page, in page order.
+    """
+    all_products = []
+    for page in range(max_pages):
         print(f"Fetching page {page}...")
-        products = fetch_bonus_items(token, page=page, size=size)
+        products = fetch_page(page)
         if not products:
             break
         all_products.extend(products)
-        page += 1
+    return all_products
+
+def _fetch_pages_concurrently(fetch_page, max_pages, max_workers):
+    """
+    Fetches pages with at most `max_workers` requests in flight. New pages are
+    only scheduled while no empty page has been seen, so the fetch stops shortly
+    after the end of the catalogue without over-requesting.
+
+    Args:
+        fetch_page (callable): Called with a page number, returns that page's products.
+
+    Returns:
+        list: Products of all pages before the first empty page, in page order.
+    """
+    pages = {}
+    first_empty = max_pages
+    next_page = 0
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while in_flight or (next_page < first_empty):
+            while next_page < first_empty and len(in_flight) < max_workers:
+                print(f"Fetching page {next_page}...")
+                future = executor.submit(fetch_page, next_page)
+                in_flight[future] = next_page
+                next_page += 1
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                page = in_flight.pop(future)
+                products = future.result()
+                if not products:
+                    first_empty = min(first_empty, page)
+                else:
+                    pages[page] = products
+
+            # Pages scheduled past the end are not needed anymore
+            for future, page in list(in_flight.items()):
+                if page > first_empty and future.cancel():
+                    del in_flight[future]
+
+    all_products = []
+    for page in range(first_empty):
+        if page not in pages:
+            break
+        all_products.extend(pages[page])
+    return all_products
+
+def fetch_pages(fetch_page, concurrent=False, max_workers=4, max_pages=20):
+    """
+    Runs `fetch_page` over the catalogue pages, sequentially or over a bounded
+    thread pool, stopping at the first empty page.
+    """
+    if concurrent:
+        return _fetch_pages_concurrently(fetch_page, max_pages, max_workers)
+    return _fetch_pages_sequentially(fetch_page, max_pages)
+
+def get_all_bonus_items(concurrent=False, max_workers=4, base_url=AH_API_BASE, session=None):
+    """
+    Downloads the full bonus catalogue page by page.
+
+    Args:
+        concurrent (bool): Fetch pages in parallel over a shared connection pool
+                           instead of strictly one after another.
+        max_workers (int): Maximum number of page requests in flight in concurrent mode.
+        base_url (str): Base URL of the AH API (or a local stub server).
+        session (requests.Session): Optional session to reuse; a pooled session
+                                    with retries is created when omitted.
+
+    Returns:
+        list: All products across the fetched pages.
+    """
+    size = 100  # max items per request
+    max_pages = 20  # limit pagination
+    start = time.perf_counter()
+
+    own_session = session is None
+    if own_session:
+        session = create_session(pool_size=max(max_workers, 1))
+
+    try:
+        token = get_token(session=session, base_url=base_url)
+
+        all_products = fetch_pages(
+            lambda page: fetch_bonus_items(token, page, size, session, base_url),
+            concurrent=concurrent, max_workers=max_workers, max_pages=max_pages
+        )
+    finally:
+        if own_session:
+            session.close()
 
+    print(f"Fetched {len(all_products)} products in {time.perf_counter() - start:.2f}s")
     return all_products
 
 def filter_bonus_products(products):
@@ -65,9 +217,12 @@ def filter_bonus_products(products):
     return [p for p in products if p.get("isBonus")]
 
 def main():
-    all_items = get_all_bonus_items()
+    all_items = get_all_bonus_items(concurrent=True)
     bonus_items = filter_bonus_products(all_items)
     save_as_json(bonus_items)
+    # Binary snapshot for later stages, see src/snapshot.py
+    path = save_snapshot(ProductStore(bonus_items), snapshot_path())
+    print(f"✅ Saved snapshot to {path}")
 
 if __name__ == "__main__":
     main()
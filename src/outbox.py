@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+
+# Default location of the outbox database
+DEFAULT_OUTBOX_PATH = os.path.join("data", "outbox", "outbox.sqlite")
+
+
+def idempotency_key(recipient, day, campaign="digest", part=1):
+    """
+    Returns the key identifying one message: a recipient gets at most one
+    message per campaign, day and part (page of a split digest).
+    """
+    key = f"{campaign}:{day}:{recipient.strip().lower()}"
+    return key if part == 1 else f"{key}:{part}"
+
+
+class Outbox:
+    """
+    Durable SQLite queue between digest generation and email dispatch.
+
+    Messages are enqueued under an idempotency key, so enqueueing the same
+    run twice adds nothing and recipients already sent to are never queued
+    again. Senders claim batches under a lease: a claim marks the rows
+    in flight until `lease_seconds` have passed, and rows of a sender that
+    crashed become claimable again once their lease expires. Claims are
+    atomic, so several processes or threads can drain one outbox. Only the
+    messages of one day are claimed: their HTML files are rewritten daily, so
+    a message left pending from an earlier day is never sent with later content.
+
+    Delivery is at least once: a message whose sender died after the API
+    accepted it but before it was marked sent is sent again after the lease.
+
+    Args:
+        path (str): SQLite file, created when missing.
+        lease_seconds (float): How long a claimed batch stays reserved.
+        max_attempts (int): Failed sends before a message is given up on.
+    """
+
+    def __init__(self, path=DEFAULT_OUTBOX_PATH, lease_seconds=300, max_attempts=3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " key TEXT PRIMARY KEY, recipient TEXT NOT NULL, day TEXT NOT NULL,"
+            " message TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0, lease_owner TEXT, lease_expires REAL,"
+            " provider_id TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS messages_status ON messages (status, lease_expires)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS messages_day ON messages (day, status)")
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent claims serialise
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds an outbox from the `outbox` section of config.yml.
+        """
+        settings = config.get("outbox", {})
+        return cls(
+            path=settings.get("path", DEFAULT_OUTBOX_PATH),
+            lease_seconds=settings.get("lease_seconds", 300),
+            max_attempts=settings.get("max_attempts", 3),
+        )
+
+    def enqueue(self, messages, day=None, campaign="digest"):
+        """
+        Queues dispatcher messages (see src/email_dispatch.py) for `day`.
+
+        Returns:
+            int: Number of messages newly queued; duplicates are ignored.
+        """
+        day = day or date.today().isoformat()
+        now = time.time()
+        rows = [(idempotency_key(m["to"], day, campaign, m.get("part", 1)), m["to"], day, json.dumps(m), now, now)
+                for m in messages]
+        with self._transaction() as connection:
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT OR IGNORE INTO messages (key, recipient, day, message, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            return connection.total_changes - before
+
+    def claim(self, batch_size=100, worker_id=None, day=None):
+        """
+        Reserves up to `batch_size` pending messages of `day` (today by
+        default), including in-flight ones whose lease has expired.
+
+        Returns:
+            list: (key, message) tuples.
+        """
+        worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        day = day or date.today().isoformat()
+        now = time.time()
+        with self._transaction() as connection:
+            rows = connection.execute(
+                "SELECT key, message FROM messages"
+                " WHERE day = ? AND (status = 'pending' OR (status = 'in_flight' AND lease_expires < ?))"
+                " ORDER BY created_at, key LIMIT ?", (day, now, batch_size)
+            ).fetchall()
+            connection.executemany(
+                "UPDATE messages SET status = 'in_flight', lease_owner = ?, lease_expires = ?,"
+                " updated_at = ? WHERE key = ?",
+                [(worker_id, now + self.lease_seconds, now, key) for key, _ in rows]
+            )
+        return [(key, json.loads(message)) for key, message in rows]
+
+    def complete(self, keys, results):
+        """
+        Records dispatcher results for claimed keys. Failed messages go back
+        to pending until they have failed `max_attempts` times.
+        """
+        now = time.time()
+        sent, failed = [], []
+        for key, result in zip(keys, results):
+            if result["status"] == "sent":
+                sent.append((result.get("id"), now, key))
+            else:
+                failed.append((self.max_attempts, result.get("error"), now, key))
+        with self._transaction() as connection:
+            connection.executemany(
+                "UPDATE messages SET status = 'sent', provider_id = ?, error = NULL, lease_owner = NULL,"
+                " lease_expires = NULL, attempts = attempts + 1, updated_at = ? WHERE key = ?", sent
+            )
+            # A message sent meanwhile by a sender that took over an expired lease stays sent
+            connection.executemany(
+                "UPDATE messages SET attempts = attempts + 1,"
+                " status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END,"
+                " error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?"
+                " WHERE key = ? AND status = 'in_flight'", failed
+            )
+
+    def drain(self, dispatcher, batch_size=100, worker_id=None, day=None):
+        """
+        Claims and sends batches of `day` (today by default) until nothing
+        claimable is left.
+
+        Returns:
+            dict: {"sent", "failed"} counts of this call's send results.
+        """
+        summary = {"sent": 0, "failed": 0}
+        while True:
+            batch = self.claim(batch_size, worker_id, day)
+            if not batch:
+                return summary
+            keys = [key for key, _ in batch]
+            try:
+                results = dispatcher.send_many([message for _, message in batch])
+            except Exception as e:
+                # Without results nothing of the batch is known to be sent; count it as
+                # a failed attempt rather than leaving it in flight until the lease expires
+                logging.error(f"Dispatching a batch of {len(batch)} messages failed: {e}")
+                results = [{"status": "failed", "error": f"{type(e).__name__}: {e}"} for _ in batch]
+            self.complete(keys, results)
+            for result in results:
+                summary["sent" if result["status"] == "sent" else "failed"] += 1
+
+    def retry_failed(self, day=None):
+        """
+        Moves messages that exhausted their attempts back to pending.
+
+        Returns:
+            int: Number of messages requeued.
+        """
+        query = "UPDATE messages SET status = 'pending', attempts = 0 WHERE status = 'failed'"
+        with self.lock:
+            if day is None:
+                return self.connection.execute(query).rowcount
+            return self.connection.execute(query + " AND day = ?", (day,)).rowcount
+
+    def counts(self, day=None):
+        """
+        Returns {status: number of messages}, optionally for one day.
+        """
+        with self.lock:
+            if day is None:
+                rows = self.connection.execute("SELECT status, COUNT(*) FROM messages GROUP BY status")
+            else:
+                rows = self.connection.execute(
+                    "SELECT status, COUNT(*) FROM messages WHERE day = ? GROUP BY status", (day,))
+            return dict(rows.fetchall())
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,229 @@
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from functools import lru_cache
+
+from src.stream_json import iter_json_items
+
+# Output formats of the partition writer and the file extension each one uses:
+#   pretty  - indented JSON list of products (the historic layout)
+#   compact - minified JSON list of products
+#   jsonl   - one minified product per line
+#   ids     - JSON list of webshopIds pointing into one shared product store
+PARTITION_FORMATS = {
+    "pretty": ".json",
+    "compact": ".json",
+    "jsonl": ".jsonl",
+    "ids": ".ids.json",
+}
+
+# Shared product store written next to "ids" partitions
+PRODUCT_STORE_FILENAME = "_products.jsonl"
+
+# Mode of written files; mkstemp creates its temporary files readable by the owner only
+FILE_MODE = 0o644
+
+
+def write_atomic(path, write):
+    """
+    Writes a file through a temporary file in the same directory and renames it
+    into place, so readers never see a half-written partition.
+
+    Args:
+        path (str): Final file path.
+        write (callable): Called with the open text file to produce the content.
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=os.path.basename(path))
+    try:
+        os.chmod(tmp_path, FILE_MODE)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _encode_element(product, output_format):
+    # One product as it appears inside its partition file; joined with
+    # _LIST_SYNTAX the result matches json.dump of the partition's list
+    # (indent=4 for "pretty", minified otherwise)
+    if output_format == "pretty":
+        return "    " + json.dumps(product, indent=4, ensure_ascii=False).replace("\n", "\n    ")
+    if output_format == "ids":
+        return json.dumps(product.get("webshopId"))
+    return json.dumps(product, ensure_ascii=False, separators=(",", ":"))
+
+
+# (opening, separator, closing) of each format's file
+_LIST_SYNTAX = {
+    "pretty": ("[\n", ",\n", "\n]"),
+    "compact": ("[", ",", "]"),
+    "jsonl": ("", "", ""),
+    "ids": ("[", ",", "]"),
+}
+
+
+class PartitionStreamWriter:
+    """
+    Appends products to partition files while they are being read, so a
+    catalogue is split without holding it in memory.
+
+    Each partition is written to a temporary file in the output directory and
+    renamed into place by `close`, so readers never see a half-written file.
+    At most `max_open_files` files are kept open; others are reopened for
+    appending when they receive their next product.
+
+    Args:
+        output_directory (str): Directory receiving the files.
+        output_format (str): One of PARTITION_FORMATS.
+        max_open_files (int): Partition files kept open at once.
+    """
+
+    def __init__(self, output_directory, output_format="pretty", max_open_files=64):
+        if output_format not in PARTITION_FORMATS:
+            raise ValueError(f"Unknown partition format '{output_format}'. Use one of {list(PARTITION_FORMATS)}.")
+        os.makedirs(output_directory, exist_ok=True)
+        self.output_directory = output_directory
+        self.output_format = output_format
+        self.max_open_files = max(max_open_files, 1)
+        self.partitions = {} # name -> {"path", "tmp_path", "count", "error"}
+        self.open_files = OrderedDict() # name -> file, least recently used first
+        self.store = None
+        if output_format == "ids":
+            store_path = os.path.join(output_directory, PRODUCT_STORE_FILENAME)
+            self.store = self._create(store_path)
+            self.store["file"] = open(self.store["tmp_path"], "w", encoding="utf-8")
+
+    def _create(self, path):
+        fd, tmp_path = tempfile.mkstemp(dir=self.output_directory, prefix=".tmp_", suffix=os.path.basename(path))
+        os.close(fd)
+        os.chmod(tmp_path, FILE_MODE)
+        return {"path": path, "tmp_path": tmp_path, "count": 0, "error": None}
+
+    def _file(self, name):
+        f = self.open_files.pop(name, None)
+        if f is None:
+            if len(self.open_files) >= self.max_open_files:
+                self.open_files.popitem(last=False)[1].close()
+            f = open(self.partitions[name]["tmp_path"], "a", encoding="utf-8")
+        self.open_files[name] = f
+        return f
+
+    def write(self, product, names):
+        """
+        Appends one product to every named partition, creating partitions on
+        first use. The product is encoded once for all of them.
+        """
+        if self.store is not None:
+            self.store["file"].write(_encode_element(product, "jsonl") + "\n")
+        element = _encode_element(product, self.output_format)
+        opening, separator, _ = _LIST_SYNTAX[self.output_format]
+        for name in names:
+            partition = self.partitions.get(name)
+            if partition is None:
+                partition = self.partitions[name] = self._create(
+                    os.path.join(self.output_directory, name + PARTITION_FORMATS[self.output_format]))
+            if partition["error"] is not None:
+                continue
+            try:
+                f = self._file(name)
+                f.write(separator if partition["count"] else opening)
+                f.write(element)
+                if self.output_format == "jsonl":
+                    f.write("\n")
+                partition["count"] += 1
+            except OSError as e:
+                partition["error"] = e
+
+    def close(self):
+        """
+        Completes all partition files and renames them into place.
+
+        Returns:
+            dict: {file path: number of items written}. Files that failed are
+                  reported with the exception instead of a count.
+        """
+        for f in self.open_files.values():
+            f.close()
+        self.open_files.clear()
+        if self.store is not None:
+            self.store.pop("file").close()
+            os.replace(self.store["tmp_path"], self.store["path"])
+
+        closing = _LIST_SYNTAX[self.output_format][2]
+        results = {}
+        for partition in self.partitions.values():
+            if partition["error"] is not None:
+                _remove(partition["tmp_path"])
+                results[partition["path"]] = partition["error"]
+                continue
+            try:
+                with open(partition["tmp_path"], "a", encoding="utf-8") as f:
+                    f.write(closing)
+                os.replace(partition["tmp_path"], partition["path"])
+                results[partition["path"]] = partition["count"]
+            except OSError as e:
+                _remove(partition["tmp_path"])
+                results[partition["path"]] = e
+        self.partitions.clear()
+        return results
+
+    def abort(self):
+        """
+        Removes all temporary files, leaving existing partition files untouched.
+        """
+        for f in self.open_files.values():
+            f.close()
+        self.open_files.clear()
+        if self.store is not None:
+            self.store.pop("file").close()
+            _remove(self.store["tmp_path"])
+            self.store = None
+        for partition in self.partitions.values():
+            _remove(partition["tmp_path"])
+        self.partitions.clear()
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+@lru_cache(maxsize=4)
+def _load_product_store(store_path, mtime):
+    products = {}
+    with open(store_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                product = json.loads(line)
+                products[product.get("webshopId")] = product
+    return products
+
+
+def read_partition(path):
+    """
+    Reads a partition file written in any of the PARTITION_FORMATS.
+
+    "ids" partitions are resolved against the shared product store in the same
+    directory, which is loaded once and cached while it is unchanged. JSON list
+    partitions are streamed with `iter_json_items`.
+
+    Yields:
+        dict: The products of the partition, one at a time.
+    """
+    if path.endswith(PARTITION_FORMATS["ids"]):
+        with open(path, "r", encoding="utf-8") as f:
+            ids = json.load(f)
+        store_path = os.path.join(os.path.dirname(path), PRODUCT_STORE_FILENAME)
+        store = _load_product_store(store_path, os.path.getmtime(store_path))
+        yield from (store[i] for i in ids if i in store)
+    elif path.endswith(PARTITION_FORMATS["jsonl"]):
+        with open(path, "r", encoding="utf-8") as f:
+            yield from (json.loads(line) for line in f if line.strip())
+    else:
+        yield from iter_json_items(path)
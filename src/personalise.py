@@ -0,0 +1,155 @@
+import json
+import math
+import os
+import re
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from src.bonus_mechanism import compute_savings, rank_by_savings
+from src.json_to_html import MAX_EMAIL_BYTES, iter_email_pages
+from src.snapshot import open_snapshot
+
+# Where per-subscriber digests are written
+DIGEST_DIR = os.path.join("data", "html", "digests")
+
+# mainCategory values left out for a diet preference
+DIET_EXCLUDED_CATEGORIES = {
+    "vegetarian": ["Vlees", "Vleeswaren", "Vis"],
+    "pescatarian": ["Vlees", "Vleeswaren"],
+    "vegan": ["Vlees", "Vleeswaren", "Vis", "Zuivel, eieren", "Kaas"],
+    "alcohol_free": ["Bier, wijn, aperitieven"],
+}
+
+# Defaults for preferences a subscriber leaves out
+DEFAULT_PREFERENCES = {
+    "categories": None, # list of mainCategory values, None for all
+    "exclude_categories": [],
+    "diet": None,
+    "max_price": None,
+    "max_nutriscore": None,
+    "min_discount": None,
+    "max_items": 25,
+}
+
+
+def load_subscribers(path):
+    """
+    Loads subscribers from a JSON list of {"email", "name", **preferences}.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        subscribers = json.load(f)
+    return [dict(DEFAULT_PREFERENCES, **subscriber) for subscriber in subscribers]
+
+
+class DigestPlanner:
+    """
+    Shared, per-run state for personalising digests.
+
+    Savings and the global ranking are computed once per catalogue; every
+    subscriber's selection then only combines index lookups and column
+    filters of the shared ProductStore.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        _, self.discounts = compute_savings(store)
+        self.rank = array("I", bytes(4 * len(store)))
+        for rank, position in enumerate(rank_by_savings(store)):
+            self.rank[position] = rank
+
+    def select(self, preferences):
+        """
+        Returns the store positions of a subscriber's digest, best saving first.
+        """
+        store = self.store
+        positions = store.query(
+            category=preferences.get("categories"),
+            max_price=preferences.get("max_price"),
+            max_nutriscore=preferences.get("max_nutriscore"),
+        )
+        excluded = list(preferences.get("exclude_categories") or [])
+        excluded.extend(DIET_EXCLUDED_CATEGORIES.get(preferences.get("diet"), []))
+        if excluded:
+            index = store.indexes["mainCategory"]
+            skip = {p for category in excluded for p in index.get(category, ())}
+            positions = [p for p in positions if p not in skip]
+        min_discount = preferences.get("min_discount")
+        if min_discount is not None:
+            discounts = self.discounts
+            positions = [p for p in positions if not math.isnan(discounts[p]) and discounts[p] >= min_discount]
+        rank = self.rank
+        return sorted(positions, key=rank.__getitem__)[:preferences.get("max_items") or None]
+
+
+def digest_filename(email, page=1):
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", email)
+    return f"{name}.html" if page == 1 else f"{name}.{page}.html"
+
+
+_worker_products = None
+
+
+def _init_worker(snapshot_path, products):
+    # Workers map the shared snapshot instead of receiving the catalogue
+    global _worker_products
+    _worker_products = open_snapshot(snapshot_path).products if snapshot_path else products
+
+
+def _render_digest(task):
+    # One file per page, so every email stays under max_bytes and is built in memory page by page
+    output_directory, email, positions, max_bytes = task
+    paths, size = [], 0
+    pages = iter_email_pages((_worker_products[p] for p in positions), max_bytes)
+    for page_number, page in enumerate(pages, 1):
+        path = os.path.join(output_directory, digest_filename(email, page_number))
+        data = page.encode("utf-8")
+        fd, tmp_path = tempfile.mkstemp(dir=output_directory, prefix=".tmp_")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        paths.append(path)
+        size += len(data)
+    return paths, size
+
+
+def generate_digests(store, subscribers, output_directory=DIGEST_DIR, snapshot_path=None, max_workers=None,
+                     max_bytes=MAX_EMAIL_BYTES):
+    """
+    Selects and renders a personalised digest for every subscriber.
+
+    Selection runs in this process against the shared planner; rendering is
+    spread over a process pool. With `snapshot_path` the workers open the
+    catalogue snapshot (src/snapshot.py) and share its pages, otherwise the
+    product list is sent to each worker once. A digest larger than
+    `max_bytes` is split into several pages (see iter_email_pages), each
+    sent as its own email.
+
+    Args:
+        store (ProductStore): Catalogue shared by all subscribers.
+        subscribers (list): Subscriber dicts as returned by load_subscribers.
+        output_directory (str): Directory receiving the HTML pages of each subscriber.
+        snapshot_path (str): Snapshot of `store` for the workers to map.
+        max_workers (int): Size of the process pool, defaults to the CPU count.
+        max_bytes (int): Size limit of one page, in UTF-8 bytes.
+
+    Returns:
+        list: {"email", "paths", "items", "bytes"} per subscriber, in input order;
+              "paths" holds the pages, in order.
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    planner = DigestPlanner(store)
+    tasks = []
+    for subscriber in subscribers:
+        positions = planner.select(subscriber)
+        tasks.append((output_directory, subscriber["email"], positions, max_bytes))
+
+    products = None if snapshot_path else list(store.products)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(snapshot_path, products)) as executor:
+        rendered = list(executor.map(_render_digest, tasks, chunksize=max(1, len(tasks) // 64)))
+
+    return [
+        {"email": subscriber["email"], "paths": paths, "items": len(positions), "bytes": size}
+        for subscriber, (_, _, positions, _), (paths, size) in zip(subscribers, tasks, rendered)
+    ]
@@ -0,0 +1,286 @@
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pickle
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from src import metrics
+
+# Where stage outputs and run reports are kept
+DEFAULT_PIPELINE_DIR = os.path.join("data", "pipeline")
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _source_hash(func):
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = f"{func.__module__}.{func.__qualname__}"
+    return _sha256(source.encode("utf-8"))
+
+
+def _size(value):
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+def _file_hash(path):
+    try:
+        with open(path, "rb") as f:
+            return _sha256(f.read())
+    except FileNotFoundError:
+        return None
+
+
+class Stage:
+    """
+    One node of a Pipeline.
+
+    The stage function is called as `func(config, **inputs)`, with one keyword
+    argument per upstream stage holding that stage's output.
+
+    Args:
+        name (str): Unique stage name, also the keyword downstream stages receive.
+        func (callable): Computes the output; it must be picklable to be cached.
+        inputs (tuple): Names of the stages whose outputs this stage consumes.
+        config_keys (tuple): Top-level config.yml sections the stage depends on.
+        files (tuple): Files (templates, source modules, ...) the stage depends on.
+        fingerprint (callable): Returns extra state to key on, e.g. the date for
+                                a fetch that must run once per day.
+        cache (bool or callable): False for stages with side effects that must
+                                  always run. A callable receives the output and
+                                  returns whether it may be reused, e.g. not when
+                                  it is incomplete; unstored outputs still keep
+                                  dependants cached while they are unchanged.
+        after (tuple): Stages that must finish first although their output is
+                       not used, e.g. to keep two stages off a shared resource.
+    """
+
+    def __init__(self, name, func, inputs=(), config_keys=(), files=(), fingerprint=None, cache=True, after=()):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.after = tuple(after)
+        self.config_keys = tuple(config_keys)
+        self.files = tuple(files)
+        self.fingerprint = fingerprint
+        self.cache = cache
+
+    def key(self, config, input_digests):
+        """
+        Returns the content address of this stage's output: a hash of its code,
+        config sections, files, fingerprint and the digests of its inputs.
+        """
+        parts = {
+            "stage": self.name,
+            "code": _source_hash(self.func),
+            "config": {k: config.get(k) for k in self.config_keys},
+            "files": {path: _file_hash(path) for path in self.files},
+            "fingerprint": self.fingerprint() if self.fingerprint else None,
+            "inputs": input_digests,
+        }
+        return _sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8"))
+
+
+class Pipeline:
+    """
+    Runs stages as a DAG with content-addressed output caching.
+
+    A stage's output is pickled under its key, which hashes the stage's code,
+    config and files together with the digests of its inputs' outputs. On a
+    rerun a stage whose key already has an output is skipped, so e.g. a template
+    change re-renders the email without refetching or re-prompting, and a
+    refetch that returns the same catalogue leaves everything downstream
+    cached. Inputs of a cached stage are only unpickled if a downstream stage
+    actually runs.
+
+    Stages whose inputs are ready run concurrently on a thread pool (I/O-bound
+    stages such as the LLM overlap with CPU-bound ones). A failed stage only
+    skips its dependants; completed stages stay cached, so the next run resumes
+    from the failure.
+
+    Args:
+        stages (list): Stage objects.
+        config (dict): Parsed config.yml.
+        directory (str): Root of the stage cache and run reports.
+        max_workers (int): Stages run at once.
+    """
+
+    def __init__(self, stages, config, directory=DEFAULT_PIPELINE_DIR, max_workers=4):
+        self.stages = {stage.name: stage for stage in stages}
+        for stage in stages:
+            missing = [name for name in stage.inputs + stage.after if name not in self.stages]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stages {missing}.")
+        self.config = config
+        self.directory = directory
+        self.max_workers = max_workers
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        state = {}
+
+        def visit(name, path):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Pipeline has a cycle: {' -> '.join(path + [name])}")
+            state[name] = "visiting"
+            for dependency in self.stages[name].inputs + self.stages[name].after:
+                visit(dependency, path + [name])
+            state[name] = "done"
+
+        for name in self.stages:
+            visit(name, [])
+
+    def _required(self, targets):
+        required = set()
+        pending = list(targets or self.stages)
+        while pending:
+            name = pending.pop()
+            if name not in required:
+                required.add(name)
+                pending.extend(self.stages[name].inputs + self.stages[name].after)
+        return required
+
+    def _paths(self, stage_name, key):
+        base = os.path.join(self.directory, stage_name, key)
+        return f"{base}.pkl", f"{base}.json"
+
+    def _load(self, result):
+        if "value" not in result:
+            with open(result["path"], "rb") as f:
+                result["value"] = pickle.load(f)
+        return result["value"]
+
+    def _store(self, stage_name, key, value, seconds, keep=True):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        digest = _sha256(data)
+        if not keep:
+            return digest, None
+        output_path, meta_path = self._paths(stage_name, key)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        for path, payload in ((output_path, data),
+                              (meta_path, json.dumps({"digest": digest, "seconds": seconds}).encode("utf-8"))):
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_")
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        return digest, output_path
+
+    def _execute(self, stage, results, force):
+        """
+        Runs (or reuses) one stage whose inputs have completed.
+        """
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        input_digests = {name: results[name]["digest"] for name in stage.inputs}
+        key = stage.key(self.config, input_digests)
+        output_path, meta_path = self._paths(stage.name, key)
+        if stage.cache is not False and stage.name not in force and os.path.exists(meta_path) \
+                and os.path.exists(output_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            return {"status": "cached", "key": key, "digest": meta["digest"], "path": output_path,
+                    "seconds": time.perf_counter() - start, "original_seconds": meta["seconds"]}
+
+        with metrics.stage(stage.name) as span:
+            inputs = {name: self._load(results[name]) for name in stage.inputs}
+            span.items_in = sum(_size(v) or 0 for v in inputs.values())
+            value = stage.func(self.config, **inputs)
+            span.items_out = _size(value)
+        seconds = time.perf_counter() - start
+        result = {"status": "ran", "key": key, "value": value, "seconds": seconds,
+                  "cpu_seconds": time.process_time() - cpu_start}
+        if callable(stage.cache):
+            result["digest"], result["path"] = self._store(stage.name, key, value, seconds,
+                                                           keep=stage.cache(value))
+        elif stage.cache:
+            result["digest"], result["path"] = self._store(stage.name, key, value, seconds)
+        else:
+            # Uncached outputs are keyed by a fresh digest so dependants always rerun
+            result["digest"] = _sha256(f"{key}:{time.time_ns()}".encode("utf-8"))
+        return result
+
+    def run(self, targets=None, force=()):
+        """
+        Runs the stages needed for `targets` (all stages by default).
+
+        Args:
+            targets (list): Stage names to produce; their dependencies run too.
+            force (iterable): Stage names to rerun even when cached.
+
+        Returns:
+            dict: {"stages": {name: {"status", "seconds", "key", ...}}, "seconds",
+                   "failed": [...], "report": path of the JSON run report}, plus
+                  "metrics" (src/metrics.py) when metrics are enabled. Outputs
+                  of the run are available through `output(name)`.
+
+        Raises:
+            ValueError: If a target or forced stage does not exist.
+        """
+        force = set(force)
+        unknown = sorted(set(targets or ()) - set(self.stages)) + sorted(force - set(self.stages))
+        if unknown:
+            raise ValueError(f"Unknown stages {unknown}. Known stages: {list(self.stages)}.")
+        required = self._required(targets)
+        results, failed, skipped = {}, [], []
+        running = {}
+        run_start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                done = set(results) | set(failed) | set(skipped)
+                for name in sorted(required - done - set(running.values())):
+                    stage = self.stages[name]
+                    dependencies = stage.inputs + stage.after
+                    if any(dependency in failed or dependency in skipped for dependency in dependencies):
+                        skipped.append(name)
+                        logging.warning(f"Stage '{name}' skipped: an input stage failed.")
+                    elif all(dependency in results for dependency in dependencies):
+                        running[executor.submit(self._execute, stage, results, force)] = name
+                if not running:
+                    if required - set(results) - set(failed) - set(skipped):
+                        continue
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                        logging.info(f"Stage '{name}' {results[name]['status']} in {results[name]['seconds']:.2f}s")
+                    except Exception as e:
+                        failed.append(name)
+                        logging.error(f"Stage '{name}' failed: {e}")
+
+        self.results = results
+        stages = {name: {k: v for k, v in result.items() if k not in ("value", "path")}
+                  for name, result in results.items()}
+        stages.update({name: {"status": "failed"} for name in failed})
+        stages.update({name: {"status": "skipped"} for name in skipped})
+        report = {"started": datetime.now().isoformat(timespec="seconds"),
+                  "seconds": time.perf_counter() - run_start, "failed": failed, "stages": stages}
+        if metrics.is_enabled():
+            report["metrics"] = metrics.report()
+        report_path = os.path.join(self.directory, "runs", f"{datetime.now():%Y%m%d_%H%M%S}.json")
+        os.makedirs(os.path.dirname(report_path), exist_ok=True)
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        report["report"] = report_path
+        return report
+
+    def output(self, name):
+        """
+        Returns the output of a stage from the last run, loading it if it was cached.
+        """
+        return self._load(self.results[name])
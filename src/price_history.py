@@ -0,0 +1,454 @@
+import json
+import math
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from datetime import date
+from itertools import accumulate
+
+from src.bonus_mechanism import compute_savings
+from src.product_store import ProductStore
+
+# Where the weekly segments are kept
+DEFAULT_HISTORY_DIR = os.path.join("data", "price_history")
+
+# Block header: magic, kind, day ordinal, rows, removed ids, compressed payload bytes
+_HEADER = struct.Struct("<4sBiIII")
+_MAGIC = b"AHPH"
+_FULL, _DELTA = 0, 1
+
+# Prices are stored in cents; -1 when unknown
+MISSING_CENTS = -1
+
+
+def _cents(value):
+    return MISSING_CENTS if value is None or math.isnan(value) else round(value * 100)
+
+
+def _euros(cents):
+    return cents / 100 if cents != MISSING_CENTS else math.nan
+
+
+def _little_endian(column):
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column
+
+
+def segment_name(day):
+    """
+    Returns the file name of the ISO week partition holding `day`, e.g. "2025-W27.seg".
+    """
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}.seg"
+
+
+def _week_end(name):
+    # Day ordinal of the Sunday of a segment's ISO week
+    year, week = name[:-len(".seg")].split("-W")
+    return date.fromisocalendar(int(year), int(week), 7).toordinal()
+
+
+def _encode_block(kind, day, rows, removed):
+    ids = sorted(rows)
+    columns = [
+        array("q", (b - a for a, b in zip([0] + ids, ids))), # delta-encoded webshopIds
+        array("i", (rows[i][0] for i in ids)),
+        array("i", (rows[i][1] for i in ids)),
+    ]
+    mechanisms = {}
+    columns.append(array("H", (mechanisms.setdefault(rows[i][2], len(mechanisms)) for i in ids)))
+    columns.append(array("q", (b - a for a, b in zip([0] + removed, removed))))
+    payload = b"".join(_little_endian(c).tobytes() for c in columns)
+    payload += json.dumps(list(mechanisms), ensure_ascii=False).encode("utf-8")
+    payload = zlib.compress(payload, 6)
+    return _HEADER.pack(_MAGIC, kind, day, len(ids), len(removed), len(payload)) + payload
+
+
+def _decode_block(rows, removed, payload):
+    payload = zlib.decompress(payload)
+    offset = 0
+    columns = []
+    for typecode, count in (("q", rows), ("i", rows), ("i", rows), ("H", rows), ("q", removed)):
+        column = array(typecode)
+        size = column.itemsize * count
+        column.frombytes(payload[offset:offset + size])
+        columns.append(_little_endian(column))
+        offset += size
+    ids, before, paid, codes, removed_ids = columns
+    mechanisms = json.loads(payload[offset:].decode("utf-8"))
+    changed = {webshop_id: (b, p, mechanisms[c]) for webshop_id, b, p, c in zip(accumulate(ids), before, paid, codes)}
+    return changed, list(accumulate(removed_ids))
+
+
+def _read_segment(path):
+    """
+    Returns ([(kind, day, changed, removed), ...], end of the last complete block).
+
+    A block cut short by a crash during an append is ignored; the next
+    append truncates it away.
+    """
+    blocks, offset = [], 0
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return blocks, offset
+    while offset + _HEADER.size <= len(data):
+        magic, kind, day, rows, removed, size = _HEADER.unpack_from(data, offset)
+        end = offset + _HEADER.size + size
+        if magic != _MAGIC or end > len(data):
+            break
+        changed, removed_ids = _decode_block(rows, removed, data[offset + _HEADER.size:end])
+        blocks.append((kind, day, changed, removed_ids))
+        offset = end
+    return blocks, offset
+
+
+def _summarise_segment(blocks, start=0, end=None):
+    """
+    Replays one week's blocks into {webshopId: [before_days, paid_days, first, last, days]},
+    where the *_days dicts map a price in cents to the number of days it applied.
+
+    Only changes are replayed: a price holds from the day it was recorded
+    until it changes or the product disappears, and the week's last state
+    through the day ordinal `end` (default the day of its last block). Days
+    before the ordinal `start` are replayed but not counted.
+    """
+    summary = {}
+    state = {} # webshopId -> (values, since)
+
+    def close(webshop_id, until):
+        (before, paid, _), since = state.pop(webshop_id)
+        since = max(since, start)
+        if until <= since:
+            return
+        entry = summary.get(webshop_id)
+        if entry is None:
+            entry = summary[webshop_id] = [{}, {}, since, until - 1, 0]
+        entry[3] = until - 1
+        days = until - since
+        entry[4] += days
+        if before != MISSING_CENTS:
+            entry[0][before] = entry[0].get(before, 0) + days
+        if paid != MISSING_CENTS:
+            entry[1][paid] = entry[1].get(paid, 0) + days
+
+    for _, day, changed, removed in blocks:
+        for webshop_id in removed:
+            if webshop_id in state:
+                close(webshop_id, day)
+        for webshop_id, values in changed.items():
+            if webshop_id in state:
+                close(webshop_id, day)
+            state[webshop_id] = (values, day)
+    if blocks:
+        until = (blocks[-1][1] if end is None else end) + 1
+        for webshop_id in list(state):
+            close(webshop_id, until)
+    return summary
+
+
+def _accumulate(entry, values):
+    # Adds one week's summary of a product to its running totals
+    before, paid, first, last, days = values
+    histogram = entry[0]
+    for cents, count in before.items():
+        histogram[cents] = histogram.get(cents, 0) + count
+    histogram = entry[1]
+    for cents, count in paid.items():
+        histogram[cents] = histogram.get(cents, 0) + count
+    if first < entry[2]:
+        entry[2] = first
+    if last > entry[3]:
+        entry[3] = last
+    entry[4] += days
+    return entry
+
+
+def _weighted_min_median(histogram):
+    if not histogram:
+        return math.nan, math.nan
+    prices = sorted(histogram)
+    half = sum(histogram.values()) / 2
+    seen = 0
+    for cents in prices:
+        seen += histogram[cents]
+        if seen >= half:
+            return _euros(prices[0]), _euros(cents)
+
+
+class PriceStats:
+    """
+    Per-product price statistics over a period, as columns.
+
+    Medians are weighted by the number of days each price applied, so a
+    one-day glitch does not move them. Prices are in euros, NaN when the
+    product has no known price in the period.
+
+    Attributes:
+        webshop_id (array q): Products, ascending.
+        min_before / median_before (array d): Regular price (priceBeforeBonus).
+        min_paid / median_paid (array d): Price actually paid, bonus included.
+        days (array i): Days the product was seen.
+        first_seen / last_seen (array i): Date ordinals.
+        positions (dict): webshopId -> position in the columns.
+    """
+
+    def __init__(self, summary):
+        ids = sorted(summary)
+        self.webshop_id = array("q", ids)
+        self.positions = {webshop_id: p for p, webshop_id in enumerate(ids)}
+        for name in ("min_before", "median_before", "min_paid", "median_paid"):
+            setattr(self, name, array("d"))
+        self.days = array("i")
+        self.first_seen = array("i")
+        self.last_seen = array("i")
+        for webshop_id in ids:
+            before, paid, first, last, days = summary[webshop_id]
+            low, median = _weighted_min_median(before)
+            self.min_before.append(low)
+            self.median_before.append(median)
+            low, median = _weighted_min_median(paid)
+            self.min_paid.append(low)
+            self.median_paid.append(median)
+            self.days.append(days)
+            self.first_seen.append(first)
+            self.last_seen.append(last)
+
+    def __len__(self):
+        return len(self.webshop_id)
+
+    def get(self, webshop_id):
+        """
+        Returns the statistics of one product as a dict, or None without history.
+        """
+        p = self.positions.get(webshop_id)
+        if p is None:
+            return None
+        return {
+            "webshopId": webshop_id,
+            "min_before": self.min_before[p], "median_before": self.median_before[p],
+            "min_paid": self.min_paid[p], "median_paid": self.median_paid[p],
+            "days": self.days[p],
+            "first_seen": date.fromordinal(self.first_seen[p]).isoformat(),
+            "last_seen": date.fromordinal(self.last_seen[p]).isoformat(),
+        }
+
+
+class PriceHistory:
+    """
+    Append-only, compressed time series of per-product prices and bonus mechanisms.
+
+    Each run's catalogue is appended as one block to the segment file of its
+    ISO week. The first block of a week holds every product; the following
+    days only hold the products whose regular price, paid price or mechanism
+    changed, plus the ids that disappeared. Within a block the columns are
+    stored sorted by webshopId, ids delta-encoded and prices in cents, and
+    zlib-compressed, so a year of daily snapshots of thousands of products
+    stays a few MB.
+
+    Statistics are built by replaying changes rather than daily rows, and
+    the summary of each week is cached until that segment grows, so after
+    the first call only the current week is replayed again.
+
+    Args:
+        directory (str): Folder holding the weekly segments.
+    """
+
+    def __init__(self, directory=DEFAULT_HISTORY_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self._summaries = {} # segment name -> (file size, summary)
+        self._merged = None # (segment signature, merged summaries of all weeks but the last)
+        self._stats = None # (segment signature, PriceStats)
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get("price_history", {}).get("directory", DEFAULT_HISTORY_DIR))
+
+    def segments(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(".seg"))
+
+    def append(self, products, day=None):
+        """
+        Records the prices of one run.
+
+        Args:
+            products (ProductStore | iterable): The run's catalogue.
+            day (date): Day of the run (default today).
+
+        Returns:
+            bool: False when `day` was already recorded, so reruns add nothing.
+
+        Raises:
+            ValueError: If a later day of the same week was already recorded.
+        """
+        store = products if isinstance(products, ProductStore) else ProductStore(products)
+        day = day or date.today()
+        effective, _ = compute_savings(store)
+        current = {}
+        for p in range(len(store)):
+            paid = effective[p] if effective[p] > 0 else store.price[p] # NaN compares False
+            current[store.webshop_id[p]] = (_cents(store.price_before_bonus[p]), _cents(paid),
+                                            store.products[p].get("bonusMechanism") or "")
+
+        path = os.path.join(self.directory, segment_name(day))
+        with self.lock:
+            blocks, valid_end = _read_segment(path)
+            days = [block[1] for block in blocks]
+            if day.toordinal() in days:
+                return False
+            if days and day.toordinal() < days[-1]:
+                raise ValueError(f"{day} is older than {date.fromordinal(days[-1])}, already in {path}.")
+            if blocks:
+                state = {}
+                for _, _, changed, removed in blocks:
+                    for webshop_id in removed:
+                        state.pop(webshop_id, None)
+                    state.update(changed)
+                changed = {k: v for k, v in current.items() if state.get(k) != v}
+                removed = sorted(state.keys() - current.keys())
+                data = _encode_block(_DELTA, day.toordinal(), changed, removed)
+            else:
+                data = _encode_block(_FULL, day.toordinal(), current, [])
+            with open(path, "ab") as f:
+                f.truncate(valid_end)
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        return True
+
+    def _summary(self, name, start=0, end=None):
+        # Summary of the blocks of one segment recorded between the day ordinals start and end
+        path = os.path.join(self.directory, name)
+        size = os.path.getsize(path)
+        cached = self._summaries.get((name, start, end))
+        if cached and cached[0] == size:
+            return cached[1]
+        blocks, _ = _read_segment(path)
+        if end is not None:
+            blocks = [block for block in blocks if block[1] <= end]
+        summary = _summarise_segment(blocks, start, end)
+        self._summaries[(name, start, end)] = (size, summary)
+        return summary
+
+    def stats(self, since=None, until=None):
+        """
+        Returns PriceStats over the days between `since` and `until` (dates, inclusive).
+
+        Weeks are selected by segment, and the first and last week are cut
+        to the day, so until=yesterday compares today's offers with history
+        that does not include them. The last recorded prices of a week hold
+        through `until` or, for earlier weeks, through the week's Sunday, also
+        on days without a run.
+        """
+        low = segment_name(since) if since else ""
+        high = segment_name(until) if until else "~"
+        with self.lock:
+            names = [name for name in self.segments() if low <= name <= high]
+            if not names:
+                return PriceStats({})
+            # (name, size, first day ordinal counted, last day ordinal counted) per segment;
+            # the newest week without `until` ends at its last run
+            signature = tuple(
+                (name, os.path.getsize(os.path.join(self.directory, name)),
+                 since.toordinal() if since and name == low else 0,
+                 until.toordinal() if until and name == high else _week_end(name) if name != names[-1] else None)
+                for name in names
+            )
+            if self._stats and self._stats[0] == signature:
+                return self._stats[1]
+            # Earlier weeks no longer change: their merge is kept and extended, and
+            # only the last week is added to a copy
+            sealed = signature[:-1]
+            if self._merged and self._merged[0] == sealed[:len(self._merged[0])]:
+                done, prefix = self._merged
+            else:
+                done, prefix = (), {}
+            for name, _, start, end in sealed[len(done):]:
+                for webshop_id, values in self._summary(name, start, end).items():
+                    entry = prefix.get(webshop_id)
+                    if entry is None:
+                        prefix[webshop_id] = [dict(values[0]), dict(values[1])] + values[2:]
+                    else:
+                        _accumulate(entry, values)
+            self._merged = (sealed, prefix)
+            merged = dict(prefix)
+            name, _, start, end = signature[-1]
+            for webshop_id, values in self._summary(name, start, end).items():
+                entry = merged.get(webshop_id)
+                if entry is None:
+                    merged[webshop_id] = values # read only from here on
+                else:
+                    merged[webshop_id] = _accumulate([dict(entry[0]), dict(entry[1])] + entry[2:], values)
+            stats = PriceStats(merged)
+            self._stats = (signature, stats)
+        return stats
+
+
+def score_deals(store, stats, inflation_tolerance=0.05):
+    """
+    Scores a ProductStore's current offers against each product's own history.
+
+    Args:
+        store (ProductStore): Current catalogue.
+        stats (PriceStats): History to compare with, e.g. history.stats(until=yesterday).
+        inflation_tolerance (float): Relative rise of the regular price above its
+                                     historical median that counts as inflated.
+
+    Returns:
+        tuple: (history_discounts, inflated, lowest), columns aligned with the store:
+               array('d') of the saving in percent of the historical median regular
+               price (NaN without history), array('b') set where the regular price was
+               raised above its median (the bonus discount is partly fake), and
+               array('b') set where the price paid is the lowest seen.
+    """
+    count = len(store)
+    effective, _ = compute_savings(store)
+    history_discounts = array("d", [math.nan]) * count
+    inflated = array("b", bytes(count))
+    lowest = array("b", bytes(count))
+    positions = stats.positions
+    median_before, min_paid = stats.median_before, stats.min_paid
+    price, price_before_bonus, webshop_id = store.price, store.price_before_bonus, store.webshop_id
+
+    for p in range(count):
+        s = positions.get(webshop_id[p])
+        if s is None:
+            continue
+        paid = effective[p] if effective[p] > 0 else price[p] # NaN compares False
+        median = median_before[s]
+        if median and not math.isnan(paid):
+            history_discounts[p] = round((1 - paid / median) * 100, 2)
+        inflated[p] = price_before_bonus[p] > median * (1 + inflation_tolerance) # NaN compares False
+        lowest[p] = paid <= min_paid[s]
+    return history_discounts, inflated, lowest
+
+
+def rank_deals(store, stats, positions=None, min_discount=None, exclude_inflated=True, inflation_tolerance=0.05):
+    """
+    Orders products by their saving against their own price history, largest first.
+
+    Args:
+        store (ProductStore): Current catalogue.
+        stats (PriceStats): History to compare with.
+        positions (iterable): Restrict ranking to these positions (e.g. a query result).
+        min_discount (float): Drop products saving less than this percentage.
+        exclude_inflated (bool): Drop products whose regular price was raised.
+        inflation_tolerance (float): See score_deals.
+
+    Returns:
+        list: Positions into the store; products without history rank last.
+    """
+    discounts, inflated, _ = score_deals(store, stats, inflation_tolerance)
+    positions = range(len(store)) if positions is None else positions
+    if exclude_inflated:
+        positions = [p for p in positions if not inflated[p]]
+    if min_discount is not None:
+        positions = [p for p in positions if discounts[p] >= min_discount] # NaN compares False
+    return sorted(positions, key=lambda p: -discounts[p] if not math.isnan(discounts[p]) else math.inf)
@@ -0,0 +1,191 @@
+import math
+from array import array
+from datetime import date
+
+from src.stream_json import iter_json_items
+
+# Nutri-Score letters ranked so that "at most B" becomes rank <= 2; 0 is unknown
+NUTRISCORE_RANK = {"A": 1, "B": 2, "C": 3, "D": 4, "E": 5}
+
+MISSING_PRICE = math.nan
+
+
+def _price(value):
+    return float(value) if value is not None else MISSING_PRICE
+
+
+def _day(value):
+    # ISO dates are kept as proleptic ordinals, 0 when unknown
+    try:
+        return date.fromisoformat(value).toordinal() if value else 0
+    except ValueError:
+        return 0
+
+
+def _intersect(position_arrays):
+    """
+    Intersects sorted position arrays, smallest first.
+    """
+    ordered = sorted(position_arrays, key=len)
+    result = set(ordered[0])
+    for positions in ordered[1:]:
+        result.intersection_update(positions)
+        if not result:
+            break
+    return sorted(result)
+
+
+class ProductStore:
+    """
+    Column-oriented, in-memory view of AH products with hash indexes.
+
+    Numeric fields live in typed `array` columns (one slot per product) and
+    string fields that are filtered on (main category, bonus mechanism, brand)
+    are indexed value -> positions. Queries narrow the
+    candidates through the indexes and then test the remaining rows column by
+    column, without touching the product dictionaries.
+
+    Positions returned by `query` index into `products`, the original dicts,
+    which are kept for rendering.
+
+    Facts read from product images (src/image_facts.py) can be attached with
+    `attach_facts`; their allergens are indexed like the string fields.
+    """
+
+    INDEXED_FIELDS = ("mainCategory", "bonusMechanism", "brand")
+
+    # Column attribute -> array typecode. `price` is currentPrice, falling back
+    # to priceBeforeBonus; dates are ordinals. Shared with src/snapshot.py.
+    COLUMNS = {
+        "webshop_id": "q",
+        "current_price": "d",
+        "price_before_bonus": "d",
+        "price": "d",
+        "is_bonus": "b",
+        "nutriscore": "b",
+        "bonus_start": "i",
+        "bonus_end": "i",
+    }
+
+    def __init__(self, products=()):
+        self.products = []
+        for name, typecode in self.COLUMNS.items():
+            setattr(self, name, array(typecode))
+        self.indexes = {field: {} for field in self.INDEXED_FIELDS}
+        self.image_facts = {} # position -> facts
+        self.allergens = {} # allergen group -> positions of products that contain or may contain it
+        self.extend(products)
+
+    @classmethod
+    def from_json(cls, path):
+        """
+        Builds a store by streaming a bonus items dump from disk.
+        """
+        return cls(iter_json_items(path))
+
+    def __len__(self):
+        return len(self.products)
+
+    def extend(self, products):
+        """
+        Appends products to the store and updates its indexes.
+        """
+        for product in products:
+            position = len(self.products)
+            self.products.append(product)
+            self.webshop_id.append(int(product.get("webshopId") or 0))
+            current_price = _price(product.get("currentPrice"))
+            price_before_bonus = _price(product.get("priceBeforeBonus"))
+            self.current_price.append(current_price)
+            self.price_before_bonus.append(price_before_bonus)
+            self.price.append(price_before_bonus if math.isnan(current_price) else current_price)
+            self.is_bonus.append(1 if product.get("isBonus") else 0)
+            self.nutriscore.append(NUTRISCORE_RANK.get(product.get("nutriscore"), 0))
+            self.bonus_start.append(_day(product.get("bonusStartDate")))
+            self.bonus_end.append(_day(product.get("bonusEndDate")))
+            for field, index in self.indexes.items():
+                value = product.get(field)
+                if value is not None:
+                    index.setdefault(value, array("I")).append(position)
+
+    def attach_facts(self, facts):
+        """
+        Attaches image facts to the products they were read from.
+
+        Args:
+            facts (dict): webshopId -> facts from ImageFactExtractor.extract.
+        """
+        self.image_facts = {}
+        self.allergens = {}
+        webshop_id = self.webshop_id
+        for position in range(len(webshop_id)):
+            found = facts.get(webshop_id[position])
+            if found is None:
+                continue
+            self.image_facts[position] = found
+            for group in (*found.get("allergens", ()), *found.get("may_contain", ())):
+                self.allergens.setdefault(group, array("I")).append(position)
+
+    def values(self, field):
+        """
+        Returns the distinct values of an indexed field with their item counts.
+        """
+        return {value: len(positions) for value, positions in self.indexes[field].items()}
+
+    def query(self, max_price=None, category=None, mechanism=None, brand=None,
+              max_nutriscore=None, bonus_only=True, active_on=None, exclude_allergens=None):
+        """
+        Selects products matching all given conditions.
+
+        Args:
+            max_price (float): Keep products whose price is strictly below this.
+            category (str or list): mainCategory value(s) to keep.
+            mechanism (str or list): bonusMechanism value(s) to keep.
+            brand (str or list): brand value(s) to keep.
+            max_nutriscore (str): Worst Nutri-Score letter allowed, e.g. "B".
+                                  Products without a Nutri-Score are excluded.
+            bonus_only (bool): Keep only products with isBonus set.
+            active_on (str or date): Keep products whose bonus window contains this day.
+            exclude_allergens (list): Allergen groups to avoid. Products whose
+                                      image facts list one of them, also as a
+                                      trace, are dropped; products without
+                                      facts are kept.
+
+        Returns:
+            array: Sorted positions of the matching products.
+        """
+        candidates = []
+        for field, wanted in (("mainCategory", category), ("bonusMechanism", mechanism), ("brand", brand)):
+            if wanted is None:
+                continue
+            wanted = [wanted] if isinstance(wanted, str) else wanted
+            index = self.indexes[field]
+            candidates.append(sorted({p for value in wanted for p in index.get(value, ())}))
+        positions = _intersect(candidates) if candidates else range(len(self.products))
+
+        # Each condition filters the surviving positions against a single column
+        if bonus_only:
+            is_bonus = self.is_bonus
+            positions = [p for p in positions if is_bonus[p]]
+        if max_price is not None:
+            price = self.price
+            positions = [p for p in positions if price[p] < max_price] # NaN compares False
+        if max_nutriscore is not None:
+            limit = NUTRISCORE_RANK[max_nutriscore.upper()]
+            nutriscore = self.nutriscore
+            positions = [p for p in positions if 0 < nutriscore[p] <= limit]
+        if active_on is not None:
+            day = _day(active_on) if isinstance(active_on, str) else active_on.toordinal()
+            start, end = self.bonus_start, self.bonus_end
+            positions = [p for p in positions if start[p] <= day and (end[p] == 0 or day <= end[p])]
+        if exclude_allergens:
+            excluded = {p for group in exclude_allergens for p in self.allergens.get(group, ())}
+            positions = [p for p in positions if p not in excluded]
+        return array("I", positions)
+
+    def rows(self, positions):
+        """
+        Returns the product dictionaries at the given positions.
+        """
+        products = self.products
+        return [products[p] for p in positions]
@@ -0,0 +1,362 @@
+import heapq
+import json
+import math
+import os
+import re
+import unicodedata
+import zlib
+
+# Default location of the on-disk index
+DEFAULT_SEARCH_PATH = os.path.join("data", "search", "products.json")
+
+# Indexed fields and their BM25F weights; "description" joins descriptionHighlights
+# and descriptionFull
+FIELDS = ("title", "brand", "subCategory", "description")
+FIELD_WEIGHTS = (3.0, 1.5, 2.0, 1.0)
+
+# BM25 term-frequency saturation and length normalisation
+K1 = 1.2
+B = 0.75
+
+# Fuzzy matching: vocabulary terms containing at least this share of a query
+# term's trigrams are searched too, weighted by their similarity
+MIN_TRIGRAM_CONTAINMENT = 0.8
+MAX_EXPANSIONS = 20
+
+_TAG = re.compile(r"<[^>]+>")
+_WORD = re.compile(r"[^\W\d_]+", re.U) # letters only: quantities and codes are dropped
+
+# Dutch function words and the units found in recipe ingredients ("2 el olijfolie")
+STOPWORDS = frozenset("""
+aan al alle als bij dan dat de der des die dit door een en er geen het hier in is je met na naar niet nog
+of om op over per te tot uit van voor wat we wel zo zonder zijn ze zij ook u uw
+g gr gram kg kilo mg ml cl dl l liter st stuk stuks el tl eetlepel eetlepels theelepel theelepels
+snufje snuf mespunt teen tenen teentje teentjes blik blikje pak zakje bos bosje handje handvol stukje
+""".split())
+
+# Plurals the suffix rules get wrong
+IRREGULAR = {"eieren": "ei", "uien": "ui", "kalveren": "kalf", "runderen": "rund", "hoenderen": "hoen"}
+
+_VOWELS = frozenset("aeiouy")
+_DIMINUTIVES = ("etjes", "etje", "tjes", "pjes", "tje", "pje", "jes", "je")
+
+
+def stem(word):
+    """
+    Reduces a lowercase Dutch word to a stem shared by its common inflections.
+
+    A light suffix stripper in the spirit of the Snowball Dutch stemmer:
+    diminutives (-tje, -pje, -je), plurals (-en, -s) and the adjective -e
+    are removed, then doubled consonants and vowels are undoubled and a
+    final v/z becomes f/s, so "tomaten" and "tomaat", "kazen" and "kaas",
+    "druiven" and "druif" or "worteltjes" and "wortels" meet.
+    """
+    if word in IRREGULAR:
+        return IRREGULAR[word]
+    if len(word) <= 3:
+        return word
+    for suffix in _DIMINUTIVES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    else:
+        if word.endswith("heden"):
+            word = word[:-5] + "heid"
+        elif word.endswith("en") and len(word) >= 5 and (word[-3] not in _VOWELS or word[-4:-2] in ("ei", "ie", "ee")):
+            word = word[:-2]
+        elif word.endswith("s") and len(word) >= 4 and word[-2] not in _VOWELS and word[-2] not in "js":
+            word = word[:-1]
+        elif word.endswith("e") and len(word) >= 4 and word[-2] not in _VOWELS:
+            word = word[:-1]
+    if len(word) >= 2 and word[-1] == word[-2] and word[-1] not in _VOWELS:
+        word = word[:-1]
+    if word[-1] == "v":
+        word = word[:-1] + "f"
+    elif word[-1] == "z":
+        word = word[:-1] + "s"
+    if len(word) >= 4 and word[-1] not in _VOWELS and word[-2] == word[-3] and word[-2] in "aeou":
+        word = word[:-2] + word[-1]
+    return word
+
+
+def _fold(text):
+    # Lowercase and drop accents: "Rosé" -> "rose", "crème fraîche" -> "creme fraiche"
+    text = text.lower()
+    if text.isascii():
+        return text
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    """
+    Returns the stemmed terms of a text, with HTML tags, stopwords, numbers
+    and single letters removed.
+    """
+    if not text:
+        return []
+    words = _WORD.findall(_fold(_TAG.sub(" ", text)))
+    return [stem(w) for w in words if len(w) > 1 and w not in STOPWORDS]
+
+
+def trigrams(term):
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+
+def product_fields(product):
+    """
+    Returns the raw texts of the indexed fields of a product, in FIELDS order.
+    """
+    description = " ".join(filter(None, (product.get("descriptionHighlights"), product.get("descriptionFull"))))
+    return (product.get("title") or "", product.get("brand") or "", product.get("subCategory") or "", description)
+
+
+class SearchIndex:
+    """
+    Inverted full-text index over products with BM25F ranking and fuzzy matching.
+
+    Each indexed field keeps its own term counts and length, so a word in the
+    title weighs more than the same word in a long description, and products
+    are not penalised for having a description at all. Query terms are also
+    matched against vocabulary terms that contain most of their character
+    trigrams, which covers typos and Dutch compounds ("spinazie" finds
+    "diepvriesspinazie", "zalm" finds "zalmfilet") at a lower weight than an
+    exact stem.
+
+    Updates are incremental: `update` re-tokenises only products whose text
+    changed and drops those that left the catalogue, and `sync` applies an
+    ingestion delta directly; `version` records the catalogue version
+    (src/incremental_ingest.py) the index reflects. Per-term scores are
+    cached between updates as ranked lists, so resolving thousands of recipe
+    ingredients reuses the work done for shared words, and a top-k search
+    stops reading those lists as soon as the result can no longer change.
+    """
+
+    def __init__(self):
+        self.docs = {} # webshopId -> (text hash, per-field term lists)
+        self.postings = {} # term -> {webshopId: per-field counts}
+        self.lengths = {} # webshopId -> per-field lengths
+        self.total_lengths = [0] * len(FIELDS)
+        self.vocabulary = {} # trigram -> set of terms
+        self._term_scores = {}
+        self._expansions = {}
+        self.version = None
+
+    def __len__(self):
+        return len(self.docs)
+
+    def _add_doc(self, webshop_id, text_hash, fields):
+        self.docs[webshop_id] = (text_hash, fields)
+        lengths = tuple(len(terms) for terms in fields)
+        self.lengths[webshop_id] = lengths
+        for f, length in enumerate(lengths):
+            self.total_lengths[f] += length
+        for f, terms in enumerate(fields):
+            for term in terms:
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = {}
+                    for trigram in trigrams(term):
+                        self.vocabulary.setdefault(trigram, set()).add(term)
+                    self._expansions.clear()
+                counts = posting.get(webshop_id)
+                if counts is None:
+                    counts = posting[webshop_id] = [0] * len(FIELDS)
+                counts[f] += 1
+
+    def _remove_doc(self, webshop_id):
+        _, fields = self.docs.pop(webshop_id)
+        for f, length in enumerate(self.lengths.pop(webshop_id)):
+            self.total_lengths[f] -= length
+        for term in {term for terms in fields for term in terms}:
+            posting = self.postings[term]
+            del posting[webshop_id]
+            if not posting:
+                del self.postings[term]
+                for trigram in trigrams(term):
+                    terms = self.vocabulary[trigram]
+                    terms.discard(term)
+                    if not terms:
+                        del self.vocabulary[trigram]
+                self._expansions.clear()
+
+    def add(self, products):
+        """
+        Indexes products, replacing existing entries with the same webshopId.
+        """
+        for product in products:
+            webshop_id = product.get("webshopId")
+            if webshop_id is None:
+                continue
+            texts = product_fields(product)
+            text_hash = zlib.crc32("\x1f".join(texts).encode("utf-8"))
+            existing = self.docs.get(webshop_id)
+            if existing is not None:
+                if existing[0] == text_hash:
+                    continue
+                self._remove_doc(webshop_id)
+            self._add_doc(webshop_id, text_hash, [tokenize(text) for text in texts])
+        self._term_scores.clear()
+
+    def remove(self, webshop_ids):
+        """
+        Removes products from the index.
+        """
+        for webshop_id in webshop_ids:
+            if webshop_id in self.docs:
+                self._remove_doc(webshop_id)
+        self._term_scores.clear()
+
+    def update(self, products):
+        """
+        Makes the index match a catalogue: new and changed products are
+        (re)indexed and products missing from it are removed.
+
+        Returns:
+            dict: {"indexed", "removed", "unchanged"} counts.
+        """
+        products = [p for p in products if p.get("webshopId") is not None]
+        current = {p["webshopId"] for p in products}
+        expired = [webshop_id for webshop_id in self.docs if webshop_id not in current]
+        hashes = {webshop_id: doc[0] for webshop_id, doc in self.docs.items()}
+        self.remove(expired)
+        self.add(products)
+        unchanged = sum(1 for webshop_id, doc in self.docs.items() if hashes.get(webshop_id) == doc[0])
+        return {"indexed": len(self.docs) - unchanged, "removed": len(expired), "unchanged": unchanged}
+
+    def sync(self, delta):
+        """
+        Applies an ingestion delta from src/incremental_ingest.py.
+        """
+        # Products without a webshopId are keyed "None" by the ingest and were never indexed
+        self.remove(int(webshop_id) for webshop_id in delta.get("expired", []) if str(webshop_id).isdigit())
+        self.add(delta.get("added", []) + delta.get("changed", []))
+
+    def expand(self, term):
+        """
+        Returns [(vocabulary term, weight)] matched by a query term: the term
+        itself with weight 1, and fuzzy matches weighted by trigram overlap.
+        """
+        cached = self._expansions.get(term)
+        if cached is not None:
+            return cached
+        matches = [(term, 1.0)] if term in self.postings else []
+        query = trigrams(term)
+        if query:
+            shared = {}
+            for trigram in query:
+                for candidate in self.vocabulary.get(trigram, ()):
+                    shared[candidate] = shared.get(candidate, 0) + 1
+            fuzzy = []
+            for candidate, count in shared.items():
+                if candidate == term or count < MIN_TRIGRAM_CONTAINMENT * len(query):
+                    continue
+                if len(query) == 1 and not candidate.startswith(term):
+                    continue # "kip" may start a compound ("kipfilet") but "rod" is no part of "brod"
+                dice = 2 * count / (len(query) + max(len(candidate) - 2, 1))
+                fuzzy.append((candidate, 0.5 + 0.4 * dice)) # below an exact match
+            fuzzy.sort(key=lambda match: -match[1])
+            matches.extend(fuzzy[:MAX_EXPANSIONS])
+        self._expansions[term] = matches
+        return matches
+
+    def _scores_for(self, term):
+        cached = self._term_scores.get(term)
+        if cached is not None:
+            return cached
+        posting = self.postings[term]
+        count = len(self.docs)
+        idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+        averages = [total / count if total else 1.0 for total in self.total_lengths]
+        lengths = self.lengths
+        scores = {}
+        for webshop_id, counts in posting.items():
+            doc_lengths = lengths[webshop_id]
+            tf = 0.0
+            for f, c in enumerate(counts):
+                if c:
+                    tf += FIELD_WEIGHTS[f] * c / (1 - B + B * doc_lengths[f] / averages[f])
+            scores[webshop_id] = idf * tf * (K1 + 1) / (tf + K1)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        self._term_scores[term] = scores, ranked
+        return scores, ranked
+
+    def search(self, text, k=10, fuzzy=True):
+        """
+        Returns the k products best matching a text (e.g. a recipe ingredient).
+
+        Returns:
+            list: (webshopId, BM25 score) tuples, best first.
+        """
+        weights = {}
+        for term in set(tokenize(text)):
+            for match, weight in (self.expand(term) if fuzzy else [(term, 1.0)]):
+                if match in self.postings:
+                    weights[match] = weights.get(match, 0.0) + weight
+        lists = [(weight,) + self._scores_for(match) for match, weight in weights.items()]
+
+        # Threshold algorithm: walk the per-term lists best first, scoring each
+        # product on first sight, and stop once the k-th best score reaches the
+        # best score any unseen product could still have
+        best = [] # min-heap of (score, -webshopId)
+        seen = set()
+        depth = 0
+        while True:
+            bound = 0.0
+            for weight, _, ranked in lists:
+                if depth >= len(ranked):
+                    continue
+                webshop_id, score = ranked[depth]
+                bound += weight * score
+                if webshop_id in seen:
+                    continue
+                seen.add(webshop_id)
+                total = sum(w * scores.get(webshop_id, 0.0) for w, scores, _ in lists)
+                if len(best) < k:
+                    heapq.heappush(best, (total, -webshop_id))
+                elif (total, -webshop_id) > best[0]:
+                    heapq.heapreplace(best, (total, -webshop_id))
+            if not bound or (len(best) == k and best[0][0] >= bound):
+                break
+            depth += 1
+        return [(-negative_id, score) for score, negative_id in sorted(best, reverse=True)]
+
+    def resolve(self, ingredients, k=3, min_score=0.0):
+        """
+        Resolves recipe ingredients ("2 el olijfolie", "verse spinazie") to products.
+
+        Returns:
+            dict: {ingredient: [(webshopId, score), ...]}; ingredients without a
+                  match scoring above `min_score` map to an empty list.
+        """
+        resolved = {}
+        for ingredient in ingredients:
+            if ingredient not in resolved:
+                resolved[ingredient] = [(webshop_id, score) for webshop_id, score in self.search(ingredient, k)
+                                        if score > min_score]
+        return resolved
+
+    def save(self, path=DEFAULT_SEARCH_PATH):
+        """
+        Writes the tokenised documents; postings are rebuilt on load.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"fields": FIELDS, "version": self.version, "docs": [[webshop_id, text_hash, fields]
+                                                  for webshop_id, (text_hash, fields) in self.docs.items()]},
+                      f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_SEARCH_PATH):
+        """
+        Loads an index written by `save`.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls()
+        if tuple(data.get("fields", ())) != FIELDS:
+            return index # indexed with other fields: start over
+        for webshop_id, text_hash, fields in data["docs"]:
+            index._add_doc(webshop_id, text_hash, fields)
+        index.version = data.get("version")
+        return index
@@ -2,6 +2,10 @@ import os
 import json
 import requests # New dependency for making HTTP requests
 
+# Characters of the HTML file read and encoded at a time
+HTML_CHUNK_SIZE = 64 * 1024
+
+
 def get_sendpulse_access_token(api_id, api_secret):
     """
     Obtains an access token from SendPulse API.
@@ -21,6 +25,20 @@ def get_sendpulse_access_token(api_id, api_secret):
         print(f"Error getting SendPulse access token: {e}")
         return None
 
+def iter_email_payload(email_data, html_content_file, chunk_size=HTML_CHUNK_SIZE):
+    """
+    Yields the JSON body of a SendPulse email with the HTML file spliced in
+    as its "html" member, reading and escaping the file chunk by chunk
+    instead of loading it whole.
+    """
+    yield b'{"html": "'
+    with open(html_content_file, 'r', encoding='utf-8') as f:
+        for chunk in iter(lambda: f.read(chunk_size), ""):
+            # json.dumps escapes to ASCII; strip the surrounding quotes
+            yield json.dumps(chunk)[1:-1].encode("ascii")
+    yield b'", ' + json.dumps(email_data)[1:].encode("ascii")
+
+
 def send_html_email_sendpulse(
     sender_email,
     sender_name, # Added sender name for SendPulse
@@ -48,9 +66,6 @@ def send_html_email_sendpulse(
             print(f"Error: HTML file '{html_content_file}' not found.")
             return
 
-        with open(html_content_file, 'r', encoding='utf-8') as f:
-            html_body = f.read()
-
         # Get SendPulse access token
         access_token = get_sendpulse_access_token(api_id, api_secret)
         if not access_token:
@@ -73,9 +88,8 @@ def send_html_email_sendpulse(
             "Authorization": f"Bearer {access_token}"
         }
         
-        # Construct the email payload
+        # Construct the email payload; the HTML body is streamed in from the file
         email_data = {
-            "html": html_body,
             "text": "Please enable HTML to view this email.", # Fallback for text-only clients
             "subject": subject,
             "from": {
@@ -90,7 +104,8 @@ def send_html_email_sendpulse(
         }
 
         print(f"Attempting to send email to {receiver_email} via SendPulse...")
-        response = requests.post(send_email_url, headers=send_email_headers, data=json.dumps(email_data))
+        response = requests.post(send_email_url, headers=send_email_headers,
+                                 data=iter_email_payload(email_data, html_content_file))
         response.raise_for_status() # Raise an exception for HTTP errors
 
         result = response.json()
@@ -107,30 +122,31 @@ def send_html_email_sendpulse(
     except Exception as e:
         print(f"An unexpected error occurred during SendPulse email sending: {e}")
 
-# --- Retrieve Configuration from Environment Variables ---
-# These variables will be set by GitHub Actions secrets
-SENDPULSE_API_ID = os.environ.get("SENDPULSE_API_ID")
-SENDPULSE_API_SECRET = os.environ.get("SENDPULSE_API_SECRET")
-SENDER_EMAIL = os.environ.get("SENDER_EMAIL")
-SENDER_NAME = os.environ.get("SENDER_NAME", "Your Company") # Default sender name
-RECEIVER_EMAIL = os.environ.get("RECEIVER_EMAIL")
-EMAIL_SUBJECT = os.environ.get("EMAIL_SUBJECT")
-HTML_FILE_PATH = os.environ.get("HTML_FILE_PATH")
-
-# Basic validation for env vars being loaded
-if not all([SENDPULSE_API_ID, SENDPULSE_API_SECRET, SENDER_EMAIL, RECEIVER_EMAIL, EMAIL_SUBJECT, HTML_FILE_PATH]):
-    print("Error: Missing one or more required environment variables for SendPulse email sending.")
-    print("Please ensure SENDPULSE_API_ID, SENDPULSE_API_SECRET, SENDER_EMAIL, RECEIVER_EMAIL, EMAIL_SUBJECT, HTML_FILE_PATH are set as GitHub Secrets.")
-else:
-    # --- Call the function to send the email using SendPulse API ---
-    print("Attempting to send email...")
-    send_html_email_sendpulse(
-        sender_email=SENDER_EMAIL,
-        sender_name=SENDER_NAME,
-        receiver_email=RECEIVER_EMAIL,
-        subject=EMAIL_SUBJECT,
-        html_content_file=HTML_FILE_PATH,
-        api_id=SENDPULSE_API_ID,
-        api_secret=SENDPULSE_API_SECRET
-    )
+if __name__ == "__main__":
+    # --- Retrieve Configuration from Environment Variables ---
+    # These variables will be set by GitHub Actions secrets
+    SENDPULSE_API_ID = os.environ.get("SENDPULSE_API_ID")
+    SENDPULSE_API_SECRET = os.environ.get("SENDPULSE_API_SECRET")
+    SENDER_EMAIL = os.environ.get("SENDER_EMAIL")
+    SENDER_NAME = os.environ.get("SENDER_NAME", "Your Company") # Default sender name
+    RECEIVER_EMAIL = os.environ.get("RECEIVER_EMAIL")
+    EMAIL_SUBJECT = os.environ.get("EMAIL_SUBJECT")
+    HTML_FILE_PATH = os.environ.get("HTML_FILE_PATH")
+
+    # Basic validation for env vars being loaded
+    if not all([SENDPULSE_API_ID, SENDPULSE_API_SECRET, SENDER_EMAIL, RECEIVER_EMAIL, EMAIL_SUBJECT, HTML_FILE_PATH]):
+        print("Error: Missing one or more required environment variables for SendPulse email sending.")
+        print("Please ensure SENDPULSE_API_ID, SENDPULSE_API_SECRET, SENDER_EMAIL, RECEIVER_EMAIL, EMAIL_SUBJECT, HTML_FILE_PATH are set as GitHub Secrets.")
+    else:
+        # --- Call the function to send the email using SendPulse API ---
+        print("Attempting to send email...")
+        send_html_email_sendpulse(
+            sender_email=SENDER_EMAIL,
+            sender_name=SENDER_NAME,
+            receiver_email=RECEIVER_EMAIL,
+            subject=EMAIL_SUBJECT,
+            html_content_file=HTML_FILE_PATH,
+            api_id=SENDPULSE_API_ID,
+            api_secret=SENDPULSE_API_SECRET
+        )
 
@@ -0,0 +1,220 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import date
+
+from src.product_store import ProductStore
+
+# Snapshots live next to the JSON dumps, one file per fetch date
+SNAPSHOT_DIR = os.path.join("data", "snapshots")
+
+# File layout:
+#   MAGIC | header length (u32, little endian) | header JSON | aligned blocks
+# The header lists every block (name, typecode, offset, length in items).
+# Blocks are the ProductStore columns, per indexed field the concatenated
+# position lists, the product byte offsets and the compact JSON products.
+MAGIC = b"AHSNAP1\0"
+ALIGNMENT = 8
+
+
+def snapshot_path(fetch_date=None, directory=SNAPSHOT_DIR):
+    """
+    Returns the snapshot path for a fetch date (a date or "YYYYMMDD" string).
+    """
+    fetch_date = fetch_date or date.today()
+    if isinstance(fetch_date, date):
+        fetch_date = fetch_date.strftime("%Y%m%d")
+    return os.path.join(directory, f"bonus_{fetch_date}.snap")
+
+
+class _LazyProducts:
+    """
+    Read-only sequence decoding product dictionaries from the mapped file on access.
+    """
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += len(self)
+        return json.loads(bytes(self.blob[self.offsets[position]:self.offsets[position + 1]]))
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+
+def save_snapshot(store, path, version=None):
+    """
+    Writes a ProductStore to a memory-mappable snapshot file.
+
+    The file is written to a temporary name and renamed into place, so readers
+    mapping an existing snapshot are never affected. `version` identifies the
+    catalogue it holds (see src/incremental_ingest.py's catalogue_version).
+    """
+    blocks = []
+    for name, typecode in ProductStore.COLUMNS.items():
+        blocks.append((f"column:{name}", getattr(store, name)))
+
+    index_values = {}
+    for field, index in store.indexes.items():
+        values = list(index)
+        bounds = array("Q", [0])
+        positions = array("I")
+        for value in values:
+            positions.extend(index[value])
+            bounds.append(len(positions))
+        index_values[field] = values
+        blocks.append((f"index:{field}", positions))
+        blocks.append((f"bounds:{field}", bounds))
+
+    offsets = array("Q", [0])
+    encoded = []
+    for product in store.products:
+        data = json.dumps(product, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        encoded.append(data)
+        offsets.append(offsets[-1] + len(data))
+    blocks.append(("offsets", offsets))
+
+    # Block offsets depend on the header size, so grow the reserved header
+    # space until the header fits; it is padded with JSON whitespace
+    header = {"byteorder": sys.byteorder, "count": len(store), "version": version, "index_values": index_values}
+    header_length = 0
+    while True:
+        position = _align(len(MAGIC) + 4 + header_length)
+        header["blocks"] = []
+        for name, values in blocks:
+            header["blocks"].append({"name": name, "typecode": values.typecode,
+                                     "offset": position, "length": len(values)})
+            position = _align(position + len(values) * values.itemsize)
+        header["blocks"].append({"name": "products", "typecode": "B", "offset": position, "length": offsets[-1]})
+        header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        if len(header_bytes) <= header_length:
+            header_bytes = header_bytes.ljust(header_length)
+            break
+        header_length = len(header_bytes)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for block, (_, values) in zip(header["blocks"], blocks):
+            f.write(b"\0" * (block["offset"] - f.tell()))
+            values.tofile(f)
+        f.write(b"\0" * (header["blocks"][-1]["offset"] - f.tell()))
+        for data in encoded:
+            f.write(data)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _align(position):
+    return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _read_header(mapped, path):
+    if mapped[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"'{path}' is not a product snapshot.")
+    header_length = struct.unpack_from("<I", mapped, len(MAGIC))[0]
+    start = len(MAGIC) + 4
+    return json.loads(mapped[start:start + header_length])
+
+
+def snapshot_version(path):
+    """
+    Returns the catalogue version a snapshot was saved with, or None.
+    """
+    with open(path, "rb") as f:
+        head = f.read(len(MAGIC) + 4)
+        if len(head) < len(MAGIC) + 4:
+            raise ValueError(f"'{path}' is not a product snapshot.")
+        return _read_header(head + f.read(struct.unpack_from("<I", head, len(MAGIC))[0]), path).get("version")
+
+
+def _snapshot_names(directory):
+    try:
+        return sorted(name for name in os.listdir(directory) if name.startswith("bonus_") and name.endswith(".snap"))
+    except FileNotFoundError:
+        return []
+
+
+def latest_snapshot(directory=SNAPSHOT_DIR):
+    """
+    Returns the path of the most recent snapshot, or None.
+    """
+    names = _snapshot_names(directory)
+    return os.path.join(directory, names[-1]) if names else None
+
+
+def prune_snapshots(keep=7, directory=SNAPSHOT_DIR):
+    """
+    Removes all but the `keep` most recent snapshots.
+    """
+    for name in _snapshot_names(directory)[:-keep]:
+        os.remove(os.path.join(directory, name))
+
+
+def open_snapshot(path):
+    """
+    Maps a snapshot file and returns a read-only ProductStore backed by it.
+
+    Columns and index position lists are zero-copy memoryviews on the mapping,
+    and products are decoded only when accessed, so opening is independent of
+    catalogue size. The mapping is shared through the page cache, so several
+    worker processes opening the same snapshot share its memory.
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header = _read_header(mapped, path)
+    if header["byteorder"] != sys.byteorder:
+        raise ValueError(f"Snapshot '{path}' was written on a {header['byteorder']}-endian machine.")
+
+    view = memoryview(mapped)
+    blocks = {}
+    for block in header["blocks"]:
+        itemsize = array(block["typecode"]).itemsize
+        raw = view[block["offset"]:block["offset"] + block["length"] * itemsize]
+        blocks[block["name"]] = raw.cast(block["typecode"]) if block["typecode"] != "B" else raw
+
+    store = ProductStore.__new__(ProductStore)
+    for name in ProductStore.COLUMNS:
+        setattr(store, name, blocks[f"column:{name}"])
+    store.indexes = {}
+    for field, values in header["index_values"].items():
+        positions, bounds = blocks[f"index:{field}"], blocks[f"bounds:{field}"]
+        store.indexes[field] = {
+            value: positions[bounds[i]:bounds[i + 1]] for i, value in enumerate(values)
+        }
+    store.image_facts, store.allergens = {}, {}
+    store.products = _LazyProducts(blocks["offsets"], blocks["products"])
+    store.snapshot = mapped # keeps the mapping alive with the store
+    return store
+
+
+def load_catalogue(json_path, fetch_date=None, directory=SNAPSHOT_DIR):
+    """
+    Opens the snapshot for a fetch date, creating it from the JSON dump when it
+    is missing or older than the dump.
+
+    Args:
+        json_path (str): Bonus items dump the snapshot is derived from.
+        fetch_date (date or str): Date key of the snapshot, defaults to today.
+        directory (str): Snapshot directory.
+
+    Returns:
+        ProductStore: A store mapped from the snapshot file.
+    """
+    path = snapshot_path(fetch_date, directory)
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(json_path):
+        save_snapshot(ProductStore.from_json(json_path), path)
+    return open_snapshot(path)
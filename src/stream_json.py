@@ -0,0 +1,117 @@
+import json
+
+# Bytes read from disk per refill of the parse buffer
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+
+
+class _Reader:
+    """
+    Small buffered cursor over a text file used by the incremental parser.
+    """
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        # Drop what has been consumed so the buffer stays about one chunk large
+        chunk = self.f.read(self.chunk_size)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        if not chunk:
+            self.eof = True
+        return bool(chunk)
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos} of the stream")
+        self.pos += 1
+
+    def value(self, decoder):
+        """
+        Decodes the next complete JSON value, reading more data as needed.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buf, self.pos)
+                # A value touching the end of the buffer (e.g. a number) may continue
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def _iter_array(reader, decoder):
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value(decoder)
+        separator = reader.peek()
+        reader.pos += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError(f"Expected ',' or ']' in array, got '{separator}'")
+
+
+def iter_json_items(source, key="products", chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields the items of a JSON array one at a time without loading the file.
+
+    Both layouts found in data/output are supported: a top-level list of products
+    (bonus_items.json) and a raw API response object whose `key` member holds
+    the list (bonus_items_0_1000.json). Other members of such an object are
+    parsed and discarded.
+
+    Args:
+        source (str or file): Path of the JSON file, or an open text file.
+        key (str): Member holding the array when the top-level value is an object.
+        chunk_size (int): Number of characters read per refill.
+
+    Yields:
+        dict: One product at a time.
+    """
+    if isinstance(source, str):
+        with open(source, "r", encoding="utf-8") as f:
+            yield from iter_json_items(f, key, chunk_size)
+        return
+
+    reader = _Reader(source, chunk_size)
+    decoder = json.JSONDecoder()
+    first = reader.peek()
+
+    if first == "[":
+        yield from _iter_array(reader, decoder)
+    elif first == "{":
+        reader.pos += 1
+        while reader.peek() not in ("}", ""):
+            name = reader.value(decoder)
+            reader.expect(":")
+            if name == key and reader.peek() == "[":
+                yield from _iter_array(reader, decoder)
+                return
+            reader.value(decoder)
+            if reader.peek() == ",":
+                reader.pos += 1
+    else:
+        raise ValueError("Input JSON must be a list of items or an object holding one.")
@@ -0,0 +1,38 @@
+import math
+
+from src.basket_optimizer import optimise_basket
+from src.product_store import ProductStore
+
+
+def test_unpriced_products_do_not_break_the_budget():
+    store = ProductStore([
+        {"webshopId": 1, "title": "AH Volkoren penne", "currentPrice": 1.5, "priceBeforeBonus": 2.0, "isBonus": True},
+        {"webshopId": 2, "title": "AH Gepelde tomaten", "isBonus": True}, # no price at all
+        {"webshopId": 3, "title": "AH Biefstuk", "currentPrice": 8.0, "priceBeforeBonus": 9.0, "isBonus": True},
+        {"webshopId": 4, "title": "AH Zalmfilet", "currentPrice": 7.0, "priceBeforeBonus": 8.5, "isBonus": True},
+    ])
+    recipes = [
+        {"name": "pasta", "ingredients": ["volkoren penne", "gepelde tomaten"]},
+        {"name": "biefstuk", "ingredients": ["biefstuk"]},
+        {"name": "zalm", "ingredients": ["zalmfilet"]},
+    ]
+
+    basket = optimise_basket(recipes, store, budget=10)
+
+    assert not math.isnan(basket["total_cost"])
+    assert basket["total_cost"] <= 10
+    assert 2 not in {product["webshopId"] for product in basket["products"]}
+
+
+def test_recipes_without_savings_leave_the_budget_alone():
+    store = ProductStore([
+        {"webshopId": 1, "title": "AH Zalmfilet", "currentPrice": 6.0, "priceBeforeBonus": 8.0,
+         "isBonus": True, "bonusMechanism": "25% korting"},
+        {"webshopId": 2, "title": "AH Biefstuk", "currentPrice": 8.0, "isBonus": True}, # no discount
+    ])
+    recipes = [{"name": "biefstuk", "ingredients": ["biefstuk"]}, {"name": "zalm", "ingredients": ["zalmfilet"]}]
+
+    basket = optimise_basket(recipes, store, budget=20)
+
+    assert basket["recipes"] == ["zalm"]
+    assert basket["total_cost"] == 6.0
@@ -0,0 +1,38 @@
+from src.embedding_index import EmbeddingIndex
+
+PRODUCTS = [
+    {"webshopId": 1, "title": "AH Komkommer", "mainCategory": "Groente, aardappelen"},
+    {"webshopId": 2, "title": "AH Biologische Komkommer", "mainCategory": "Groente, aardappelen"},
+    {"webshopId": 3, "title": "AH Komkommer", "mainCategory": "Groente, aardappelen"},
+    {"webshopId": 4, "title": "Coca-Cola Original taste", "mainCategory": "Frisdrank, sappen"},
+]
+
+
+def _pairs(index, threshold=0.5):
+    return {(min(a, b), max(a, b)) for a, b, _ in index.near_duplicates(threshold)}
+
+
+def test_near_duplicates_match_a_fresh_index_after_removals():
+    index = EmbeddingIndex()
+    index.add(PRODUCTS)
+    assert (1, 3) in _pairs(index)
+
+    index.remove([3])
+    index.add([dict(PRODUCTS[1], title="AH Biologische Komkommer 2 stuks")])
+
+    fresh = EmbeddingIndex()
+    fresh.add([PRODUCTS[0], PRODUCTS[3], dict(PRODUCTS[1], title="AH Biologische Komkommer 2 stuks")])
+    assert _pairs(index) == _pairs(fresh)
+    assert all(3 not in pair for pair in _pairs(index))
+    assert index.search("komkommer", k=2) == fresh.search("komkommer", k=2)
+
+
+def test_remove_compacts_once_removed_rows_outnumber_live_ones():
+    index = EmbeddingIndex()
+    index.add(PRODUCTS)
+
+    index.remove([1, 2, 3])
+
+    assert index.ids == [4]
+    assert len(index.matrix) == index.dim
+    assert [webshop_id for webshop_id, _ in index.search("cola", k=5)] == [4]
@@ -0,0 +1,25 @@
+from src.image_facts import _extract_batch, parse_pack_text
+
+
+def test_missing_image_fails_only_itself(tmp_path):
+    image = tmp_path / "a.png"
+    image.write_bytes(b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\rIHDR" + (4).to_bytes(4, "big") + (2).to_bytes(4, "big"))
+    batch = [("a", "https://example.com/dam/product/a?revLabel=2", str(image)),
+             ("b", "https://example.com/dam/product/b?revLabel=1", str(tmp_path / "evicted.png"))]
+
+    results = {key: (facts, error) for key, facts, error in _extract_batch(batch, [], "nld", 10)}
+
+    assert results["a"][0]["image"] == {"format": "png", "width": 4, "height": 2, "bytes": image.stat().st_size}
+    assert results["a"][0]["revision"] == 2
+    assert results["b"][0] is None and "Unreadable image" in results["b"][1]
+
+
+def test_nutrition_table_protein_is_not_an_egg_allergen():
+    facts = parse_pack_text("Ingrediënten: water, tarwebloem, gist.\n"
+                            "Allergie-informatie: Bevat tarwe.\n"
+                            "Voedingswaarde per 100 g bevat:\n"
+                            "Eiwitten 8,5 g\n"
+                            "100 g bevat eiwit 8 g, melkeiwit 1 g\n")
+
+    assert facts["allergens"] == ["gluten"]
+    assert facts["nutrition"]["protein"] == 8.5
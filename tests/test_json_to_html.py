@@ -0,0 +1,17 @@
+from src import json_to_html
+from src.json_to_html import best_image_url, clear_render_caches, render_product_fragment
+
+
+def test_render_caches_stay_bounded(monkeypatch):
+    monkeypatch.setattr(json_to_html, "FRAGMENT_CACHE_SIZE", 2)
+    clear_render_caches()
+    products = [{"webshopId": i, "title": f"Product {i}", "images": [{"url": f"https://example.com/{i}.jpg", "width": 400}]}
+                for i in range(5)]
+
+    for product in products:
+        render_product_fragment(product)
+
+    assert len(json_to_html._fragments) == 2
+    assert len(json_to_html._best_images) == 2
+    assert best_image_url(products[0]) == "https://example.com/0.jpg"
+    clear_render_caches()
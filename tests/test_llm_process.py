@@ -0,0 +1,27 @@
+from src import llm_process
+from src.llm_cache import LLMResponseCache
+
+CONFIG = """
+llm_config:
+  llm_api_endpoint_env_var: "UNSET_LLM_ENDPOINT"
+  llm_model_name_env_var: "UNSET_LLM_MODEL"
+langgraph_config:
+  temperature: 0.5
+llm_cache:
+  path: "llm_cache.sqlite"
+"""
+
+
+def test_extract_image_information_closes_the_llm_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "config.yml").write_text(CONFIG, encoding="utf-8")
+    closed = []
+    close = LLMResponseCache.close
+    monkeypatch.setattr(LLMResponseCache, "close", lambda self: closed.append(self) or close(self))
+
+    items, recipes = llm_process.extract_image_information([
+        {"webshopId": 1, "title": "AH Zalmfilet", "isBonus": True, "currentPrice": 4.5, "priceBeforeBonus": 6.0},
+    ])
+
+    assert len(items) == len(recipes) == 1
+    assert len(closed) == 1
@@ -0,0 +1,59 @@
+from benchmarks.fake_sendpulse_server import start_fake_sendpulse_server
+from src.email_dispatch import EmailDispatcher, SendPulseClient
+from src.outbox import Outbox
+
+
+def _messages(directory, recipients):
+    messages = []
+    for recipient in recipients:
+        path = directory / f"{recipient}.html"
+        path.write_text(f"<p>Hallo {recipient}</p>", encoding="utf-8")
+        messages.append({"to": f"{recipient}@example.com", "subject": "Bonus", "sender_email": "ah@example.com",
+                         "html_file": str(path)})
+    return messages
+
+
+def test_drain_completes_batch_around_a_broken_message(tmp_path):
+    server, base_url, counter = start_fake_sendpulse_server(latency=0)
+    try:
+        messages = _messages(tmp_path, ["anna", "bram", "cor"])
+        messages.append({"to": "dirk@example.com", "subject": "Bonus", "sender_email": "ah@example.com",
+                         "html_file": str(tmp_path / "missing.html")})
+        outbox = Outbox(str(tmp_path / "outbox.sqlite"), max_attempts=2)
+        outbox.enqueue(messages, day="2026-10-17")
+        dispatcher = EmailDispatcher(SendPulseClient("id", "secret", base_url=base_url), max_retries=0)
+
+        summary = outbox.drain(dispatcher, batch_size=10, day="2026-10-17")
+
+        assert counter["emails"] == 3
+        assert summary["sent"] == 3
+        assert outbox.counts() == {"sent": 3, "failed": 1}
+
+        # A second run neither resends the accepted emails nor crashes on the broken one
+        assert outbox.drain(dispatcher, batch_size=10, day="2026-10-17") == {"sent": 0, "failed": 0}
+        assert counter["emails"] == 3
+        outbox.close()
+    finally:
+        server.shutdown()
+
+
+def test_claim_skips_messages_of_earlier_days(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite"))
+    outbox.enqueue([{"to": "anna@example.com"}], day="2026-10-16")
+    outbox.enqueue([{"to": "bram@example.com"}], day="2026-10-17")
+
+    claimed = outbox.claim(day="2026-10-17")
+
+    assert [message["to"] for _, message in claimed] == ["bram@example.com"]
+    assert outbox.counts("2026-10-16") == {"pending": 1}
+    outbox.close()
+
+
+def test_campaigns_to_the_same_recipient_do_not_collide(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite"))
+    outbox.enqueue([{"to": "anna@example.com", "part": 1}], day="2026-10-17")
+
+    assert outbox.enqueue([{"to": "anna@example.com"}], day="2026-10-17", campaign="daily") == 1
+    assert outbox.enqueue([{"to": "anna@example.com"}], day="2026-10-17", campaign="daily") == 0
+    assert outbox.counts("2026-10-17") == {"pending": 2}
+    outbox.close()
@@ -0,0 +1,36 @@
+import contextlib
+import io
+import json
+
+import pytest
+
+from src.check_products import filter_and_split_json
+from src.partition_writer import PARTITION_FORMATS, read_partition
+
+PRODUCTS = [
+    {"webshopId": 1, "title": "Melk", "nutriscore": "A", "mainCategory": "Zuivel"},
+    {"webshopId": 2, "title": "Kaas \"oud\"", "nutriscore": "D", "mainCategory": "Zuivel"},
+    {"webshopId": 3, "title": "Appel", "nutriscore": "A", "mainCategory": "Groente, fruit"},
+]
+
+
+@pytest.mark.parametrize("output_format", list(PARTITION_FORMATS))
+def test_streamed_partitions_read_back(tmp_path, output_format):
+    with contextlib.redirect_stdout(io.StringIO()):
+        filter_and_split_json(iter(PRODUCTS), str(tmp_path), ["nutriscore", "mainCategory"],
+                              output_format=output_format, max_open_files=1)
+
+    extension = PARTITION_FORMATS[output_format]
+    read = lambda name: [p["webshopId"] for p in read_partition(str(tmp_path / (name + extension)))]
+    assert read("nutriscore_A") == [1, 3]
+    assert read("mainCategory_Groente_fruit") == [3]
+    assert not [path for path in tmp_path.iterdir() if path.name.startswith(".tmp_")]
+    assert {path.stat().st_mode & 0o777 for path in tmp_path.iterdir()} == {0o644}
+
+
+def test_streamed_pretty_partition_matches_json_dump(tmp_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        filter_and_split_json(iter(PRODUCTS), str(tmp_path), ["mainCategory"])
+
+    expected = json.dumps(PRODUCTS[:2], indent=4, ensure_ascii=False)
+    assert (tmp_path / "mainCategory_Zuivel.json").read_text(encoding="utf-8") == expected
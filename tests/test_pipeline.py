@@ -0,0 +1,32 @@
+import pytest
+
+from src.pipeline import Pipeline, Stage
+
+
+def test_run_rejects_unknown_stages(tmp_path):
+    pipeline = Pipeline([Stage("fetch", lambda config: [1, 2]),
+                         Stage("html", lambda config, fetch: str(fetch), inputs=["fetch"])],
+                        {}, directory=str(tmp_path))
+
+    with pytest.raises(ValueError, match="htm"):
+        pipeline.run(targets=["htm"])
+    with pytest.raises(ValueError, match="fech"):
+        pipeline.run(targets=["html"], force=["fech"])
+    assert not pipeline.run(targets=["html"])["failed"]
+
+
+def test_incomplete_outputs_are_not_reused(tmp_path):
+    calls = []
+
+    def facts(config):
+        calls.append(1)
+        return {"facts": {1: "A"}, "failed": 1}
+
+    stages = [Stage("images", lambda config: calls.append("images"), cache=False),
+              Stage("facts", facts, after=["images"], cache=lambda facts: not facts["failed"]),
+              Stage("recipes", lambda config, facts: calls.append("recipes"), inputs=["facts"])]
+    for _ in range(2):
+        assert not Pipeline(stages, {}, directory=str(tmp_path)).run()["failed"]
+
+    # facts reruns after images every time; unchanged facts keep recipes cached
+    assert calls == ["images", 1, "recipes", "images", 1]
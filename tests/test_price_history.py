@@ -0,0 +1,24 @@
+from datetime import date
+
+from src.price_history import PriceHistory
+
+
+def _products(price):
+    return [{"webshopId": 1, "title": "AH Halfvolle melk", "currentPrice": price, "priceBeforeBonus": price}]
+
+
+def test_last_prices_of_a_week_hold_until_the_end_of_the_period(tmp_path):
+    history = PriceHistory(str(tmp_path))
+    history.append(_products(1.0), date(2026, 10, 5)) # Monday
+    history.append(_products(2.0), date(2026, 10, 7)) # Wednesday, no runs after it that week
+    history.append(_products(2.0), date(2026, 10, 12)) # next Monday
+
+    stats = history.stats(until=date(2026, 10, 9))
+    assert stats.days[0] == 5
+    assert stats.median_before[0] == 2.0
+    assert stats.get(1)["last_seen"] == "2026-10-09"
+
+    # A week before `until` counts through its Sunday
+    stats = history.stats(until=date(2026, 10, 12))
+    assert stats.days[0] == 8
+    assert stats.min_before[0] == 1.0
@@ -0,0 +1,22 @@
+from src.product_store import ProductStore
+from src.snapshot import latest_snapshot, open_snapshot, prune_snapshots, save_snapshot, snapshot_path, \
+    snapshot_version
+
+PRODUCTS = [
+    {"webshopId": 1, "title": "AH Komkommer", "currentPrice": 0.79, "isBonus": True, "mainCategory": "Groente"},
+    {"webshopId": 2, "title": "AH Zalmfilet", "currentPrice": 4.49, "isBonus": True, "mainCategory": "Vis"},
+]
+
+
+def test_snapshot_keeps_version_and_latest_is_pruned_last(tmp_path):
+    for day in ("20261015", "20261016", "20261017"):
+        save_snapshot(ProductStore(PRODUCTS), snapshot_path(day, str(tmp_path)), version=f"v{day}")
+
+    prune_snapshots(keep=2, directory=str(tmp_path))
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["bonus_20261016.snap", "bonus_20261017.snap"]
+    latest = latest_snapshot(str(tmp_path))
+    assert snapshot_version(latest) == "v20261017"
+    store = open_snapshot(latest)
+    assert list(store.query(max_price=1)) == [0]
+    assert store.products[1]["title"] == "AH Zalmfilet"